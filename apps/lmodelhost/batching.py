@@ -0,0 +1,112 @@
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingBatch:
+    def __init__(self, params: Dict[str, Any]):
+        self.params = params
+        self.items: List[Any] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests for one model and runs them as a single batched call.
+
+    A batch is flushed when it reaches ``max_batch_size`` items or ``max_wait_ms`` after its
+    first item arrived, whichever comes first. Requests are only batched with others that use
+    the same generation parameters. ``run_batch(items, params)`` runs in a worker thread, one
+    batch at a time per model, and must return one result per item.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any], Dict[str, Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10,
+        name: str = "",
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.name = name
+        self._pending: Dict[str, _PendingBatch] = {}
+        self._running: Optional[asyncio.Semaphore] = None
+        self._tasks = set()
+
+    async def submit(self, item: Any, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Queue one item and wait for its result."""
+        loop = asyncio.get_running_loop()
+        params = params or {}
+        key = json.dumps(params, sort_keys=True, default=str)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _PendingBatch(params)
+        future = loop.create_future()
+        batch.items.append(item)
+        batch.futures.append(future)
+        if len(batch.items) >= self.max_batch_size:
+            self._flush(key)
+        elif len(batch.items) == 1:
+            batch.timer = loop.call_later(self.max_wait, self._flush, key)
+        return await future
+
+    def _flush(self, key: str) -> None:
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: _PendingBatch) -> None:
+        if self._running is None:
+            self._running = asyncio.Semaphore(1)
+        async with self._running:
+            # Skip callers that went away while the batch was waiting
+            live = [(item, future) for item, future in zip(batch.items, batch.futures) if not future.done()]
+            if not live:
+                return
+            items = [item for item, _ in live]
+            try:
+                results = await asyncio.to_thread(self.run_batch, items, batch.params)
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch of {len(items)} items returned {len(results)} results")
+            except Exception as e:
+                logger.error(f"Batch of {len(items)} for {self.name} failed: {e}")
+                for _, future in live:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            logger.debug(f"Ran batch of {len(items)} for {self.name}")
+            for (_, future), result in zip(live, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+def prepare_for_batching(pipe) -> None:
+    """
+    Configures a pipeline's tokenizer for batched calls. Decoder-only text-generation
+    models need a pad token and left padding to generate in batches.
+    """
+    tokenizer = getattr(pipe, "tokenizer", None)
+    if tokenizer is not None and "text-generation" in str(pipe.task):
+        if tokenizer.pad_token_id is None:
+            tokenizer.pad_token_id = tokenizer.eos_token_id
+        tokenizer.padding_side = "left"
+
+
+def run_pipeline_batch(pipe, texts: List[str], params: Dict[str, Any]) -> List[Any]:
+    """
+    Calls a transformers pipeline on a list of inputs. Each result has the same shape
+    as a single-input call to the pipeline.
+    """
+    outputs = pipe(texts, batch_size=len(texts), **params)
+    return [output if isinstance(output, list) else [output] for output in outputs]
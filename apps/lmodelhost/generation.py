@@ -0,0 +1,145 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for the next token before treating generation as stuck
+GENERATION_TOKEN_TIMEOUT_SECONDS = float(os.getenv("GENERATION_TOKEN_TIMEOUT_SECONDS", "120"))
+
+
+class GenerationRequest(BaseModel):
+    """Prompt plus per-request sampling parameters for text-generation models."""
+    text: str
+    max_new_tokens: int = Field(256, ge=1, le=8192)
+    temperature: float = Field(1.0, ge=0.0)
+    top_p: float = Field(1.0, gt=0.0, le=1.0)
+    top_k: Optional[int] = Field(None, ge=1)
+    stop: Optional[List[str]] = None
+    seed: Optional[int] = None
+    # OpenAI-style {"type": "json_object"} / {"type": "json_schema", ...}; applied by engines with structured output
+    response_format: Optional[Dict[str, Any]] = None
+
+    def vllm_sampling_kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments for vLLM ``SamplingParams``."""
+        kwargs = {"max_tokens": self.max_new_tokens, "temperature": self.temperature, "top_p": self.top_p}
+        if self.top_k is not None:
+            kwargs["top_k"] = self.top_k
+        if self.stop:
+            kwargs["stop"] = self.stop
+        if self.seed is not None:
+            kwargs["seed"] = self.seed
+        return kwargs
+
+    def hf_generate_kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments for transformers ``generate`` (and text-generation pipelines)."""
+        kwargs: Dict[str, Any] = {"max_new_tokens": self.max_new_tokens}
+        if self.temperature > 0:
+            kwargs.update(do_sample=True, temperature=self.temperature, top_p=self.top_p)
+            if self.top_k is not None:
+                kwargs["top_k"] = self.top_k
+        else:
+            kwargs["do_sample"] = False
+        return kwargs
+
+
+def cut_at_stop(text: str, stop: Optional[List[str]]) -> Optional[int]:
+    """Index of the first stop string in ``text``, if any."""
+    positions = [text.find(s) for s in stop or () if s and s in text]
+    return min(positions) if positions else None
+
+
+def _stop_prefix_length(text: str, stop: Optional[List[str]]) -> int:
+    """Length of the longest end of ``text`` that could be the start of a stop string."""
+    longest = 0
+    for s in stop or ():
+        for n in range(min(len(s) - 1, len(text)), longest, -1):
+            if text.endswith(s[:n]):
+                longest = n
+                break
+    return longest
+
+
+async def stream_generate(model, tokenizer, request: GenerationRequest) -> AsyncIterator[str]:
+    """
+    Streams the text generated by a transformers causal LM, one decoded chunk at a time.
+    Generation runs in a background thread and stops as soon as the caller stops iterating
+    (for example when a streaming client disconnects).
+    """
+    from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer, set_seed
+
+    cancelled = threading.Event()
+    errors: List[BaseException] = []
+
+    class _StopWhenCancelled(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs) -> bool:
+            return cancelled.is_set()
+
+    streamer = TextIteratorStreamer(
+        tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=GENERATION_TOKEN_TIMEOUT_SECONDS
+    )
+    inputs = tokenizer(request.text, return_tensors="pt").to(model.device)
+    generate_kwargs = dict(
+        **inputs,
+        streamer=streamer,
+        stopping_criteria=StoppingCriteriaList([_StopWhenCancelled()]),
+        **request.hf_generate_kwargs(),
+    )
+    if generate_kwargs.get("pad_token_id") is None and tokenizer.pad_token_id is None:
+        generate_kwargs["pad_token_id"] = tokenizer.eos_token_id
+    if request.seed is not None:
+        set_seed(request.seed)
+
+    def run():
+        try:
+            model.generate(**generate_kwargs)
+        except BaseException as e:
+            errors.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    # Text that may be the start of a stop string is held back until the next chunk decides
+    pending = ""
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, streamer, None)
+            if chunk is None:
+                break
+            if not chunk:
+                continue
+            pending += chunk
+            stop_at = cut_at_stop(pending, request.stop)
+            if stop_at is not None:
+                if stop_at:
+                    yield pending[:stop_at]
+                return
+            ready = len(pending) - _stop_prefix_length(pending, request.stop)
+            if ready:
+                yield pending[:ready]
+                pending = pending[ready:]
+        if errors:
+            raise errors[0]
+        if pending:
+            yield pending
+    finally:
+        cancelled.set()
+
+
+async def sse_token_events(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Formats streamed text chunks as Server-Sent Events, ending with a ``done`` event."""
+    try:
+        async for chunk in chunks:
+            yield f"event: token\ndata: {json.dumps({'text': chunk})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    except Exception as e:
+        logger.error(f"Generation stream failed: {e}")
+        yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+    finally:
+        # Closing the source stops generation when the client goes away
+        await chunks.aclose()
@@ -14,36 +14,73 @@ if hf_token:
 
 # Import model config loader
 
-from apps.lmodelhost.model_configs import get_enabled_models
-from apps.lmodelhost.model_loader import load_all_pipelines
-from apps.lmodelhost.routes import create_model_router, InferenceRequest, InferenceResponse
-from apps.lmodelhost.vllm_rayserve import create_vllm_rayserve_router
+from apps.lmodelhost.model_configs import get_enabled_models, pipeline_task
+from apps.lmodelhost.batching import prepare_for_batching
+from apps.lmodelhost.model_loader import create_pipeline
+from apps.lmodelhost.model_manager import WARM_MODELS, ModelManager
+from apps.lmodelhost.openai_api import create_openai_router
+from apps.lmodelhost.routes import (
+    create_manager_router, create_model_router, create_pipeline_batcher, create_token_streamer,
+    InferenceRequest, InferenceResponse,
+)
+from apps.lmodelhost.vllm_rayserve import create_engine_streamer, create_generation_engine, create_vllm_rayserve_router
+import asyncio
 from fastapi import FastAPI
 
 app = FastAPI()
 
 model_configs = get_enabled_models()
-model_pipes = load_all_pipelines(model_configs)
+
+def uses_vllm(model_key: str) -> bool:
+    # Models like 'deepseekqwin' are served by the async vLLM engine (see vllm_rayserve.py)
+    return "deepseek" in model_key.lower() or "qwin" in model_key.lower()
+
+def load_model(model_key: str):
+    config = model_configs[model_key]
+    if uses_vllm(model_key):
+        return create_generation_engine(config["model_id"])
+    pipe = create_pipeline(model_key, config["model_id"], config)
+    prepare_for_batching(pipe)
+    return pipe
+
+# Models are loaded on first request and evicted (LRU) to stay within MODEL_MEMORY_BUDGET_MB
+model_manager = ModelManager(model_configs, load_model)
+
+@app.on_event("startup")
+async def warm_models():
+    # Warm up in the background so /healthz answers immediately
+    warm = [k for k in WARM_MODELS if k in model_configs]
+    if warm:
+        app.state.warmup_task = asyncio.create_task(model_manager.warm(warm))
 
 @app.get("/healthz")
 def health_check():
     return {"status": "ok"}
 
+app.include_router(create_manager_router(model_manager), prefix="/models")
+
+# Batchers and token streamers are shared by the per-model routes and the OpenAI-compatible API
+batchers = {}
+streamers = {}
+for model_key, config in model_configs.items():
+    if uses_vllm(model_key):
+        streamers[model_key] = create_engine_streamer(model_key, model_manager)
+    else:
+        batchers[model_key] = create_pipeline_batcher(model_key, model_manager, config)
+        if pipeline_task(model_key) == "text-generation":
+            streamers[model_key] = create_token_streamer(model_key, model_manager, config)
+
 # Register subroutes for each enabled model
-for model_key, pipe in model_pipes.items():
+for model_key in model_configs:
     # If model_key is 'deepseekqwin' or similar, use vllm+ray serve
-    if "deepseek" in model_key.lower() or "qwin" in model_key.lower():
-        model_id = model_configs[model_key]["model_id"]
-        router = create_vllm_rayserve_router(model_id)
+    if uses_vllm(model_key):
+        router = create_vllm_rayserve_router(model_key, model_manager, streamers[model_key])
         app.include_router(router, prefix=f"/{model_key}")
     else:
-        router = create_model_router(model_key, pipe)
+        router = create_model_router(
+            model_key, model_manager, model_configs[model_key], batchers[model_key], streamers.get(model_key)
+        )
         app.include_router(router, prefix=f"/{model_key}")
 
-
-@app.get("/healthz")
-def health_check():
-    return {"status": "ok"}
-
-
-# ...existing code...
+# OpenAI-compatible API: POST /v1/chat/completions with "model" set to a model key
+app.include_router(create_openai_router(model_manager, model_configs, batchers, streamers), prefix="/v1")
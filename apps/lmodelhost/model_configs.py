@@ -1,6 +1,26 @@
 import os
 from typing import Dict, List
 
+# Defaults for the per-model /infer batching scheduler
+DEFAULT_BATCH_SIZE = int(os.getenv("DEFAULT_BATCH_SIZE", "8"))
+DEFAULT_BATCH_MAX_WAIT_MS = float(os.getenv("DEFAULT_BATCH_MAX_WAIT_MS", "10"))
+# Default number of concurrent /stream generations per text-generation model
+DEFAULT_STREAM_CONCURRENCY = int(os.getenv("DEFAULT_STREAM_CONCURRENCY", "2"))
+# Default CPU backend for transformers pipelines: default | int8 | onnx
+DEFAULT_BACKEND = os.getenv("DEFAULT_BACKEND", "default")
+
+def pipeline_task(model_key: str) -> str:
+    """
+    Returns the pipeline task used for a model key (known before the model is loaded).
+    """
+    if "sentiment" in model_key.lower():
+        return "sentiment-analysis"
+    return "text-generation"
+
+def _optional_int(name: str):
+    value = os.getenv(name)
+    return int(value) if value else None
+
 def get_enabled_models() -> Dict[str, dict]:
     """
     Reads the ENABLED_MODELS environment variable from .env and returns a dict of model configs.
@@ -8,13 +28,30 @@ def get_enabled_models() -> Dict[str, dict]:
     ENABLED_MODELS=llama,sentiment
     LLAMA_MODEL_ID=meta-llama/Meta-Llama-3.1-8B-Instruct
     SENTIMENT_MODEL_ID=distilbert-base-uncased-finetuned-sst-2-english
+    SENTIMENT_BATCH_SIZE=32          # optional, default DEFAULT_BATCH_SIZE
+    SENTIMENT_BATCH_MAX_WAIT_MS=5    # optional, default DEFAULT_BATCH_MAX_WAIT_MS
+    LLAMA_STREAM_CONCURRENCY=4       # optional, default DEFAULT_STREAM_CONCURRENCY
+    SENTIMENT_BACKEND=onnx           # optional: default | int8 | onnx
+    SENTIMENT_REVISION=<commit sha>  # optional, model revision (default: main)
+    SENTIMENT_INTRA_OP_THREADS=4     # optional, threads used inside one op
+    SENTIMENT_INTER_OP_THREADS=1     # optional, ops run in parallel
     """
     enabled = os.getenv("ENABLED_MODELS", "").split(",")
     enabled = [e.strip() for e in enabled if e.strip()]
     configs = {}
     for model in enabled:
-        env_key = f"{model.upper()}_MODEL_ID"
+        prefix = model.upper()
+        env_key = f"{prefix}_MODEL_ID"
         model_id = os.getenv(env_key)
         if model_id:
-            configs[model] = {"model_id": model_id}
+            configs[model] = {
+                "model_id": model_id,
+                "batch_size": int(os.getenv(f"{prefix}_BATCH_SIZE", DEFAULT_BATCH_SIZE)),
+                "batch_max_wait_ms": float(os.getenv(f"{prefix}_BATCH_MAX_WAIT_MS", DEFAULT_BATCH_MAX_WAIT_MS)),
+                "stream_concurrency": int(os.getenv(f"{prefix}_STREAM_CONCURRENCY", DEFAULT_STREAM_CONCURRENCY)),
+                "backend": os.getenv(f"{prefix}_BACKEND", DEFAULT_BACKEND).strip().lower(),
+                "revision": os.getenv(f"{prefix}_REVISION") or None,
+                "intra_op_threads": _optional_int(f"{prefix}_INTRA_OP_THREADS"),
+                "inter_op_threads": _optional_int(f"{prefix}_INTER_OP_THREADS"),
+            }
     return configs
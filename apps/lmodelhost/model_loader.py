@@ -1,25 +1,127 @@
+import logging
+import os
 import torch
 from transformers import pipeline
-from typing import Dict
+from typing import Any, Dict, Optional
 
-def create_pipeline(model_key: str, model_id: str):
+from apps.lmodelhost.model_configs import pipeline_task
+
+logger = logging.getLogger(__name__)
+
+# Where ONNX exports are cached so later starts skip the export
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "model_cache")
+
+BACKENDS = ("default", "int8", "onnx")
+
+def _cache_path(backend: str, model_id: str, revision: Optional[str] = None) -> str:
+    return os.path.join(MODEL_CACHE_DIR, backend, model_id.replace("/", "__"), revision or "main")
+
+def configure_threads(intra_op_threads: Optional[int], inter_op_threads: Optional[int]) -> None:
+    """
+    Sets torch's CPU thread pools. These are process-wide: the last loaded model's
+    setting wins (ONNX Runtime models get their own per-session thread counts).
+    """
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            # Can only be set before the first inter-op parallel work
+            logger.warning("torch inter-op threads already fixed; ignoring inter_op_threads")
+
+def _auto_model_class(task: str):
+    from transformers import AutoModelForCausalLM, AutoModelForSequenceClassification
+    return AutoModelForSequenceClassification if task == "sentiment-analysis" else AutoModelForCausalLM
+
+def _int8_pipeline(task: str, model_id: str, revision: Optional[str]):
+    """
+    Dynamic int8 quantization of the Linear layers. Quantizing takes seconds, so it is
+    redone on every load rather than caching the quantized module (which could only be
+    reloaded by unpickling it).
+    """
+    from transformers import AutoTokenizer
+    logger.info(f"Quantizing {model_id} to int8")
+    model = _auto_model_class(task).from_pretrained(model_id, revision=revision, torch_dtype=torch.float32)
+    model.eval()
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return pipeline(task, model=model, tokenizer=AutoTokenizer.from_pretrained(model_id, revision=revision))
+
+def _onnx_pipeline(
+    task: str, model_id: str, revision: Optional[str], intra_op_threads: Optional[int], inter_op_threads: Optional[int]
+):
+    """
+    ONNX Runtime model with all graph optimizations enabled. The ONNX export is saved to
+    the cache (per model revision) on first load and reloaded from there afterwards.
+    """
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForCausalLM, ORTModelForSequenceClassification
+    from transformers import AutoTokenizer
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if intra_op_threads:
+        session_options.intra_op_num_threads = intra_op_threads
+    if inter_op_threads:
+        session_options.inter_op_num_threads = inter_op_threads
+        session_options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+
+    model_class = ORTModelForSequenceClassification if task == "sentiment-analysis" else ORTModelForCausalLM
+    path = _cache_path("onnx", model_id, revision)
+    if os.path.isdir(path):
+        logger.info(f"Loading ONNX model for {model_id} from {path}")
+        model = model_class.from_pretrained(path, session_options=session_options)
+        tokenizer = AutoTokenizer.from_pretrained(path)
+    else:
+        logger.info(f"Exporting {model_id} to ONNX")
+        model = model_class.from_pretrained(model_id, revision=revision, export=True, session_options=session_options)
+        tokenizer = AutoTokenizer.from_pretrained(model_id, revision=revision)
+        model.save_pretrained(path)
+        tokenizer.save_pretrained(path)
+    return pipeline(task, model=model, tokenizer=tokenizer)
+
+def create_pipeline(model_key: str, model_id: str, config: Optional[Dict[str, Any]] = None):
     """
     Returns a transformers pipeline instance based on the model type.
+    config may select a CPU backend ("int8" or "onnx"), a model revision and intra/inter-op
+    thread counts; if a backend's packages are missing the default backend is used.
     """
+    config = config or {}
+    backend = config.get("backend", "default")
+    revision = config.get("revision")
+    intra_op_threads = config.get("intra_op_threads")
+    inter_op_threads = config.get("inter_op_threads")
+    configure_threads(intra_op_threads, inter_op_threads)
+    task = pipeline_task(model_key)
+
+    if backend == "onnx":
+        try:
+            return _onnx_pipeline(task, model_id, revision, intra_op_threads, inter_op_threads)
+        except ImportError as e:
+            logger.warning(f"ONNX backend unavailable for {model_key} ({e}); using the default backend")
+    elif backend == "int8":
+        return _int8_pipeline(task, model_id, revision)
+    elif backend != "default":
+        raise ValueError(f"Unknown backend {backend!r} for {model_key}; use one of {BACKENDS}")
+
     if "llama" in model_key.lower() or "text-gen" in model_key.lower():
+        if not torch.cuda.is_available():
+            # bfloat16 with device_map="auto" is slow on CPUs; use float32 there
+            return pipeline("text-generation", model=model_id, revision=revision, model_kwargs={"torch_dtype": torch.float32})
         return pipeline(
             "text-generation",
             model=model_id,
+            revision=revision,
             model_kwargs={"torch_dtype": torch.bfloat16},
             device_map="auto",
         )
     elif "sentiment" in model_key.lower():
-        return pipeline("sentiment-analysis", model=model_id)
+        return pipeline("sentiment-analysis", model=model_id, revision=revision)
     else:
-        return pipeline("text-generation", model=model_id)
+        return pipeline("text-generation", model=model_id, revision=revision)
 
 def load_all_pipelines(model_configs: Dict[str, dict]):
     """
     Loads and returns a dict of model_key: pipeline_instance for all enabled models.
     """
-    return {k: create_pipeline(k, v["model_id"]) for k, v in model_configs.items()}
+    return {k: create_pipeline(k, v["model_id"], v) for k, v in model_configs.items()}
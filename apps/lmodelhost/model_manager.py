@@ -0,0 +1,220 @@
+import asyncio
+import gc
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# RAM budget for resident models in MB (0 = unlimited)
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+# Comma-separated model keys that are never evicted / loaded in the background at startup
+PINNED_MODELS = [m.strip() for m in os.getenv("PINNED_MODELS", "").split(",") if m.strip()]
+WARM_MODELS = [m.strip() for m in os.getenv("WARM_MODELS", "").split(",") if m.strip()]
+
+
+def _tensor_bytes(value: Any, seen: set) -> int:
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(v, seen) for v in value)
+    numel = getattr(value, "numel", None)
+    element_size = getattr(value, "element_size", None)
+    if not callable(numel) or not callable(element_size):
+        return 0
+    try:
+        key = (value.data_ptr(), value.numel())
+    except Exception:
+        key = id(value)
+    if key in seen:
+        return 0
+    seen.add(key)
+    return numel() * element_size()
+
+
+def model_memory_bytes(model: Any) -> int:
+    """
+    Resident size of a loaded pipeline or engine: the bytes of every tensor in its torch
+    state_dict (which includes the packed weights of dynamically quantized layers, unlike
+    parameters()), or the size of the exported weights for ONNX Runtime models. Models
+    whose weights live outside this process (e.g. vLLM on GPU) count as 0.
+    """
+    module = getattr(model, "model", model)
+    total = 0
+    state_dict = getattr(module, "state_dict", None)
+    if callable(state_dict):
+        try:
+            seen: set = set()
+            total = sum(_tensor_bytes(value, seen) for value in state_dict(keep_vars=True).values())
+        except TypeError:
+            pass
+    save_dir = getattr(module, "model_save_dir", None)
+    if not total and save_dir and os.path.isdir(save_dir):
+        for root, _, files in os.walk(save_dir):
+            total += sum(os.path.getsize(os.path.join(root, f)) for f in files if ".onnx" in f)
+    return total
+
+
+class _Resident:
+    def __init__(self, model: Any, size_bytes: int, load_seconds: float):
+        self.model = model
+        self.size_bytes = size_bytes
+        self.load_seconds = load_seconds
+        self.last_used = time.time()
+        self.in_use = 0
+
+
+class ModelManager:
+    """
+    Loads models on first use and keeps the resident set within a RAM budget.
+
+    ``loader(model_key)`` builds a model (a pipeline or generation engine) and runs in a
+    worker thread. When the resident models exceed ``memory_budget_mb``, the least recently
+    used ones are evicted, except pinned models and models serving a request right now.
+    """
+
+    def __init__(
+        self,
+        model_keys: Iterable[str],
+        loader: Callable[[str], Any],
+        memory_budget_mb: float = MODEL_MEMORY_BUDGET_MB,
+        pinned: Iterable[str] = PINNED_MODELS,
+        measure: Callable[[Any], int] = model_memory_bytes,
+    ):
+        self.model_keys = list(model_keys)
+        self.loader = loader
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.pinned = set(pinned)
+        self.measure = measure
+        self._resident: "OrderedDict[str, _Resident]" = OrderedDict()
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+
+    def _check_key(self, model_key: str) -> None:
+        if model_key not in self.model_keys:
+            raise KeyError(f"Unknown model {model_key!r}")
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._resident.values())
+
+    async def get(self, model_key: str) -> Any:
+        """Returns the loaded model, loading it first if it is not resident."""
+        self._check_key(model_key)
+        entry = self._resident.get(model_key)
+        if entry is None:
+            lock = self._load_locks.setdefault(model_key, asyncio.Lock())
+            async with lock:
+                entry = self._resident.get(model_key)
+                if entry is None:
+                    entry = await self._load(model_key)
+        entry.last_used = time.time()
+        self._resident.move_to_end(model_key)
+        return entry.model
+
+    async def _load(self, model_key: str) -> _Resident:
+        logger.info(f"Loading model {model_key}")
+        started = time.perf_counter()
+        model = await asyncio.to_thread(self.loader, model_key)
+        entry = _Resident(model, self.measure(model), time.perf_counter() - started)
+        self._resident[model_key] = entry
+        logger.info(f"Loaded {model_key} ({entry.size_bytes / 2**20:.0f} MB) in {entry.load_seconds:.1f}s")
+        self._evict_to_budget(keep=model_key)
+        return entry
+
+    def _evict_to_budget(self, keep: Optional[str] = None) -> None:
+        if self.memory_budget_bytes <= 0:
+            return
+        for model_key in list(self._resident):
+            if self.resident_bytes <= self.memory_budget_bytes:
+                return
+            entry = self._resident[model_key]
+            if model_key == keep or model_key in self.pinned or entry.in_use or entry.size_bytes == 0:
+                continue
+            self.evict(model_key)
+        if self.resident_bytes > self.memory_budget_bytes:
+            logger.warning(
+                f"Resident models use {self.resident_bytes / 2**20:.0f} MB, over the "
+                f"{self.memory_budget_bytes / 2**20:.0f} MB budget; nothing else can be evicted"
+            )
+
+    def evict(self, model_key: str) -> bool:
+        """
+        Unloads a model; returns False if it was not resident. Models with a ``shutdown()``
+        method (generation engines holding GPU memory and worker loops) are shut down.
+        """
+        entry = self._resident.pop(model_key, None)
+        if entry is None:
+            return False
+        logger.info(f"Evicting model {model_key} ({entry.size_bytes / 2**20:.0f} MB)")
+        shutdown = getattr(entry.model, "shutdown", None)
+        if callable(shutdown):
+            try:
+                shutdown()
+            except Exception as e:
+                logger.error(f"Shutting down {model_key} failed: {e}")
+        del entry, shutdown
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+        return True
+
+    @asynccontextmanager
+    async def use(self, model_key: str) -> AsyncIterator[Any]:
+        """Holds a model for the duration of a request so it cannot be evicted meanwhile."""
+        model = await self.get(model_key)
+        entry = self._resident[model_key]
+        entry.in_use += 1
+        try:
+            yield model
+        finally:
+            entry.in_use -= 1
+            entry.last_used = time.time()
+            # Models kept only because they were busy can go now
+            if not entry.in_use and self.resident_bytes > self.memory_budget_bytes > 0:
+                self._evict_to_budget()
+
+    def peek(self, model_key: str) -> Any:
+        """The resident model (raises KeyError if it is not loaded)."""
+        return self._resident[model_key].model
+
+    async def warm(self, model_keys: Iterable[str]) -> List[str]:
+        """Loads the given models now; returns the keys that are resident afterwards."""
+        for model_key in model_keys:
+            try:
+                await self.get(model_key)
+            except Exception as e:
+                logger.error(f"Warm-up of {model_key} failed: {e}")
+        return [k for k in model_keys if k in self._resident]
+
+    def pin(self, model_key: str) -> None:
+        self._check_key(model_key)
+        self.pinned.add(model_key)
+
+    def unpin(self, model_key: str) -> None:
+        self._check_key(model_key)
+        self.pinned.discard(model_key)
+        self._evict_to_budget()
+
+    def status(self) -> Dict[str, Any]:
+        """Resident models, their sizes and the memory budget."""
+        models = {}
+        for model_key in self.model_keys:
+            entry = self._resident.get(model_key)
+            models[model_key] = {
+                "loaded": entry is not None,
+                "pinned": model_key in self.pinned,
+                "size_mb": round(entry.size_bytes / 2**20, 1) if entry else None,
+                "load_seconds": round(entry.load_seconds, 2) if entry else None,
+                "last_used": entry.last_used if entry else None,
+                "in_use": entry.in_use if entry else 0,
+            }
+        return {
+            "memory_budget_mb": self.memory_budget_bytes / 2**20 or None,
+            "resident_mb": round(self.resident_bytes / 2**20, 1),
+            "models": models,
+        }
@@ -0,0 +1,236 @@
+import json
+import logging
+import time
+import uuid
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Union
+
+from apps.lmodelhost.batching import MicroBatcher
+from apps.lmodelhost.generation import GenerationRequest, cut_at_stop
+from apps.lmodelhost.model_configs import pipeline_task
+from apps.lmodelhost.model_manager import ModelManager
+
+logger = logging.getLogger(__name__)
+
+Streamer = Callable[[GenerationRequest], AsyncIterator[str]]
+
+RESPONSE_FORMAT_TYPES = ("text", "json_object", "json_schema")
+
+
+class ChatMessage(BaseModel):
+    role: str
+    content: Union[str, List[Dict[str, Any]], None] = None
+
+    def text(self) -> str:
+        """The message text (text parts of multi-part content are joined)."""
+        if isinstance(self.content, list):
+            return "".join(part.get("text", "") for part in self.content if part.get("type") == "text")
+        return self.content or ""
+
+
+class ChatCompletionRequest(BaseModel):
+    """The subset of OpenAI's chat completions request that local models support."""
+    model: str
+    messages: List[ChatMessage] = Field(..., min_length=1)
+    max_tokens: Optional[int] = Field(None, ge=1)
+    max_completion_tokens: Optional[int] = Field(None, ge=1)
+    temperature: float = Field(1.0, ge=0.0, le=2.0)
+    top_p: float = Field(1.0, gt=0.0, le=1.0)
+    stop: Union[str, List[str], None] = None
+    seed: Optional[int] = None
+    stream: bool = False
+    n: int = 1
+    tools: Optional[List[Dict[str, Any]]] = None
+    response_format: Optional[Dict[str, Any]] = None
+
+    @property
+    def response_format_type(self) -> str:
+        return (self.response_format or {}).get("type", "text")
+
+    def generation_request(self, prompt: str) -> GenerationRequest:
+        kwargs: Dict[str, Any] = {"text": prompt, "temperature": self.temperature, "top_p": self.top_p}
+        max_tokens = self.max_completion_tokens or self.max_tokens
+        if max_tokens:
+            kwargs["max_new_tokens"] = max_tokens
+        if self.stop:
+            kwargs["stop"] = [self.stop] if isinstance(self.stop, str) else self.stop
+        if self.seed is not None:
+            kwargs["seed"] = self.seed
+        if self.response_format_type != "text":
+            kwargs["response_format"] = self.response_format
+        return GenerationRequest(**kwargs)
+
+
+def render_chat_prompt(messages: List[ChatMessage], tokenizer=None) -> str:
+    """
+    Renders chat messages as one prompt, with the tokenizer's chat template when it has
+    one and a plain "role: content" transcript otherwise.
+    """
+    if tokenizer is not None and getattr(tokenizer, "chat_template", None):
+        return tokenizer.apply_chat_template(
+            [{"role": m.role, "content": m.text()} for m in messages], tokenize=False, add_generation_prompt=True
+        )
+    lines = [f"{m.role}: {m.text()}" for m in messages]
+    return "\n".join(lines + ["assistant:"])
+
+
+async def model_tokenizer(model):
+    """
+    The tokenizer of a loaded model: generation engines expose it through get_tokenizer()
+    (vLLM's lives inside the engine), pipelines as an attribute.
+    """
+    if model is None:
+        return None
+    get_tokenizer = getattr(model, "get_tokenizer", None)
+    if get_tokenizer is not None:
+        return await get_tokenizer()
+    return getattr(model, "tokenizer", None)
+
+
+def _count_tokens(tokenizer, text: str) -> int:
+    if tokenizer is None:
+        return 0
+    try:
+        return len(tokenizer.encode(text))
+    except Exception:
+        return 0
+
+
+def _chunk(completion_id: str, created: int, model: str, delta: Dict[str, Any], finish_reason=None) -> str:
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+async def openai_stream_events(chunks: AsyncIterator[str], model: str) -> AsyncIterator[str]:
+    """Formats streamed text chunks as OpenAI chat.completion.chunk events, ending with [DONE]."""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    try:
+        yield _chunk(completion_id, created, model, {"role": "assistant", "content": ""})
+        async for chunk in chunks:
+            yield _chunk(completion_id, created, model, {"content": chunk})
+        yield _chunk(completion_id, created, model, {}, finish_reason="stop")
+    except Exception as e:
+        logger.error(f"Chat completion stream failed: {e}")
+        yield f"data: {json.dumps({'error': {'message': str(e), 'type': 'server_error'}})}\n\n"
+    finally:
+        # Closing the source stops generation when the client goes away
+        await chunks.aclose()
+    yield "data: [DONE]\n\n"
+
+
+def create_openai_router(
+    manager: ModelManager,
+    model_configs: Dict[str, dict],
+    batchers: Dict[str, MicroBatcher],
+    streamers: Dict[str, Streamer],
+) -> APIRouter:
+    """
+    OpenAI-compatible /chat/completions and /models over the hosted models. ``model`` is a
+    model key (e.g. "llama") or its model id. Non-streaming requests to pipeline models go
+    through the same batchers as /infer; streaming requests use the per-model streamers.
+    Classification pipelines answer with the top label for the last user message. JSON
+    response formats are applied by engines with structured output (vLLM) and rejected with
+    a 400 for other models.
+    """
+    router = APIRouter()
+    model_ids = {config["model_id"]: key for key, config in model_configs.items()}
+
+    def resolve_model(model: str) -> str:
+        if model in model_configs:
+            return model
+        if model in model_ids:
+            return model_ids[model]
+        raise HTTPException(status_code=404, detail=f"Unknown model {model}")
+
+    async def classify(model_key: str, request: ChatCompletionRequest) -> str:
+        user_messages = [m for m in request.messages if m.role == "user"] or request.messages
+        async with manager.use(model_key):
+            result = await batchers[model_key].submit(user_messages[-1].text())
+        return result[0]["label"]
+
+    async def complete(model_key: str, request: ChatCompletionRequest, prompt: str) -> str:
+        generation = request.generation_request(prompt)
+        if model_key in batchers:
+            params = {**generation.hf_generate_kwargs(), "return_full_text": False}
+            async with manager.use(model_key):
+                result = await batchers[model_key].submit(prompt, params)
+            text = result[0]["generated_text"]
+            stop_at = cut_at_stop(text, generation.stop)
+            return text if stop_at is None else text[:stop_at]
+        chunks = streamers[model_key](generation)
+        try:
+            return "".join([chunk async for chunk in chunks])
+        finally:
+            await chunks.aclose()
+
+    async def label_stream(model_key: str, request: ChatCompletionRequest) -> AsyncIterator[str]:
+        yield await classify(model_key, request)
+
+    @router.get("/models")
+    def list_models():
+        return {
+            "object": "list",
+            "data": [{"id": key, "object": "model", "owned_by": "lmodelhost"} for key in model_configs],
+        }
+
+    @router.post("/chat/completions")
+    async def chat_completions(request: ChatCompletionRequest):
+        model_key = resolve_model(request.model)
+        if request.tools:
+            raise HTTPException(status_code=400, detail="Tool calling is not supported by local models")
+        if request.n != 1:
+            raise HTTPException(status_code=400, detail="Only n=1 is supported")
+        format_type = request.response_format_type
+        if format_type not in RESPONSE_FORMAT_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unknown response_format type {format_type!r}")
+        unsupported_format = HTTPException(
+            status_code=400, detail=f"response_format {format_type} is not supported by {request.model}"
+        )
+        classifier = pipeline_task(model_key) != "text-generation" and model_key in batchers
+        if classifier and format_type != "text":
+            raise unsupported_format
+
+        tokenizer = None
+        if not classifier:
+            async with manager.use(model_key) as model:
+                if format_type != "text" and not getattr(model, "supports_structured_output", False):
+                    raise unsupported_format
+                tokenizer = await model_tokenizer(model)
+        prompt = render_chat_prompt(request.messages, tokenizer)
+
+        if request.stream:
+            if classifier:
+                chunks = label_stream(model_key, request)
+            else:
+                chunks = streamers[model_key](request.generation_request(prompt))
+            return StreamingResponse(openai_stream_events(chunks, request.model), media_type="text/event-stream")
+
+        if classifier:
+            content = await classify(model_key, request)
+        else:
+            content = await complete(model_key, request, prompt)
+        prompt_tokens = _count_tokens(tokenizer, prompt)
+        completion_tokens = _count_tokens(tokenizer, content)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    return router
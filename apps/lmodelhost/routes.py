@@ -1,6 +1,15 @@
-from fastapi import APIRouter
+import asyncio
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from apps.lmodelhost.batching import MicroBatcher, run_pipeline_batch
+from apps.lmodelhost.generation import GenerationRequest, sse_token_events, stream_generate
+from apps.lmodelhost.model_configs import (
+    DEFAULT_BATCH_MAX_WAIT_MS, DEFAULT_BATCH_SIZE, DEFAULT_STREAM_CONCURRENCY, pipeline_task,
+)
+from apps.lmodelhost.model_manager import ModelManager
 
 class InferenceRequest(BaseModel):
     text: str
@@ -8,13 +17,114 @@ class InferenceRequest(BaseModel):
 class InferenceResponse(BaseModel):
     result: Any
 
-def create_model_router(model_key: str, pipe) -> APIRouter:
+class WarmupRequest(BaseModel):
+    models: List[str]
+
+def create_pipeline_batcher(model_key: str, manager: ModelManager, config: Optional[Dict[str, Any]] = None) -> MicroBatcher:
+    """
+    Batcher for a pipeline model: concurrent requests are collected and run as one batched
+    pipeline call. Callers must hold the model (manager.use) while their item is queued.
+    """
+    config = config or {}
+    return MicroBatcher(
+        lambda texts, params: run_pipeline_batch(manager.peek(model_key), texts, params),
+        max_batch_size=config.get("batch_size", DEFAULT_BATCH_SIZE),
+        max_wait_ms=config.get("batch_max_wait_ms", DEFAULT_BATCH_MAX_WAIT_MS),
+        name=model_key,
+    )
+
+def create_token_streamer(
+    model_key: str, manager: ModelManager, config: Optional[Dict[str, Any]] = None
+) -> Callable[[GenerationRequest], AsyncIterator[str]]:
+    """
+    Token streams for a text-generation pipeline. Streams bypass the batcher, so at most
+    stream_concurrency of them generate at a time.
+    """
+    config = config or {}
+    stream_slots = asyncio.Semaphore(max(1, config.get("stream_concurrency", DEFAULT_STREAM_CONCURRENCY)))
+
+    async def stream_tokens(request: GenerationRequest) -> AsyncIterator[str]:
+        # Hold the model for the whole stream so it cannot be evicted mid-generation
+        async with manager.use(model_key) as pipe, stream_slots:
+            chunks = stream_generate(pipe.model, pipe.tokenizer, request)
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+
+    return stream_tokens
+
+def create_model_router(
+    model_key: str,
+    manager: ModelManager,
+    config: Optional[Dict[str, Any]] = None,
+    batcher: Optional[MicroBatcher] = None,
+    streamer: Optional[Callable[[GenerationRequest], AsyncIterator[str]]] = None,
+) -> APIRouter:
+    """
+    /infer (and /stream for text-generation models) for a pipeline model. Pass the batcher
+    and streamer to share them with other routers (e.g. the OpenAI-compatible API).
+    """
     router = APIRouter()
+    task = pipeline_task(model_key)
+    batcher = batcher or create_pipeline_batcher(model_key, manager, config)
+
     @router.post("/infer", response_model=InferenceResponse)
-    def infer(request: InferenceRequest):
-        if "text-generation" in str(pipe.task):
-            result = pipe(request.text, max_new_tokens=256)
-        else:
-            result = pipe(request.text)
+    async def infer(request: InferenceRequest):
+        # Every request in a batch holds the model, so it is resident while the batch runs
+        async with manager.use(model_key):
+            if task == "text-generation":
+                result = await batcher.submit(request.text, {"max_new_tokens": 256})
+            else:
+                result = await batcher.submit(request.text)
         return {"result": result}
+
+    if task == "text-generation":
+        stream_tokens = streamer or create_token_streamer(model_key, manager, config)
+
+        @router.post("/stream")
+        async def stream(request: GenerationRequest):
+            return StreamingResponse(sse_token_events(stream_tokens(request)), media_type="text/event-stream")
+
+    return router
+
+def create_manager_router(manager: ModelManager) -> APIRouter:
+    router = APIRouter()
+
+    def check(model_key: str):
+        if model_key not in manager.model_keys:
+            raise HTTPException(status_code=404, detail=f"Unknown model {model_key}")
+
+    @router.get("")
+    def model_status():
+        return manager.status()
+
+    @router.post("/warmup")
+    async def warmup(request: WarmupRequest):
+        for model_key in request.models:
+            check(model_key)
+        return {"loaded": await manager.warm(request.models)}
+
+    @router.post("/{model_key}/pin")
+    async def pin(model_key: str, warm: bool = True):
+        check(model_key)
+        manager.pin(model_key)
+        if warm:
+            await manager.get(model_key)
+        return manager.status()["models"][model_key]
+
+    @router.delete("/{model_key}/pin")
+    def unpin(model_key: str):
+        check(model_key)
+        manager.unpin(model_key)
+        return manager.status()["models"][model_key]
+
+    @router.post("/{model_key}/evict")
+    def evict(model_key: str):
+        check(model_key)
+        if manager.status()["models"][model_key]["in_use"]:
+            raise HTTPException(status_code=409, detail=f"Model {model_key} is serving requests")
+        return {"evicted": manager.evict(model_key)}
+
     return router
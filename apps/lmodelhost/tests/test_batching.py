@@ -0,0 +1,116 @@
+"""Tests for the per-model micro-batcher."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from apps.lmodelhost.batching import MicroBatcher
+
+
+class RecordingBatch:
+    """run_batch stand-in that records its batches and echoes the items."""
+
+    def __init__(self, error: Exception = None):
+        self.batches = []
+        self.error = error
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, items, params):
+        self.release.wait(5)
+        self.batches.append((list(items), params))
+        if self.error is not None:
+            raise self.error
+        return [f"{item}!" for item in items]
+
+
+class TestMicroBatcher:
+    """Test cases for MicroBatcher."""
+
+    def test_flushes_when_full(self):
+        """A full batch runs at once instead of waiting for max_wait_ms."""
+        run_batch = RecordingBatch()
+        batcher = MicroBatcher(run_batch, max_batch_size=3, max_wait_ms=10_000)
+
+        async def run():
+            return await asyncio.gather(*(batcher.submit(i) for i in range(3)))
+
+        start = time.perf_counter()
+        assert asyncio.run(run()) == ["0!", "1!", "2!"]
+        assert time.perf_counter() - start < 1
+        assert run_batch.batches == [([0, 1, 2], {})]
+
+    def test_flushes_after_max_wait(self):
+        """A partial batch runs max_wait_ms after its first item."""
+        run_batch = RecordingBatch()
+        batcher = MicroBatcher(run_batch, max_batch_size=10, max_wait_ms=50)
+
+        async def run():
+            first = asyncio.ensure_future(batcher.submit("a"))
+            await asyncio.sleep(0.01)
+            assert not run_batch.batches
+            return await asyncio.gather(first, batcher.submit("b"))
+
+        start = time.perf_counter()
+        assert asyncio.run(run()) == ["a!", "b!"]
+        assert time.perf_counter() - start >= 0.05
+        assert run_batch.batches == [(["a", "b"], {})]
+
+    def test_groups_by_params(self):
+        """Only requests with the same generation parameters share a batch."""
+        run_batch = RecordingBatch()
+        batcher = MicroBatcher(run_batch, max_batch_size=10, max_wait_ms=10)
+
+        async def run():
+            return await asyncio.gather(
+                batcher.submit("a", {"temperature": 0.1}),
+                batcher.submit("b", {"temperature": 0.9}),
+                batcher.submit("c", {"temperature": 0.1}),
+            )
+
+        assert asyncio.run(run()) == ["a!", "b!", "c!"]
+        assert sorted(run_batch.batches, key=lambda b: b[1]["temperature"]) == [
+            (["a", "c"], {"temperature": 0.1}),
+            (["b"], {"temperature": 0.9}),
+        ]
+
+    def test_skips_cancelled_callers(self):
+        """Callers that went away while their batch waited are not run."""
+        run_batch = RecordingBatch()
+        batcher = MicroBatcher(run_batch, max_batch_size=1, max_wait_ms=0)
+
+        async def run():
+            run_batch.release.clear()
+            busy = asyncio.ensure_future(batcher.submit("busy"))
+            await asyncio.sleep(0.01)
+            gone = asyncio.ensure_future(batcher.submit("gone"))
+            kept = asyncio.ensure_future(batcher.submit("kept"))
+            await asyncio.sleep(0.01)
+            gone.cancel()
+            run_batch.release.set()
+            return await asyncio.gather(busy, kept)
+
+        assert asyncio.run(run()) == ["busy!", "kept!"]
+        assert [items for items, _ in run_batch.batches] == [["busy"], ["kept"]]
+
+    def test_error_reaches_every_caller(self):
+        """A failed batch fails each of its callers."""
+        batcher = MicroBatcher(RecordingBatch(error=ValueError("out of memory")), max_batch_size=2)
+
+        async def run():
+            return await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, ValueError) and str(r) == "out of memory" for r in results)
+
+    def test_result_count_mismatch_is_an_error(self):
+        """A run_batch returning the wrong number of results fails the batch."""
+        batcher = MicroBatcher(lambda items, params: items[:1], max_batch_size=2)
+
+        async def run():
+            return await asyncio.gather(batcher.submit("a"), batcher.submit("b"))
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(run())
@@ -0,0 +1,135 @@
+"""Tests for streamed generation with a transformers-style model."""
+
+import asyncio
+import queue
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+from apps.lmodelhost.generation import GenerationRequest, cut_at_stop, stream_generate
+
+
+class FakeStreamer:
+    """TextIteratorStreamer stand-in: generate() puts text, the caller iterates it."""
+
+    def __init__(self, tokenizer, skip_prompt=False, skip_special_tokens=False, timeout=None):
+        self.queue = queue.Queue()
+        self.timeout = timeout
+
+    def put_text(self, text):
+        self.queue.put(text)
+
+    def end(self):
+        self.queue.put(StopIteration)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = self.queue.get(timeout=self.timeout)
+        if item is StopIteration:
+            raise StopIteration
+        return item
+
+
+@pytest.fixture(autouse=True)
+def fake_transformers(monkeypatch):
+    """transformers with just the pieces stream_generate uses."""
+    module = types.ModuleType("transformers")
+    module.StoppingCriteria = object
+    module.StoppingCriteriaList = list
+    module.TextIteratorStreamer = FakeStreamer
+    module.set_seed = lambda seed: None
+    monkeypatch.setitem(sys.modules, "transformers", module)
+
+
+class FakeInputs(dict):
+    def to(self, device):
+        return self
+
+
+class FakeTokenizer:
+    pad_token_id = None
+    eos_token_id = 0
+
+    def __call__(self, text, return_tensors=None):
+        return FakeInputs(input_ids=[text])
+
+
+class FakeModel:
+    """Generates its chunks one by one, checking the stopping criteria between them."""
+
+    device = "cpu"
+
+    def __init__(self, chunks, delay=0.0, error=None):
+        self.chunks = chunks
+        self.delay = delay
+        self.error = error
+        self.produced = 0
+        self.finished = threading.Event()
+
+    def generate(self, streamer, stopping_criteria, **kwargs):
+        try:
+            for chunk in self.chunks:
+                if any(criterion(None, None) for criterion in stopping_criteria):
+                    return
+                if self.error is not None and self.produced == 1:
+                    raise self.error
+                streamer.put_text(chunk)
+                self.produced += 1
+                time.sleep(self.delay)
+            streamer.end()
+        finally:
+            self.finished.set()
+
+
+def collect(model, **request):
+    async def run():
+        return [chunk async for chunk in stream_generate(model, FakeTokenizer(), GenerationRequest(text="Hi", **request))]
+    return asyncio.run(run())
+
+
+class TestStreamGenerate:
+    """Test cases for stream_generate."""
+
+    def test_streams_all_chunks(self):
+        """Without stop strings every chunk is passed through."""
+        assert collect(FakeModel(["Hel", "lo", " world"])) == ["Hel", "lo", " world"]
+
+    def test_stops_at_stop_string(self):
+        """Output ends right before the first stop string."""
+        assert "".join(collect(FakeModel(["Hello", " END", " more"]), stop=["END"])) == "Hello "
+
+    def test_stop_string_split_across_chunks(self):
+        """A stop string spread over several chunks is never partly sent."""
+        chunks = collect(FakeModel(["Hello", " E", "N", "D tail"]), stop=["END"])
+        assert "".join(chunks) == "Hello "
+        assert "".join(collect(FakeModel(["Hello", " E", "nd"]), stop=["END"])) == "Hello End"
+
+    def test_client_disconnect_stops_generation(self):
+        """Closing the stream early stops the model instead of generating to the end."""
+        model = FakeModel([f"t{i} " for i in range(100)], delay=0.01)
+
+        async def run():
+            chunks = stream_generate(model, FakeTokenizer(), GenerationRequest(text="Hi"))
+            first = await chunks.__anext__()
+            await chunks.aclose()
+            return first
+
+        assert asyncio.run(run()) == "t0 "
+        assert model.finished.wait(2)
+        assert model.produced < 100
+
+    def test_generation_error_is_raised(self):
+        """An exception in the generation thread reaches the caller."""
+        with pytest.raises(RuntimeError, match="CUDA out of memory"):
+            collect(FakeModel(["a", "b", "c"], error=RuntimeError("CUDA out of memory")))
+
+def test_cut_at_stop():
+    """The earliest stop string wins."""
+    assert cut_at_stop("a END b STOP", ["STOP", "END"]) == 2
+    assert cut_at_stop("nothing", ["END"]) is None
+    assert cut_at_stop("text", None) is None
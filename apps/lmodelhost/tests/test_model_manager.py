@@ -0,0 +1,172 @@
+"""Tests for the LRU model manager."""
+
+import asyncio
+
+import pytest
+
+from apps.lmodelhost.model_manager import ModelManager, model_memory_bytes
+
+MB = 1024 * 1024
+
+
+class FakeModel:
+    def __init__(self, model_key: str, size_bytes: int):
+        self.model_key = model_key
+        self.size_bytes = size_bytes
+        self.shut_down = False
+
+
+class FakeEngine(FakeModel):
+    """A generation engine whose memory lives outside the process."""
+
+    def shutdown(self):
+        self.shut_down = True
+
+
+def make_manager(sizes, budget_mb=0.0, pinned=()):
+    loads = []
+
+    def loader(model_key):
+        loads.append(model_key)
+        if sizes[model_key] == 0:
+            return FakeEngine(model_key, 0)
+        return FakeModel(model_key, sizes[model_key])
+
+    manager = ModelManager(sizes, loader, memory_budget_mb=budget_mb, pinned=pinned, measure=lambda m: m.size_bytes)
+    return manager, loads
+
+
+def resident(manager):
+    return [key for key, model in manager.status()["models"].items() if model["loaded"]]
+
+
+class TestModelManager:
+    """Test cases for loading and LRU eviction."""
+
+    def test_loads_once(self):
+        """Models load on first use and are reused afterwards."""
+        manager, loads = make_manager({"a": MB})
+
+        async def run():
+            first, second = await asyncio.gather(manager.get("a"), manager.get("a"))
+            assert first is second
+
+        asyncio.run(run())
+        assert loads == ["a"]
+
+    def test_failed_load_is_retried(self):
+        """A loader that raises caches nothing, so the next request loads again."""
+        calls = []
+
+        def loader(model_key):
+            calls.append(model_key)
+            if len(calls) == 1:
+                raise RuntimeError("engine failed to start")
+            return FakeModel(model_key, MB)
+
+        manager = ModelManager(["a"], loader, measure=lambda m: m.size_bytes)
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(manager.get("a"))
+        assert resident(manager) == []
+
+        model = asyncio.run(manager.get("a"))
+        assert model.model_key == "a"
+        assert calls == ["a", "a"]
+        assert resident(manager) == ["a"]
+
+    def test_unknown_model(self):
+        """Unknown keys are rejected."""
+        manager, _ = make_manager({"a": MB})
+        with pytest.raises(KeyError):
+            asyncio.run(manager.get("b"))
+
+    def test_evicts_least_recently_used(self):
+        """Loading past the budget evicts the least recently used model."""
+        manager, _ = make_manager({"a": MB, "b": MB, "c": MB}, budget_mb=2)
+
+        async def run():
+            await manager.get("a")
+            await manager.get("b")
+            await manager.get("a")
+            await manager.get("c")
+
+        asyncio.run(run())
+        assert resident(manager) == ["a", "c"]
+
+    def test_pinned_models_stay(self):
+        """Pinned models are skipped, and unpinning brings the set back within budget."""
+        manager, _ = make_manager({"a": MB, "b": MB, "c": MB}, budget_mb=2, pinned=["a"])
+
+        async def run():
+            await manager.get("a")
+            await manager.get("b")
+            await manager.get("c")
+
+        asyncio.run(run())
+        assert resident(manager) == ["a", "c"]
+        manager.pin("c")
+        asyncio.run(manager.get("b"))
+        assert resident(manager) == ["a", "b", "c"]
+        manager.unpin("a")
+        assert resident(manager) == ["b", "c"]
+
+    def test_models_in_use_stay(self):
+        """A model serving a request is not evicted to make room until it is released."""
+        manager, _ = make_manager({"a": MB, "b": MB}, budget_mb=1)
+
+        async def run():
+            async with manager.use("a"):
+                await manager.get("b")
+                assert resident(manager) == ["a", "b"]
+
+        asyncio.run(run())
+        assert resident(manager) == ["b"]
+
+    def test_evict_shuts_engines_down(self):
+        """Evicting an engine shuts it down instead of only dropping the reference."""
+        manager, _ = make_manager({"llm": 0})
+        engine = asyncio.run(manager.get("llm"))
+        assert manager.evict("llm")
+        assert engine.shut_down
+        assert resident(manager) == []
+        assert not manager.evict("llm")
+
+
+class TestModelMemoryBytes:
+    """Test cases for measuring resident model size."""
+
+    def test_quantized_linear_layers_are_counted(self):
+        """Packed int8 weights (not in parameters()) are counted from the state_dict."""
+        torch = pytest.importorskip("torch")
+        model = torch.nn.Sequential(torch.nn.Linear(256, 256), torch.nn.Linear(256, 256))
+        quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        assert sum(p.numel() for p in quantized.parameters()) == 0
+        weights = 2 * 256 * 256
+        assert weights <= model_memory_bytes(quantized) < model_memory_bytes(model)
+
+    def test_pipeline_model_and_shared_tensors(self):
+        """A pipeline is measured by its model, and tied tensors are counted once."""
+        class Tensor:
+            def __init__(self, ptr, numel):
+                self.ptr, self.size = ptr, numel
+
+            def numel(self):
+                return self.size
+
+            def element_size(self):
+                return 4
+
+            def data_ptr(self):
+                return self.ptr
+
+        embedding = Tensor(1, 100)
+
+        class Module:
+            def state_dict(self, keep_vars=False):
+                return {"embed": embedding, "lm_head": embedding, "packed": (Tensor(2, 10), Tensor(3, 5)), "dtype": "qint8"}
+
+        class Pipeline:
+            model = Module()
+
+        assert model_memory_bytes(Pipeline()) == (100 + 10 + 5) * 4
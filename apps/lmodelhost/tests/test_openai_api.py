@@ -0,0 +1,166 @@
+"""Tests for the OpenAI-compatible chat completions API."""
+
+import asyncio
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from apps.lmodelhost import vllm_rayserve
+from apps.lmodelhost.batching import MicroBatcher
+from apps.lmodelhost.model_manager import ModelManager
+from apps.lmodelhost.openai_api import ChatMessage, create_openai_router, openai_stream_events, render_chat_prompt
+
+
+class TemplateTokenizer:
+    chat_template = "{{ messages }}"
+
+    def apply_chat_template(self, messages, tokenize, add_generation_prompt):
+        assert not tokenize and add_generation_prompt
+        return "".join(f"<|{m['role']}|>{m['content']}" for m in messages) + "<|assistant|>"
+
+    def encode(self, text):
+        return text.split()
+
+
+class FakeEngine:
+    supports_structured_output = True
+
+    def __init__(self):
+        self.requests = []
+
+    async def get_tokenizer(self):
+        return TemplateTokenizer()
+
+
+def _events(body: str):
+    return [line[len("data: "):] for line in body.split("\n\n") if line.startswith("data: ")]
+
+
+def make_client(generated_text="Hello STOP ignored"):
+    engine = FakeEngine()
+    configs = {"llama": {"model_id": "meta/llama"}, "qwen": {"model_id": "org/qwen"}}
+    manager = ModelManager(configs, lambda key: engine if key == "qwen" else object(), measure=lambda m: 0)
+    batchers = {"llama": MicroBatcher(lambda texts, params: [[{"generated_text": generated_text}] for _ in texts])}
+
+    async def stream(request):
+        engine.requests.append(request)
+        for chunk in ("Hi", " there"):
+            yield chunk
+
+    app = FastAPI()
+    app.include_router(create_openai_router(manager, configs, batchers, {"qwen": stream}), prefix="/v1")
+    return TestClient(app), engine
+
+
+class TestRenderChatPrompt:
+    """Test cases for chat prompt rendering."""
+
+    def test_transcript_without_template(self):
+        """Models without a chat template get a role transcript."""
+        messages = [ChatMessage(role="system", content="Be brief."), ChatMessage(role="user", content="Hi")]
+        assert render_chat_prompt(messages) == "system: Be brief.\nuser: Hi\nassistant:"
+
+    def test_chat_template_and_content_parts(self):
+        """The tokenizer's template is used, with the text parts of multi-part content joined."""
+        content = [{"type": "text", "text": "Hi "}, {"type": "image_url", "image_url": {}}, {"type": "text", "text": "you"}]
+        prompt = render_chat_prompt([ChatMessage(role="user", content=content)], TemplateTokenizer())
+        assert prompt == "<|user|>Hi you<|assistant|>"
+
+
+class TestChatCompletions:
+    """Test cases for /v1/chat/completions."""
+
+    def test_batched_completion_cuts_at_stop(self):
+        """Pipeline output is cut at the first stop sequence."""
+        client, _ = make_client()
+        body = client.post("/v1/chat/completions", json={
+            "model": "meta/llama", "messages": [{"role": "user", "content": "Hi"}], "stop": "STOP",
+        }).json()
+        assert body["choices"][0]["message"] == {"role": "assistant", "content": "Hello "}
+        assert body["model"] == "meta/llama"
+
+    def test_engine_prompt_uses_chat_template(self):
+        """Engine models are prompted with their tokenizer's chat template, and stop reaches the engine."""
+        client, engine = make_client()
+        body = client.post("/v1/chat/completions", json={
+            "model": "qwen", "messages": [{"role": "user", "content": "Hi"}], "stop": ["\n\n"],
+        }).json()
+        assert body["choices"][0]["message"]["content"] == "Hi there"
+        assert engine.requests[0].text == "<|user|>Hi<|assistant|>"
+        assert engine.requests[0].stop == ["\n\n"]
+        assert body["usage"] == {"prompt_tokens": 1, "completion_tokens": 2, "total_tokens": 3}
+
+    def test_streamed_completion(self):
+        """stream=true answers with chat.completion.chunk events ending in [DONE]."""
+        client, _ = make_client()
+        response = client.post("/v1/chat/completions", json={
+            "model": "qwen", "messages": [{"role": "user", "content": "Hi"}], "stream": True,
+        })
+        events = _events(response.text)
+        assert events[-1] == "[DONE]"
+        chunks = [json.loads(e) for e in events[:-1]]
+        assert chunks[0]["choices"][0]["delta"] == {"role": "assistant", "content": ""}
+        assert "".join(c["choices"][0]["delta"].get("content", "") for c in chunks) == "Hi there"
+        assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+        assert {c["object"] for c in chunks} == {"chat.completion.chunk"}
+        assert len({c["id"] for c in chunks}) == 1
+
+    def test_json_mode(self):
+        """JSON response formats reach engines with structured output and are rejected elsewhere."""
+        client, engine = make_client()
+
+        def post(model, response_format):
+            messages = [{"role": "user", "content": "Hi"}]
+            return client.post("/v1/chat/completions", json={"model": model, "messages": messages, "response_format": response_format})
+
+        assert post("qwen", {"type": "json_object"}).status_code == 200
+        assert engine.requests[0].response_format == {"type": "json_object"}
+        assert post("llama", {"type": "json_object"}).status_code == 400
+        assert post("qwen", {"type": "xml"}).status_code == 400
+        assert post("llama", {"type": "text"}).status_code == 200
+
+    def test_vllm_structured_output_params(self, monkeypatch):
+        """response_format maps to vLLM structured output parameters."""
+        class FakeParams:
+            def __init__(self, **kwargs):
+                self.kwargs = kwargs
+
+        monkeypatch.setattr(vllm_rayserve, "StructuredOutputsParams", FakeParams)
+        assert vllm_rayserve.structured_output_kwargs({"type": "text"}) == {}
+        assert vllm_rayserve.structured_output_kwargs({"type": "json_object"})["structured_outputs"].kwargs == {"json_object": True}
+        schema = {"type": "object", "properties": {"items": {"type": "array"}}}
+        params = vllm_rayserve.structured_output_kwargs({"type": "json_schema", "json_schema": {"name": "x", "schema": schema}})
+        assert params["structured_outputs"].kwargs == {"json": schema}
+
+    def test_unknown_model_and_tools(self):
+        """Unknown models are 404 and tool calling is rejected."""
+        client, _ = make_client()
+        messages = [{"role": "user", "content": "Hi"}]
+        assert client.post("/v1/chat/completions", json={"model": "gpt", "messages": messages}).status_code == 404
+        tools = [{"type": "function", "function": {"name": "f"}}]
+        assert client.post("/v1/chat/completions", json={"model": "qwen", "messages": messages, "tools": tools}).status_code == 400
+
+
+class TestOpenAIStreamEvents:
+    """Test cases for the chunk event format."""
+
+    def test_error_is_reported_and_source_closed(self):
+        """A failing source yields an error event, then [DONE], and is closed."""
+        closed = []
+
+        async def chunks():
+            try:
+                yield "partial"
+                raise RuntimeError("engine died")
+            finally:
+                closed.append(True)
+
+        async def run():
+            return [event async for event in openai_stream_events(chunks(), "qwen")]
+
+        events = _events("".join(asyncio.run(run())))
+        assert json.loads(events[1])["choices"][0]["delta"] == {"content": "partial"}
+        assert json.loads(events[2])["error"] == {"message": "engine died", "type": "server_error"}
+        assert events[-1] == "[DONE]"
+        assert closed == [True]
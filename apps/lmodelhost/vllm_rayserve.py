@@ -1,62 +1,220 @@
+import asyncio
+import inspect
+import logging
 import os
+import uuid
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Any
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from apps.lmodelhost.generation import GenerationRequest, sse_token_events, stream_generate
 
 # Only import vllm and ray if available
 try:
-    from vllm import LLM, SamplingParams
-    import ray
-    from ray import serve
+    from vllm import AsyncEngineArgs, AsyncLLMEngine, SamplingParams
 except ImportError:
-    LLM = None
+    AsyncEngineArgs = None
+    AsyncLLMEngine = None
     SamplingParams = None
+try:
+    from vllm.sampling_params import StructuredOutputsParams
+except ImportError:
+    StructuredOutputsParams = None
+try:
+    from vllm.sampling_params import GuidedDecodingParams
+except ImportError:
+    GuidedDecodingParams = None
+try:
+    import ray
+except ImportError:
     ray = None
-    serve = None
 
-class InferenceRequest(BaseModel):
-    text: str
+logger = logging.getLogger(__name__)
+
+# Continuous batching limits; tune for your GPU
+VLLM_MAX_NUM_SEQS = int(os.getenv("VLLM_MAX_NUM_SEQS", "64"))
+VLLM_MAX_NUM_BATCHED_TOKENS = int(os.getenv("VLLM_MAX_NUM_BATCHED_TOKENS", "8192"))
+VLLM_TENSOR_PARALLEL_SIZE = int(os.getenv("VLLM_TENSOR_PARALLEL_SIZE", "2"))
+VLLM_MAX_MODEL_LEN = int(os.getenv("VLLM_MAX_MODEL_LEN", "32768"))
+VLLM_ENFORCE_EAGER = os.getenv("VLLM_ENFORCE_EAGER", "true").lower() in ("1", "true", "yes")
+VLLM_GPU_MEMORY_UTILIZATION = float(os.getenv("VLLM_GPU_MEMORY_UTILIZATION", "0.6"))
+# Concurrent generations of the CPU stand-in (it has no continuous batching)
+LOCAL_GENERATION_CONCURRENCY = int(os.getenv("LOCAL_GENERATION_CONCURRENCY", "1"))
 
 class InferenceResponse(BaseModel):
     result: Any
 
-def create_vllm_rayserve_router(model_id: str) -> APIRouter:
-    router = APIRouter()
-    llm = None
-    # Set vLLM concurrency and memory utilization for small GPU
-    os.environ["VLLM_MAX_CONCURRENT_REQUESTS"] = "1"
-    os.environ["VLLM_GPU_MEMORY_UTILIZATION"] = os.getenv("VLLM_GPU_MEMORY_UTILIZATION", "0.6")
-    os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "max_split_size_mb:32"
-    # You can further tune parameters below for your GPU
-    # llm_kwargs = {
-    #     "max_num_batched_tokens": 2048,  # reduce if OOM
-    #     "max_num_seqs": 1,               # only 1 concurrent sequence
-    #     "dtype": "auto",                # let vllm pick best dtype
-    # }
-    llm_kwargs = {
-        "max_num_batched_tokens": 1024,
-        "max_num_seqs": 1,
-        # "dtype": "float16",
-        # "swap_space": 8,  # 8 GiB swap, adjust as needed
-        "tensor_parallel_size": 2,
-        "max_model_len": 32768,
-        "enforce_eager": True,
-    }
-    sampling_params = SamplingParams(max_tokens=256) if SamplingParams else None
-
-    @router.on_event("startup")
-    async def startup_event():
-        nonlocal llm
-        if ray and serve and LLM:
+
+def structured_output_kwargs(response_format: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    SamplingParams keyword arguments that constrain output to JSON for an OpenAI-style
+    response_format (StructuredOutputsParams in current vLLM, GuidedDecodingParams before).
+    """
+    if not response_format or response_format.get("type", "text") == "text":
+        return {}
+    if response_format["type"] == "json_schema":
+        spec = {"json": (response_format.get("json_schema") or {}).get("schema") or {"type": "object"}}
+    else:
+        spec = {"json_object": True}
+    if StructuredOutputsParams is not None:
+        return {"structured_outputs": StructuredOutputsParams(**spec)}
+    if GuidedDecodingParams is not None:
+        return {"guided_decoding": GuidedDecodingParams(**spec)}
+    raise ValueError("This vLLM version does not support structured output")
+
+
+class VLLMEngine:
+    """
+    vLLM's async engine: requests from all callers share its continuous batch, and each
+    caller streams its own tokens. Closing a stream aborts its request in the engine.
+    """
+
+    supports_structured_output = StructuredOutputsParams is not None or GuidedDecodingParams is not None
+
+    def __init__(self, model_id: str):
+        engine_kwargs = {
+            "max_num_seqs": VLLM_MAX_NUM_SEQS,
+            "max_num_batched_tokens": VLLM_MAX_NUM_BATCHED_TOKENS,
+            "tensor_parallel_size": VLLM_TENSOR_PARALLEL_SIZE,
+            "max_model_len": VLLM_MAX_MODEL_LEN,
+            "enforce_eager": VLLM_ENFORCE_EAGER,
+            "gpu_memory_utilization": VLLM_GPU_MEMORY_UTILIZATION,
+        }
+        os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "max_split_size_mb:32")
+        if VLLM_TENSOR_PARALLEL_SIZE > 1 and ray is not None:
             if not ray.is_initialized():
                 ray.init()
-            llm = LLM(model=model_id, **llm_kwargs)
+            engine_kwargs["distributed_executor_backend"] = "ray"
+        self.engine = AsyncLLMEngine.from_engine_args(AsyncEngineArgs(model=model_id, **engine_kwargs))
+        self._tokenizer = None
+
+    async def get_tokenizer(self):
+        """The engine's tokenizer (for chat templates and token counts)."""
+        if self._tokenizer is None:
+            tokenizer = self.engine.get_tokenizer()
+            self._tokenizer = await tokenizer if inspect.isawaitable(tokenizer) else tokenizer
+        return self._tokenizer
+
+    def shutdown(self) -> None:
+        """
+        Stops the engine's background loop and workers so their GPU memory is released.
+        Called by the ModelManager when the engine is evicted.
+        """
+        engine, self.engine = self.engine, None
+        if engine is None:
+            return
+        if hasattr(engine, "shutdown"):
+            engine.shutdown()
+        elif hasattr(engine, "shutdown_background_loop"):
+            engine.shutdown_background_loop()
+        del engine
+        try:
+            from vllm.distributed.parallel_state import destroy_distributed_environment, destroy_model_parallel
+            destroy_model_parallel()
+            destroy_distributed_environment()
+        except ImportError:
+            pass
+
+    async def stream(self, request: GenerationRequest) -> AsyncIterator[str]:
+        request_id = uuid.uuid4().hex
+        sampling_params = SamplingParams(
+            **request.vllm_sampling_kwargs(), **structured_output_kwargs(request.response_format)
+        )
+        sent = 0
+        finished = False
+        try:
+            async for output in self.engine.generate(request.text, sampling_params, request_id):
+                text = output.outputs[0].text
+                if len(text) > sent:
+                    yield text[sent:]
+                    sent = len(text)
+                finished = output.finished
+        finally:
+            if not finished:
+                await self.engine.abort(request_id)
+
+
+class LocalGenerationEngine:
+    """
+    CPU stand-in used when vLLM is not installed: a transformers causal LM streaming tokens
+    from a worker thread. It runs up to LOCAL_GENERATION_CONCURRENCY generations at a time.
+    """
+
+    def __init__(self, model_id: str):
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = AutoModelForCausalLM.from_pretrained(model_id)
+        self.model.eval()
+        self._slots = None
+
+    async def get_tokenizer(self):
+        return self.tokenizer
+
+    async def stream(self, request: GenerationRequest) -> AsyncIterator[str]:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(max(1, LOCAL_GENERATION_CONCURRENCY))
+        async with self._slots:
+            chunks = stream_generate(self.model, self.tokenizer, request)
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+
+
+def create_generation_engine(model_id: str):
+    """
+    Returns the async vLLM engine for model_id, or the local CPU stand-in when vLLM is not
+    installed. Raises if neither can be created, so the ModelManager caches nothing and the
+    next request retries the load.
+    """
+    if AsyncLLMEngine is not None:
+        return VLLMEngine(model_id)
+    logger.warning(f"vllm not installed; serving {model_id} with the local CPU stand-in")
+    try:
+        return LocalGenerationEngine(model_id)
+    except Exception as e:
+        logger.error(f"Could not load {model_id} for local generation: {e}")
+        raise
+
+
+def create_engine_streamer(model_key: str, manager) -> Callable[[GenerationRequest], AsyncIterator[str]]:
+    """
+    Token streams from a generation engine managed by the ModelManager: the engine is
+    created by create_generation_engine on the first request (or warm-up).
+    """
+    async def stream_with_engine(request: GenerationRequest) -> AsyncIterator[str]:
+        # Hold the engine for the whole stream so it cannot be evicted mid-generation
+        async with manager.use(model_key) as engine:
+            chunks = engine.stream(request)
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+
+    return stream_with_engine
+
+
+def create_vllm_rayserve_router(
+    model_key: str, manager, streamer: Optional[Callable[[GenerationRequest], AsyncIterator[str]]] = None
+) -> APIRouter:
+    """
+    /infer and /stream for a generation engine. Pass the streamer to share it with other
+    routers (e.g. the OpenAI-compatible API).
+    """
+    router = APIRouter()
+    stream_with_engine = streamer or create_engine_streamer(model_key, manager)
 
     @router.post("/infer", response_model=InferenceResponse)
-    async def infer(request: InferenceRequest):
-        if not llm:
-            return {"result": "Model not loaded or vllm/ray not installed."}
-        outputs = llm.generate([request.text], sampling_params)[0].outputs[0].text
+    async def infer(request: GenerationRequest):
+        async with manager.use(model_key) as engine:
+            outputs = "".join([chunk async for chunk in engine.stream(request)])
         return {"result": outputs}
 
+    @router.post("/stream")
+    async def stream(request: GenerationRequest):
+        return StreamingResponse(sse_token_events(stream_with_engine(request)), media_type="text/event-stream")
+
     return router
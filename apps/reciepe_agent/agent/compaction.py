@@ -0,0 +1,260 @@
+"""Bounded conversation state for the Recipe Agent graph.
+
+Two things keep per-step state (and every checkpoint) from growing with
+the length of a conversation:
+
+* Large artifacts (recipe text, plans, tool outputs) are stored once in
+  an ``ArtifactStore`` and the state holds an ``artifact:<digest>``
+  reference to them. Nodes call ``resolve`` where they need the text.
+  Without a configured store the values simply stay inline.
+* ``compact_messages`` keeps the message window under a token budget.
+  When it overflows, the oldest turns are removed and folded into a
+  single short summary message at the head of the conversation.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.messages import BaseMessage, RemoveMessage, SystemMessage
+
+try:
+    from langgraph.graph.message import REMOVE_ALL_MESSAGES
+except ImportError:
+    REMOVE_ALL_MESSAGES = "__remove_all__"
+
+
+logger = logging.getLogger(__name__)
+
+# Directory for artifact files. When empty, values stay inline in the state, unless a
+# durable checkpointer is opened (see agent.sessions), which uses DEFAULT_ARTIFACT_DIR_NAME
+# next to its database.
+ARTIFACT_DIR = os.getenv("RECIPE_AGENT_ARTIFACT_DIR", "")
+DEFAULT_ARTIFACT_DIR_NAME = "artifacts"
+# Unreferenced artifacts younger than this are kept by sweeps (runs in flight may still use them)
+ARTIFACT_SWEEP_GRACE_SECONDS = float(os.getenv("RECIPE_AGENT_ARTIFACT_SWEEP_GRACE_SECONDS", "3600"))
+# Values longer than this many characters are stored by reference
+ARTIFACT_INLINE_LIMIT = int(os.getenv("RECIPE_AGENT_ARTIFACT_INLINE_LIMIT", "1024"))
+# Token budget of the message window and messages always kept verbatim
+MESSAGE_TOKEN_BUDGET = int(os.getenv("RECIPE_AGENT_MESSAGE_TOKEN_BUDGET", "4000"))
+MESSAGE_KEEP_LAST = int(os.getenv("RECIPE_AGENT_MESSAGE_KEEP_LAST", "4"))
+
+ARTIFACT_PREFIX = "artifact:"
+SUMMARY_MESSAGE_ID = "conversation-summary"
+_SUMMARY_HEADER = "Summary of earlier conversation:"
+_SUMMARY_MAX_LINES = 20
+_SUMMARY_LINE_CHARS = 120
+
+
+class ArtifactStore:
+    """Content-addressed side store for large state values.
+
+    Entries are never evicted on their own; ``sweep`` removes the ones no
+    live checkpoint references any more.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._memory: Dict[str, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.txt")
+
+    def put(self, text: str) -> str:
+        """Store ``text`` and return its reference."""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if self.directory:
+            path = self._path(digest)
+            if os.path.exists(path):
+                # Refresh the age so a concurrent sweep does not take it
+                os.utime(path)
+            else:
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as fh:
+                    fh.write(text)
+                os.replace(tmp_path, path)
+        else:
+            with self._lock:
+                self._memory[digest] = (time.time(), text)
+        return f"{ARTIFACT_PREFIX}{digest}"
+
+    def get(self, ref: str) -> Optional[str]:
+        """Text stored under ``ref``, or ``None`` if it is gone."""
+        digest = ref[len(ARTIFACT_PREFIX):]
+        if self.directory:
+            try:
+                with open(self._path(digest), encoding="utf-8") as fh:
+                    return fh.read()
+            except FileNotFoundError:
+                return None
+        with self._lock:
+            entry = self._memory.get(digest)
+        return entry[1] if entry else None
+
+    def sweep(self, keep: Set[str], min_age_seconds: float = ARTIFACT_SWEEP_GRACE_SECONDS) -> int:
+        """Delete artifacts not in ``keep`` (a set of references) and older than ``min_age_seconds``.
+
+        The grace period covers artifacts written by runs that have not
+        checkpointed yet. Returns the number of artifacts deleted.
+        """
+        keep_digests = {ref[len(ARTIFACT_PREFIX):] for ref in keep}
+        cutoff = time.time() - min_age_seconds
+        deleted = 0
+        if self.directory:
+            for name in os.listdir(self.directory):
+                digest, ext = os.path.splitext(name)
+                path = os.path.join(self.directory, name)
+                if ext != ".txt" or digest in keep_digests:
+                    continue
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        deleted += 1
+                except FileNotFoundError:
+                    pass
+        else:
+            with self._lock:
+                for digest in [d for d, (created, _) in self._memory.items() if d not in keep_digests and created < cutoff]:
+                    del self._memory[digest]
+                    deleted += 1
+        if deleted:
+            logger.info(f"Deleted {deleted} unreferenced artifacts")
+        return deleted
+
+
+# Store for large values; None keeps them inline in the state (see use_artifact_store)
+artifact_store: Optional[ArtifactStore] = ArtifactStore(ARTIFACT_DIR) if ARTIFACT_DIR else None
+
+
+def use_artifact_store(store: Optional[ArtifactStore]) -> None:
+    """Install the process-wide artifact store (``None`` keeps values inline)."""
+    global artifact_store
+    artifact_store = store
+
+
+def artifact_refs(value: Any) -> Set[str]:
+    """Every artifact reference found anywhere inside ``value``."""
+    refs: Set[str] = set()
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if is_artifact_ref(item):
+            refs.add(item)
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set)):
+            stack.extend(item)
+        elif isinstance(item, BaseMessage):
+            stack.append(item.content)
+    return refs
+
+
+def is_artifact_ref(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(ARTIFACT_PREFIX)
+
+
+def externalize(value: Any, store: ArtifactStore = None, limit: int = ARTIFACT_INLINE_LIMIT) -> Any:
+    """Replace a large string (or JSON-able value) with an artifact reference.
+
+    Values stay inline when no artifact store is configured.
+    """
+    store = store or artifact_store
+    if store is None or value is None or is_artifact_ref(value):
+        return value
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    if len(text) <= limit:
+        return value
+    return store.put(text)
+
+
+def resolve(value: Any, store: ArtifactStore = None) -> Any:
+    """Inverse of ``externalize``; returns the stored text for references."""
+    if not is_artifact_ref(value):
+        return value
+    store = store or artifact_store
+    text = store.get(value) if store is not None else None
+    if text is None:
+        logger.warning(f"Artifact {value} is no longer available")
+        return ""
+    return text
+
+
+def externalize_recipe(recipe: Dict[str, Any]) -> Dict[str, Any]:
+    """Recipe dict with its full text stored by reference."""
+    return {**recipe, "recipe_msg": externalize(recipe.get("recipe_msg"))} if "recipe_msg" in recipe else recipe
+
+
+def resolve_recipe(recipe: Dict[str, Any]) -> Dict[str, Any]:
+    """Recipe dict with its full text inline."""
+    return {**recipe, "recipe_msg": resolve(recipe.get("recipe_msg"))} if "recipe_msg" in recipe else recipe
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    """Rough token count of a message (about four characters per token)."""
+    content = message.content
+    if not isinstance(content, str):
+        content = json.dumps(content, default=str)
+    tool_calls = getattr(message, "tool_calls", None)
+    extra = len(json.dumps(tool_calls, default=str)) if tool_calls else 0
+    return (len(content) + extra) // 4 + 4
+
+
+def _summary_line(message: BaseMessage) -> str:
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+    first_line = next((line.strip() for line in content.splitlines() if line.strip()), "")
+    if len(first_line) > _SUMMARY_LINE_CHARS:
+        first_line = first_line[:_SUMMARY_LINE_CHARS - 3] + "..."
+    role = {"human": "User", "ai": "Assistant", "tool": "Tool"}.get(message.type, message.type.title())
+    return f"- {role}: {first_line}"
+
+
+def compact_messages(
+    existing: Sequence[BaseMessage],
+    new: Sequence[BaseMessage],
+    max_tokens: int = MESSAGE_TOKEN_BUDGET,
+    keep_last: int = MESSAGE_KEEP_LAST,
+) -> List[BaseMessage]:
+    """Update for an ``add_messages`` field that appends ``new`` within the budget.
+
+    Returns ``new`` unchanged while the window fits. Otherwise the oldest
+    messages are evicted, summarized into one message at the head of the
+    window, and the whole window is rewritten.
+    """
+    window = list(existing) + list(new)
+    if sum(estimate_tokens(m) for m in window) <= max_tokens:
+        return list(new)
+
+    summary_lines: List[str] = []
+    rest = []
+    for message in window:
+        if message.id == SUMMARY_MESSAGE_ID:
+            summary_lines.extend(line for line in message.content.splitlines()[1:] if line)
+        else:
+            rest.append(message)
+
+    # Never evict tool results apart from the call that produced them
+    keep_from = max(len(rest) - keep_last, 0)
+    while 0 < keep_from < len(rest) and rest[keep_from].type == "tool":
+        keep_from -= 1
+    budget = max_tokens - estimate_tokens(SystemMessage(content=_SUMMARY_HEADER)) - _SUMMARY_MAX_LINES * 32
+    total = sum(estimate_tokens(m) for m in rest)
+    evict = 0
+    while evict < keep_from and total > budget:
+        total -= estimate_tokens(rest[evict])
+        evict += 1
+    while evict < len(rest) and rest[evict].type == "tool":
+        total -= estimate_tokens(rest[evict])
+        evict += 1
+
+    summary_lines.extend(_summary_line(m) for m in rest[:evict])
+    summary_lines = summary_lines[-_SUMMARY_MAX_LINES:]
+    summary = SystemMessage(id=SUMMARY_MESSAGE_ID, content="\n".join([_SUMMARY_HEADER] + summary_lines))
+    logger.info(f"Compacted conversation: evicted {evict} messages, {len(rest) - evict} kept")
+    return [RemoveMessage(id=REMOVE_ALL_MESSAGES), summary] + rest[evict:]
@@ -0,0 +1,274 @@
+"""Structured recipe extraction from LLM output.
+
+In structured mode (``RECIPE_STRUCTURED_OUTPUT``) the recipe prompt asks
+the model for JSON, and each recipe is validated against the ``Recipe``
+and ``Ingredient`` models. ``IncrementalRecipeParser`` scans the output as
+it streams and returns every recipe object as soon as it is complete, so
+recipes can be surfaced before the response finishes. When the output is
+not JSON (structured mode off, or the model ignored the format), a
+compiled-regex parser reads the markdown ingredient and instruction lists
+instead.
+
+Structured ingredients let the plan stage build its grocery plan directly
+(``plan_from_recipe``) instead of asking the LLM to re-read the recipe.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from models.recipe import Ingredient, Recipe
+
+
+logger = logging.getLogger(__name__)
+
+RECIPE_STRUCTURED_OUTPUT = os.getenv("RECIPE_STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+
+_STRUCTURAL = re.compile(r'[{}\[\]"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+
+_TITLE_LINE = re.compile(r"^\s*(?:#{1,6}\s+)?(?:\*\*)?(?P<title>[^\n*]*?recipe[^\n*]*?)(?:\*\*)?:?\s*$", re.IGNORECASE | re.MULTILINE)
+_HEADING_MARKUP = re.compile(r"^\s*#{1,6}\s+|\*\*|__")
+_SECTION = re.compile(
+    r"^\s*(?:#{1,6}\s+)?(?:\*\*)?\s*(?P<name>ingredients|instructions|directions|method|steps|preparation|tips|notes|nutrition)\b[^\n]{0,40}$",
+    re.IGNORECASE,
+)
+_OTHER_HEADING = re.compile(r"^\s*(?:#{1,6}\s+\S.*|\*\*[^*]+\*\*:?)\s*$")
+_LIST_ITEM = re.compile(r"^\s*(?:[*\-•]|\d+[.)])\s+(?P<item>.+?)\s*$")
+_SUBHEADING = re.compile(r"^\*\*[^*]+\*\*:?$")
+_INGREDIENT = re.compile(
+    r"^(?P<amount>(?:\d+\s+\d+/\d+|\d+(?:[./]\d+)?|[¼½¾⅓⅔⅛])(?:\s*(?:-|to)\s*\d+(?:[./]\d+)?)?)?\s*"
+    r"(?P<unit>(?:cups?|tbsps?|tablespoons?|tsps?|teaspoons?|g|grams?|kg|ml|l|liters?|litres?|oz|ounces?|lbs?|pounds?"
+    r"|cloves?|pinch(?:es)?|cans?|slices?|sticks?|bunch(?:es)?|handfuls?)\.?(?=\s))?\s*"
+    r"(?:of\s+)?(?P<name>[^,(]+?)\s*(?:[,(]\s*(?P<notes>[^)]*?)\)?)?\s*$",
+    re.IGNORECASE,
+)
+
+_INGREDIENT_SECTIONS = ("ingredients",)
+_INSTRUCTION_SECTIONS = ("instructions", "directions", "method", "steps", "preparation")
+
+
+def _recipe_id(title: str) -> str:
+    return "llm-" + hashlib.sha1(title.strip().lower().encode()).hexdigest()[:12]
+
+
+def parse_ingredient_line(line: str) -> Ingredient:
+    """Split an ingredient line such as ``2 cups flour, sifted`` into its fields."""
+    text = _HEADING_MARKUP.sub("", line).strip()
+    match = _INGREDIENT.match(text)
+    if not match or not match.group("name"):
+        return Ingredient(name=text)
+    return Ingredient(
+        name=match.group("name").strip(),
+        amount=match.group("amount"),
+        unit=match.group("unit"),
+        notes=match.group("notes") or None,
+    )
+
+
+def to_recipe(data: Any) -> Optional[Recipe]:
+    """Validate a parsed JSON object as a ``Recipe``, or ``None`` if it is not one."""
+    if not isinstance(data, dict) or not data.get("title"):
+        return None
+    data = dict(data)
+    data.setdefault("id", _recipe_id(str(data["title"])))
+    data["ingredients"] = [
+        parse_ingredient_line(item) if isinstance(item, str) else item
+        for item in data.get("ingredients") or []
+    ]
+    instructions = data.get("instructions") or []
+    if isinstance(instructions, str):
+        instructions = [line.strip() for line in instructions.splitlines() if line.strip()]
+    data["instructions"] = instructions
+    try:
+        return Recipe.model_validate(data)
+    except ValidationError as e:
+        logger.warning(f"Discarding recipe that failed validation: {e.error_count()} errors")
+        return None
+
+
+class IncrementalRecipeParser:
+    """Finds complete recipe objects in a JSON stream as tokens arrive.
+
+    Recipes are the objects inside a top-level ``{"recipes": [...]}`` array
+    (or a top-level array). The scanner only visits structural characters,
+    and each recipe's text is parsed once, when its closing brace arrives.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._stack: List[Tuple[str, int]] = []
+        self._in_string = False
+        self.recipes: List[Recipe] = []
+
+    def _in_recipe_slot(self) -> bool:
+        openers = [opener for opener, _ in self._stack]
+        return openers == ["{", "["] or openers == ["["]
+
+    def feed(self, chunk: str) -> List[Recipe]:
+        """Add streamed text; return the recipes completed by it."""
+        self._text += chunk
+        text, i = self._text, self._pos
+        found: List[Recipe] = []
+        while True:
+            if self._in_string:
+                match = _STRING_SPECIAL.search(text, i)
+                if match is None:
+                    i = len(text)
+                    break
+                if match.group() == "\\":
+                    if match.end() >= len(text):
+                        # Wait for the escaped character
+                        i = match.start()
+                        break
+                    i = match.end() + 1
+                    continue
+                self._in_string = False
+                i = match.end()
+                continue
+            match = _STRUCTURAL.search(text, i)
+            if match is None:
+                i = len(text)
+                break
+            char, i = match.group(), match.end()
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append((char, match.start()))
+            elif self._stack:
+                opener, start = self._stack.pop()
+                if char == "}" and opener == "{" and self._in_recipe_slot():
+                    try:
+                        recipe = to_recipe(json.loads(text[start:i]))
+                    except json.JSONDecodeError:
+                        recipe = None
+                    if recipe is not None:
+                        found.append(recipe)
+        self._pos = i
+        self.recipes.extend(found)
+        return found
+
+    def close(self) -> List[Recipe]:
+        """All recipes in the stream, including a lone top-level recipe object."""
+        if self.recipes:
+            return list(self.recipes)
+        try:
+            data = json.loads(_FENCE.sub("", self._text))
+        except json.JSONDecodeError:
+            return []
+        recipe = to_recipe(data)
+        return [recipe] if recipe is not None else []
+
+
+def parse_markdown_recipe(content: str) -> Optional[Recipe]:
+    """Read the title, ingredient list and instruction list of a markdown recipe."""
+    lines = content.splitlines()
+    title_match = _TITLE_LINE.search(content)
+    if title_match:
+        title = title_match.group("title").strip()
+    else:
+        title = next((_HEADING_MARKUP.sub("", l).strip() for l in lines if l.strip()), "")
+    if not title:
+        return None
+
+    ingredients: List[Ingredient] = []
+    instructions: List[str] = []
+    section = None
+    for line in lines:
+        heading = _SECTION.match(line)
+        if heading:
+            section = heading.group("name").lower()
+            continue
+        if _OTHER_HEADING.match(line) and not _LIST_ITEM.match(line):
+            if not _SUBHEADING.match(line.strip()):
+                section = None
+            continue
+        item = _LIST_ITEM.match(line)
+        if not item or section is None:
+            continue
+        text = item.group("item")
+        if _SUBHEADING.match(text):
+            continue
+        if section in _INGREDIENT_SECTIONS:
+            ingredients.append(parse_ingredient_line(text))
+        elif section in _INSTRUCTION_SECTIONS:
+            instructions.append(_HEADING_MARKUP.sub("", text).strip())
+    return Recipe(id=_recipe_id(title), title=title, ingredients=ingredients, instructions=instructions)
+
+
+def render_recipe_markdown(recipe: Recipe) -> str:
+    """Readable markdown of a structured recipe, for display and prompts."""
+    parts = [f"## {recipe.title}"]
+    if recipe.description:
+        parts.append(recipe.description)
+    facts = [
+        f"{label}: {value}" for label, value in (
+            ("Servings", recipe.servings),
+            ("Prep", f"{recipe.prep_time} min" if recipe.prep_time else None),
+            ("Cook", f"{recipe.cook_time} min" if recipe.cook_time else None),
+            ("Difficulty", recipe.difficulty),
+        ) if value
+    ]
+    if facts:
+        parts.append(" | ".join(facts))
+    if recipe.ingredients:
+        parts.append("**Ingredients:**\n" + "\n".join(f"* {format_ingredient(i)}" for i in recipe.ingredients))
+    if recipe.instructions:
+        parts.append("**Instructions:**\n" + "\n".join(f"{n}. {step}" for n, step in enumerate(recipe.instructions, 1)))
+    return "\n\n".join(parts)
+
+
+def format_ingredient(ingredient: Any) -> str:
+    """``amount unit name (notes)`` of an ``Ingredient`` or its dict form."""
+    if isinstance(ingredient, Ingredient):
+        ingredient = ingredient.model_dump()
+    text = " ".join(str(ingredient[k]) for k in ("amount", "unit", "name") if ingredient.get(k))
+    return f"{text} ({ingredient['notes']})" if ingredient.get("notes") else text
+
+
+def content_text(content: Any) -> str:
+    """Text of message content; the text parts of a content block list are joined."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, str):
+                parts.append(part)
+            elif isinstance(part, dict) and part.get("type") == "text":
+                parts.append(part.get("text", ""))
+        return "".join(parts)
+    return ""
+
+
+def extract_recipes(content: str) -> Tuple[List[Recipe], bool]:
+    """Structured recipes in an LLM response, and whether they came from JSON."""
+    parser = IncrementalRecipeParser()
+    parser.feed(content)
+    recipes = parser.close()
+    if recipes:
+        return recipes, True
+    recipe = parse_markdown_recipe(content)
+    return ([recipe] if recipe is not None else []), False
+
+
+def recipe_state(recipe: Recipe, recipe_msg: str) -> Dict[str, Any]:
+    """State form of a recipe: its structured fields plus the display text."""
+    return {**recipe.model_dump(exclude_none=True), "recipe_msg": recipe_msg}
+
+
+def plan_from_recipe(recipe: Dict[str, Any]) -> Optional[str]:
+    """Grocery plan for a recipe with structured ingredients, without an LLM call."""
+    ingredients = recipe.get("ingredients") or []
+    if not ingredients:
+        return None
+    steps = [f"{n}. Search the grocery store for {format_ingredient(i)}" for n, i in enumerate(ingredients, 1)]
+    steps.append(f"{len(steps) + 1}. Pick the best-priced available product for each ingredient and add them to the cart")
+    return f"Grocery plan for {recipe.get('title', 'the recipe')}:\n" + "\n".join(steps)
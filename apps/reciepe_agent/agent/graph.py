@@ -2,11 +2,14 @@
 
 import asyncio
 import logging
-from typing import Literal, List, Optional
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Literal, List, Optional
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
 from langchain_core.messages import HumanMessage
 from langchain_core.tools import BaseTool
+from langgraph.checkpoint.base import BaseCheckpointSaver
 
 from agent.state import RecipeAgentState
 from agent.nodes import (
@@ -17,6 +20,10 @@ from agent.nodes import (
     human_input_node
 )
 from agent.tools import recipe_tools
+from agent.mcp_config import mcp_config
+from agent.mcp_transport import MCPTransportPool, SingleFlight, coalesce_tools
+from agent.tool_cache import cache_tools, tool_result_cache
+from agent.tool_executor import TOOL_CONCURRENCY_LIMITS, make_tool_execution_node
 
 # MCP client setup with error handling
 try:
@@ -31,6 +38,8 @@ logger = logging.getLogger(__name__)
 # Global variables for MCP tools
 _mcp_client: Optional[any] = None
 _mcp_tools: List[BaseTool] = []
+mcp_transport_pool = MCPTransportPool(mcp_config)
+mcp_single_flight = SingleFlight()
 
 
 async def initialize_mcp_client():
@@ -42,25 +51,24 @@ async def initialize_mcp_client():
         return []
     
     try:
-        # Initialize MCP client
-        _mcp_client = MultiServerMCPClient(
-            {
-                "grocery": {
-                    "transport": "streamable_http",
-                    "url": "http://localhost:8000/mcp/"
-                },
-            }
-        )
+        # Initialize MCP client once; later calls only refetch the tool list.
+        # Servers and pool sizes come from mcp_config; calls share pooled connections.
+        if _mcp_client is None:
+            _mcp_client = MultiServerMCPClient(mcp_transport_pool.connections())
         
         # Get tools asynchronously
-        _mcp_tools = await _mcp_client.get_tools()
+        tools = await _mcp_client.get_tools()
+        if mcp_config.coalesce_calls:
+            tools = coalesce_tools(tools, mcp_single_flight)
+        # Cache lookups run before coalescing, so only misses reach the server
+        _mcp_tools = cache_tools(tools, tool_result_cache)
         logger.info(f"Loaded {len(_mcp_tools)} MCP tools")
         return _mcp_tools
         
     except Exception as e:
+        # Keep the last loaded tools so a transient failure does not drop them
         logger.error(f"Failed to initialize MCP client: {e}")
-        _mcp_tools = []
-        return []
+        return _mcp_tools.copy()
 
 
 def get_mcp_tools() -> List[BaseTool]:
@@ -116,13 +124,14 @@ def should_continue(state: RecipeAgentState) -> Literal["continue", "end"]:
 
 
 
-def create_recipe_agent(include_mcp_tools: bool = False) -> StateGraph:
+def create_recipe_agent(include_mcp_tools: bool = False, checkpointer: Optional[BaseCheckpointSaver] = None) -> StateGraph:
     
     
     """Create the Recipe Agent graph with enhanced workflow.
     
     Args:
         include_mcp_tools: Whether to include MCP tools in the agent
+        checkpointer: Checkpointer that lets runs pause at confirmation points and resume
     """
     
     # Create the graph
@@ -152,8 +161,8 @@ def create_recipe_agent(include_mcp_tools: bool = False) -> StateGraph:
         else:
             logger.warning("MCP tools requested but none available")
 
-    # Add tool_execution node for tool execution (mainly used by grocery_llm)
-    tool_execution_node = ToolNode(all_tools)
+    # Add tool_execution node; runs all of a response's tool calls concurrently
+    tool_execution_node = make_tool_execution_node(all_tools, per_tool_limits=TOOL_CONCURRENCY_LIMITS)
     workflow.add_node("tool_execution", tool_execution_node)
 
     # Set entry point
@@ -249,7 +258,7 @@ def create_recipe_agent(include_mcp_tools: bool = False) -> StateGraph:
     workflow.add_edge("tool_execution", END)
     
     # Compile the graph
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
 
 
 # Create the default agent instance (without MCP tools for now)
@@ -271,9 +280,9 @@ async def create_recipe_agent_with_mcp() -> StateGraph:
         return create_recipe_agent(include_mcp_tools=False)
 
 
-def run_recipe_agent(query: str, **kwargs) -> dict:
-    """Run the recipe agent with a query (static tools only)."""
-    initial_state = {
+def _initial_state(query: str) -> dict:
+    """Build the initial graph state for a user query."""
+    return {
         "user_query": query,
         "messages": [HumanMessage(content=query)],
         "recipes": [],
@@ -287,31 +296,122 @@ def run_recipe_agent(query: str, **kwargs) -> dict:
         "processing_complete": False,
         "tool_outputs": {}
     }
-    
-    # Run the agent asynchronously
-    async def _run():
-        return await recipe_agent.ainvoke(initial_state)
-    return asyncio.run(_run())
 
 
-async def run_recipe_agent_with_mcp(query: str, **kwargs) -> dict:
-    """Run the recipe agent with a query (including MCP tools)."""
-    initial_state = {
-        "user_query": query,
-        "messages": [HumanMessage(content=query)],
-        "recipes": [],
-        "searched_ingredients": [],
-        "ingredients_to_cart": [],
-        "needs_user_input": False,
-        "recipe_confirmed": False,
-        "grocery_items_confirmed": None,
-        "workflow_stage": "initial",  # Start with initial instead of None
-        "error_message": None,
-        "processing_complete": False,
-        "tool_outputs": {}
+# Sync nodes run in the event loop's default executor; bound it so a burst
+# of requests cannot spawn an unbounded number of threads.
+NODE_WORKERS = int(os.getenv("RECIPE_AGENT_NODE_WORKERS", "0"))
+# Maximum number of graph runs in flight per process (0 = unlimited).
+MAX_CONCURRENT_RUNS = int(os.getenv("RECIPE_AGENT_MAX_CONCURRENT_RUNS", "0"))
+
+_run_slots: Optional[asyncio.Semaphore] = None
+
+
+def install_node_executor(max_workers: int = NODE_WORKERS) -> Optional[ThreadPoolExecutor]:
+    """Install a bounded thread pool as the running loop's default executor.
+    
+    Must be called from inside the event loop (e.g. a FastAPI startup hook).
+    Returns the executor, or None when ``max_workers`` is 0.
+    """
+    if max_workers <= 0:
+        return None
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="recipe-node")
+    asyncio.get_running_loop().set_default_executor(executor)
+    logger.info(f"Running sync graph nodes on {max_workers} worker threads")
+    return executor
+
+
+@asynccontextmanager
+async def _run_slot():
+    """Hold one of the MAX_CONCURRENT_RUNS slots for the duration of a run."""
+    global _run_slots
+    if MAX_CONCURRENT_RUNS <= 0:
+        yield
+        return
+    if _run_slots is None:
+        _run_slots = asyncio.Semaphore(MAX_CONCURRENT_RUNS)
+    async with _run_slots:
+        yield
+
+
+def _session_result(session: dict) -> dict:
+    """Final state of a session run plus its thread ID and pending interrupt."""
+    return {
+        **session["state"],
+        "thread_id": session["thread_id"],
+        "session_status": session["status"],
+        "interrupt": session["interrupt"],
     }
+
+
+async def arun_recipe_agent(query: str, thread_id: Optional[str] = None, keep_paused: bool = True, **kwargs) -> dict:
+    """Run the recipe agent with a query on the caller's event loop (static tools only).
+    
+    The run is checkpointed; if it pauses for confirmation the result
+    carries the ``thread_id`` to resume it with. Pass ``keep_paused=False``
+    when the caller never resumes, so the paused thread is not kept.
+    """
+    from agent.sessions import get_session_manager
+    async with _run_slot():
+        return _session_result(await get_session_manager().start(query, thread_id, keep_paused=keep_paused))
+
+
+async def aresume_recipe_agent(thread_id: str, response: str) -> dict:
+    """Resume a paused recipe agent session with the user's reply."""
+    from agent.sessions import get_session_manager
+    async with _run_slot():
+        return _session_result(await get_session_manager().resume(thread_id, response))
+
+
+async def astream_recipe_agent(
+    query: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    response: Optional[str] = None,
+    **kwargs,
+) -> AsyncIterator[dict]:
+    """Stream token, node and tool events of a recipe agent run (static tools only).
     
-    # Create agent with MCP tools
-    agent = await create_recipe_agent_with_mcp()
-    # Run the agent asynchronously
-    return await agent.ainvoke(initial_state)
+    Pass ``thread_id`` and ``response`` to resume a paused session instead.
+    Closing the iterator cancels the run, including in-flight LLM and tool calls.
+    """
+    from agent.sessions import get_session_manager
+    async with _run_slot():
+        async for event in get_session_manager().stream(query, thread_id, response):
+            yield event
+
+
+def run_recipe_agent(query: str, **kwargs) -> dict:
+    """Run the recipe agent with a query (static tools only).
+    
+    Blocking wrapper for scripts and the CLI; async callers must await
+    ``arun_recipe_agent`` instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(arun_recipe_agent(query, **kwargs))
+    raise RuntimeError("run_recipe_agent() cannot be called from a running event loop; await arun_recipe_agent()")
+
+
+async def run_recipe_agent_with_mcp(query: str, thread_id: Optional[str] = None, **kwargs) -> dict:
+    """Run the recipe agent with a query (including MCP tools).
+    
+    Uses the process-wide runtime, so MCP tools are loaded and the graph is
+    compiled once rather than on every query.
+    """
+    from agent.runtime import agent_runtime
+    sessions = await agent_runtime.sessions()
+    return _session_result(await sessions.start(query, thread_id))
+
+
+async def astream_recipe_agent_with_mcp(
+    query: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    response: Optional[str] = None,
+    **kwargs,
+) -> AsyncIterator[dict]:
+    """Stream events of a recipe agent run (including MCP tools), or resume a paused one."""
+    from agent.runtime import agent_runtime
+    sessions = await agent_runtime.sessions()
+    async for event in sessions.stream(query, thread_id, response):
+        yield event
@@ -0,0 +1,259 @@
+"""Shared LLM clients for the Recipe Agent graph nodes.
+
+Chat model clients are created once per configuration and reused by every
+graph step, so their HTTP connection pools (and TLS sessions) stay warm.
+Tool-bound variants are cached per tool-set fingerprint, so ``bind_tools``
+and its schema conversion run once per tool set instead of once per call.
+
+Clients come from Gemini (the default) or from any OpenAI-compatible
+endpoint (``provider="openai"``), such as lmodelhost's ``/v1`` API for
+stages that can run on local models.
+
+Calls go through ``ainvoke_with_retry``, which awaits the model's native
+async API under a per-attempt timeout and retries transient failures with
+jittered exponential backoff, so a slow completion never blocks the event
+loop and cancelling the caller cancels the in-flight request.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.tools import BaseTool
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
+
+# OpenAI-compatible endpoint used by provider="openai" (e.g. lmodelhost at http://localhost:8000/v1)
+OPENAI_BASE_URL = os.getenv("RECIPE_OPENAI_BASE_URL", "http://localhost:8000/v1")
+OPENAI_API_KEY = os.getenv("RECIPE_OPENAI_API_KEY", "unused")
+
+# Keep-alive pool limits for the underlying HTTP client
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+
+# Per-attempt timeout and retry policy for LLM calls
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+
+# HTTP status codes worth retrying
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+@dataclass(frozen=True)
+class LLMConfig:
+    """Identity of a chat model client; equal configs share one client."""
+    model: str = os.getenv("RECIPE_LLM_MODEL", "gemini-2.0-flash")
+    temperature: float = 0.1
+    response_mime_type: Optional[str] = None  # "application/json" for JSON mode
+    provider: str = os.getenv("RECIPE_LLM_PROVIDER", "gemini")  # "gemini" or "openai"
+
+
+DEFAULT_LLM_CONFIG = LLMConfig()
+
+
+def _create_gemini_client(config: LLMConfig) -> ChatGoogleGenerativeAI:
+    kwargs: Dict[str, Any] = {
+        "model": config.model,
+        "google_api_key": GEMINI_API_KEY,
+        "temperature": config.temperature,
+        "transport": "rest",
+        "client_options": {"api_endpoint": "https://generativelanguage.googleapis.com"},
+        # Retries and timeouts are handled by ainvoke_with_retry. For the Google SDK
+        # max_retries=1 means a single attempt (0 would mean its default of 5 retries)
+        "max_retries": 1,
+    }
+    if config.response_mime_type:
+        kwargs["response_mime_type"] = config.response_mime_type
+    if "client_args" in ChatGoogleGenerativeAI.model_fields:
+        import httpx
+        kwargs["client_args"] = {
+            "limits": httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            )
+        }
+    return ChatGoogleGenerativeAI(**kwargs)
+
+
+def _create_openai_client(config: LLMConfig) -> Any:
+    import httpx
+    from langchain_openai import ChatOpenAI
+
+    kwargs: Dict[str, Any] = {
+        "model": config.model,
+        "base_url": OPENAI_BASE_URL,
+        "api_key": OPENAI_API_KEY,
+        "temperature": config.temperature,
+        # Retries and timeouts are handled by ainvoke_with_retry
+        "max_retries": 0,
+        "http_async_client": httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+            timeout=LLM_TIMEOUT_SECONDS,
+        ),
+    }
+    if config.response_mime_type == "application/json":
+        kwargs["model_kwargs"] = {"response_format": {"type": "json_object"}}
+    return ChatOpenAI(**kwargs)
+
+
+_CLIENT_FACTORIES: Dict[str, Callable[[LLMConfig], Any]] = {
+    "gemini": _create_gemini_client,
+    "openai": _create_openai_client,
+}
+
+
+def create_llm_client(config: LLMConfig) -> Any:
+    """Create the chat model client for ``config.provider``."""
+    factory = _CLIENT_FACTORIES.get(config.provider)
+    if factory is None:
+        raise ValueError(f"Unknown LLM provider {config.provider!r}; expected one of {sorted(_CLIENT_FACTORIES)}")
+    return factory(config)
+
+
+def tool_fingerprint(tools: Sequence[BaseTool]) -> str:
+    """Stable digest of a tool set's names, descriptions and argument schemas."""
+    digest = hashlib.sha1()
+    for tool in sorted(tools, key=lambda t: t.name):
+        schema = tool.tool_call_schema
+        schema_json = schema.model_json_schema() if hasattr(schema, "model_json_schema") else schema
+        digest.update(json.dumps([tool.name, tool.description, schema_json], sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class LLMRegistry:
+    """Process-wide cache of chat model clients and their tool-bound variants."""
+
+    def __init__(
+        self,
+        factory: Callable[[LLMConfig], Any] = create_llm_client,
+        max_bound_variants: int = 32,
+    ):
+        self._factory = factory
+        self._clients: Dict[LLMConfig, Any] = {}
+        self._bound: "OrderedDict[Tuple[LLMConfig, str], Any]" = OrderedDict()
+        # Fingerprints by tool object identity; each entry holds its tools so their ids stay unique
+        self._fingerprints: "OrderedDict[Tuple[int, ...], Tuple[Tuple[BaseTool, ...], str]]" = OrderedDict()
+        self._max_bound_variants = max_bound_variants
+        self._lock = threading.Lock()
+
+    def get(self, config: LLMConfig = DEFAULT_LLM_CONFIG) -> Any:
+        """Return the shared client for ``config``, creating it on first use."""
+        client = self._clients.get(config)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(config)
+                if client is None:
+                    logger.info(f"Creating {config.provider} LLM client for {config.model}")
+                    client = self._factory(config)
+                    self._clients[config] = client
+        return client
+
+    def _fingerprint(self, tools: Sequence[BaseTool]) -> str:
+        """``tool_fingerprint`` of a tool set, computed once per set of tool objects."""
+        ordered = tuple(sorted(tools, key=lambda t: (t.name, id(t))))
+        identity = tuple(id(t) for t in ordered)
+        with self._lock:
+            entry = self._fingerprints.get(identity)
+            if entry is not None:
+                self._fingerprints.move_to_end(identity)
+                return entry[1]
+        fingerprint = tool_fingerprint(ordered)
+        with self._lock:
+            self._fingerprints[identity] = (ordered, fingerprint)
+            while len(self._fingerprints) > self._max_bound_variants:
+                self._fingerprints.popitem(last=False)
+        return fingerprint
+
+    def with_tools(self, tools: Optional[Sequence[BaseTool]], config: LLMConfig = DEFAULT_LLM_CONFIG) -> Any:
+        """Return the client for ``config`` bound to ``tools`` (unbound if no tools)."""
+        if not tools:
+            return self.get(config)
+        key = (config, self._fingerprint(tools))
+        with self._lock:
+            bound = self._bound.get(key)
+            if bound is not None:
+                self._bound.move_to_end(key)
+                return bound
+        bound = self.get(config).bind_tools(list(tools))
+        with self._lock:
+            self._bound[key] = bound
+            while len(self._bound) > self._max_bound_variants:
+                self._bound.popitem(last=False)
+        return bound
+
+    def clear(self) -> None:
+        """Drop all cached clients, e.g. after rotating credentials."""
+        with self._lock:
+            self._clients.clear()
+            self._bound.clear()
+            self._fingerprints.clear()
+
+
+llm_registry = LLMRegistry()
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Whether an LLM call failure is transient and worth retrying."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    for attr in ("status_code", "code", "status"):
+        status = getattr(error, attr, None)
+        if isinstance(status, int) and status in RETRYABLE_STATUS_CODES:
+            return True
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if isinstance(status, int) and status in RETRYABLE_STATUS_CODES:
+        return True
+    try:
+        import httpx
+        return isinstance(error, httpx.TransportError)
+    except ImportError:
+        return False
+
+
+def backoff_delay(attempt: int, base: float = LLM_BACKOFF_BASE_SECONDS, cap: float = LLM_BACKOFF_MAX_SECONDS) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+async def ainvoke_with_retry(
+    llm: Any,
+    messages: Any,
+    timeout: Optional[float] = LLM_TIMEOUT_SECONDS,
+    max_retries: int = LLM_MAX_RETRIES,
+    **kwargs: Any,
+) -> Any:
+    """Await ``llm.ainvoke`` with a per-attempt timeout and jittered retries.
+    
+    Cancellation of the calling task propagates immediately and aborts the
+    in-flight request. Non-transient errors are raised without retrying.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await asyncio.wait_for(llm.ainvoke(messages, **kwargs), timeout=timeout)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable_error(e):
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"LLM call failed ({type(e).__name__}: {e}); retrying in {delay:.2f}s")
+            attempt += 1
+            await asyncio.sleep(delay)
@@ -0,0 +1,81 @@
+"""MCP server configuration for the Recipe Agent.
+
+Servers default to the local grocery MCP server and can be overridden
+with a JSON file named by ``MCP_CONFIG_PATH``:
+
+    {
+        "servers": {
+            "grocery": {
+                "url": "http://grocery-mcp:8000/mcp/",
+                "max_connections": 50,
+                "max_keepalive_connections": 20,
+                "http2": true
+            }
+        }
+    }
+
+Fields left out fall back to the ``MCP_*`` environment defaults below.
+"""
+
+import json
+import logging
+import os
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+MCP_CONFIG_PATH = os.getenv("MCP_CONFIG_PATH", "")
+MCP_GROCERY_URL = os.getenv("MCP_GROCERY_URL", "http://localhost:8000/mcp/")
+MCP_MAX_CONNECTIONS = int(os.getenv("MCP_MAX_CONNECTIONS", "32"))
+MCP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("MCP_MAX_KEEPALIVE_CONNECTIONS", "16"))
+MCP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("MCP_KEEPALIVE_EXPIRY_SECONDS", "60"))
+MCP_HTTP2 = os.getenv("MCP_HTTP2", "false").lower() in ("1", "true", "yes")
+MCP_TIMEOUT_SECONDS = float(os.getenv("MCP_TIMEOUT_SECONDS", "30"))
+MCP_COALESCE_CALLS = os.getenv("MCP_COALESCE_CALLS", "true").lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class MCPServerConfig:
+    """Connection and pool settings for one MCP server."""
+    name: str
+    url: str
+    transport: str = "streamable_http"
+    max_connections: int = MCP_MAX_CONNECTIONS
+    max_keepalive_connections: int = MCP_MAX_KEEPALIVE_CONNECTIONS
+    keepalive_expiry: float = MCP_KEEPALIVE_EXPIRY_SECONDS
+    http2: bool = MCP_HTTP2
+    timeout: float = MCP_TIMEOUT_SECONDS
+    headers: Dict[str, str] = field(default_factory=dict, hash=False)
+
+
+@dataclass(frozen=True)
+class MCPConfig:
+    """All MCP servers the agent connects to."""
+    servers: Dict[str, MCPServerConfig]
+    coalesce_calls: bool = MCP_COALESCE_CALLS
+
+
+def _server_from_dict(name: str, data: Dict[str, Any]) -> MCPServerConfig:
+    known = {f.name for f in fields(MCPServerConfig)}
+    unknown = set(data) - known
+    if unknown:
+        logger.warning(f"Ignoring unknown MCP settings for {name}: {sorted(unknown)}")
+    return MCPServerConfig(name=name, **{k: v for k, v in data.items() if k in known and k != "name"})
+
+
+def load_mcp_config(path: Optional[str] = None) -> MCPConfig:
+    """Load the MCP configuration from ``path`` (or ``MCP_CONFIG_PATH``), else the defaults."""
+    path = path if path is not None else MCP_CONFIG_PATH
+    if not path:
+        return MCPConfig(servers={"grocery": MCPServerConfig(name="grocery", url=MCP_GROCERY_URL)})
+    with open(path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    servers = {name: _server_from_dict(name, spec) for name, spec in data.get("servers", {}).items()}
+    if not servers:
+        raise ValueError(f"No MCP servers configured in {path}")
+    return MCPConfig(servers=servers, coalesce_calls=data.get("coalesce_calls", MCP_COALESCE_CALLS))
+
+
+mcp_config = load_mcp_config()
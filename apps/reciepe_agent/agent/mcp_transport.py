@@ -0,0 +1,143 @@
+"""Pooled MCP transport and coalescing of identical in-flight tool calls.
+
+The MCP adapters open a fresh HTTP client for every tool call. Each
+configured server instead gets one shared keep-alive connection pool
+(HTTP/2 when enabled and ``h2`` is installed), and every per-call client
+borrows it, so calls skip the TCP and TLS setup. Identical tool calls that
+are in flight at the same moment (two sessions searching "eggs" at the
+same store) share a single request.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence
+
+import httpx
+from langchain_core.tools import BaseTool
+
+from agent.mcp_config import MCPConfig, MCPServerConfig
+
+
+logger = logging.getLogger(__name__)
+
+
+class _BorrowedTransport(httpx.AsyncBaseTransport):
+    """Delegates to a shared pool; closing a client does not close the pool."""
+
+    def __init__(self, pool: httpx.AsyncHTTPTransport):
+        self._pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._pool.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class MCPTransportPool:
+    """One keep-alive HTTP connection pool per MCP server."""
+
+    def __init__(self, config: MCPConfig):
+        self.config = config
+        self._pools: Dict[str, httpx.AsyncHTTPTransport] = {}
+
+    def _pool(self, server: MCPServerConfig) -> httpx.AsyncHTTPTransport:
+        pool = self._pools.get(server.name)
+        if pool is None:
+            http2 = server.http2 and _http2_available()
+            if server.http2 and not http2:
+                logger.warning(f"HTTP/2 requested for MCP server {server.name} but h2 is not installed")
+            pool = httpx.AsyncHTTPTransport(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=server.max_connections,
+                    max_keepalive_connections=server.max_keepalive_connections,
+                    keepalive_expiry=server.keepalive_expiry,
+                ),
+            )
+            self._pools[server.name] = pool
+        return pool
+
+    def client_factory(self, server: MCPServerConfig):
+        """``httpx_client_factory`` for the MCP adapters backed by the server's pool."""
+        def factory(
+            headers: Optional[Dict[str, str]] = None,
+            timeout: Optional[httpx.Timeout] = None,
+            auth: Optional[httpx.Auth] = None,
+        ) -> httpx.AsyncClient:
+            return httpx.AsyncClient(
+                headers=headers,
+                timeout=timeout or httpx.Timeout(server.timeout),
+                auth=auth,
+                transport=_BorrowedTransport(self._pool(server)),
+            )
+        return factory
+
+    def connections(self) -> Dict[str, Dict[str, Any]]:
+        """Connection dict for ``MultiServerMCPClient``."""
+        connections = {}
+        for name, server in self.config.servers.items():
+            connection: Dict[str, Any] = {"transport": server.transport, "url": server.url}
+            if server.headers:
+                connection["headers"] = dict(server.headers)
+            if server.transport in ("streamable_http", "sse"):
+                connection["httpx_client_factory"] = self.client_factory(server)
+            connections[name] = connection
+        return connections
+
+    async def aclose(self) -> None:
+        """Close every pooled connection."""
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            await pool.aclose()
+
+
+class SingleFlight:
+    """Share one in-flight call among concurrent callers with the same key."""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(call())
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+
+def call_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    """Canonical key of a tool call: name plus arguments with sorted keys."""
+    return f"{tool_name}:{json.dumps(arguments, sort_keys=True, default=str)}"
+
+
+def coalesce_tools(tools: Sequence[BaseTool], single_flight: SingleFlight) -> List[BaseTool]:
+    """Copies of ``tools`` whose identical concurrent calls share one request."""
+    wrapped = []
+    for tool in tools:
+        original = getattr(tool, "coroutine", None)
+        if original is None:
+            wrapped.append(tool)
+            continue
+
+        def make(name: str, original: Callable[..., Awaitable[Any]]):
+            async def coalesced(**arguments: Any) -> Any:
+                key = call_key(name, {k: v for k, v in arguments.items() if k != "runtime"})
+                return await single_flight.do(key, lambda: original(**arguments))
+            return coalesced
+
+        wrapped.append(tool.model_copy(update={"coroutine": make(tool.name, original)}))
+    return wrapped
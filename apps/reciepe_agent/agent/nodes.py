@@ -2,22 +2,39 @@
 import os
 import sys
 import asyncio
+import logging
 from dotenv import load_dotenv
 
 from typing import Dict, Any
 
 import re
+from dataclasses import replace
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langgraph.types import interrupt
+from agent.extraction import RECIPE_STRUCTURED_OUTPUT, content_text, extract_recipes, plan_from_recipe, recipe_state, render_recipe_markdown
+from agent.compaction import compact_messages, externalize, externalize_recipe, resolve, resolve_recipe
+from agent.llm import DEFAULT_LLM_CONFIG, LLMConfig, ainvoke_with_retry, llm_registry
+from agent.response_cache import response_cache
 from agent.state import RecipeAgentState
 from agent.tools import recipe_tools
 from agent.tools import mock_recipes
 # context7 prompt imports
-from prompts.system_prompts import RECIPE_SYSTEM_PROMPT, GROCERY_SYSTEM_PROMPT, RECIPE_PLAN_SYSTEM_PROMPT, GROCERY_EXEC_SYSTEM_PROMPT
+from prompts.assembly import RECIPE_PROMPT_PLAN_TOKEN_BUDGET, condense_article, format_recipe, prompt_assembler
+from prompts.system_prompts import RECIPE_SYSTEM_PROMPT, RECIPE_JSON_SYSTEM_PROMPT, GROCERY_SYSTEM_PROMPT, RECIPE_PLAN_SYSTEM_PROMPT, GROCERY_EXEC_SYSTEM_PROMPT
 from prompts.chat_prompts import RECIPE_CHAT_PROMPT, GROCERY_CHAT_PROMPT, RECIPE_ARTICLE_CHAT_PROMPT, GROCERY_EXEC_CHAT_PROMPT
 
 load_dotenv()
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
+
+logger = logging.getLogger(__name__)
+
+# The recipe stage makes no tool calls, so it can be served by a different (e.g. local) model.
+# Recipe answers are requested as JSON in structured mode.
+RECIPE_LLM_CONFIG = replace(
+    DEFAULT_LLM_CONFIG,
+    provider=os.getenv("RECIPE_STAGE_LLM_PROVIDER", DEFAULT_LLM_CONFIG.provider),
+    model=os.getenv("RECIPE_STAGE_LLM_MODEL", DEFAULT_LLM_CONFIG.model),
+    response_mime_type="application/json" if RECIPE_STRUCTURED_OUTPUT else None,
+)
 
 def classify_intent_node(state: RecipeAgentState) -> Dict[str, Any]:
     """Classify the user's intent from their query."""
@@ -52,7 +69,7 @@ def _select_llm_prompts_and_tools(state: RecipeAgentState):
         if mcp_tools:
             all_tools.extend(mcp_tools)
         # selected_recipe = state.get("selected_recipe", {})
-        recipe_plan = state.get("plan_extract", {})
+        recipe_plan = resolve(state.get("plan_extract", {}))
         # ingredients = state.get("ingredients", [])
         # if selected_recipe:
         #     context_parts.append(f"Recipe: {selected_recipe.get('title', 'Unknown')}")
@@ -60,87 +77,61 @@ def _select_llm_prompts_and_tools(state: RecipeAgentState):
         #     context_parts.append(f"Ingredients to search: {', '.join(ingredients[:5])}")
         # context = " | ".join(context_parts) if context_parts else "Ready to search for ingredients"
         
-        tool_names = ", ".join([tool.name for tool in all_tools])
-        num_tools = len(all_tools)
         rendered_prompt = [
-            GROCERY_EXEC_SYSTEM_PROMPT.format(num_tools=num_tools, tool_names=tool_names),
-            GROCERY_EXEC_CHAT_PROMPT.format(user_query=recipe_plan)
+            prompt_assembler.system(GROCERY_EXEC_SYSTEM_PROMPT, all_tools),
+            GROCERY_EXEC_CHAT_PROMPT.format(user_query=condense_article(str(recipe_plan or ""), RECIPE_PROMPT_PLAN_TOKEN_BUDGET))
         ]
         return rendered_prompt, all_tools, "execute"
     elif workflow_stage in ["recipe_planning"]:
         mcp_tools = get_mcp_tools()
         if mcp_tools:
             all_tools.extend(mcp_tools)
-        tool_names = ", ".join([tool.name for tool in all_tools])
-        num_tools = len(all_tools)
         context = " | ".join(context_parts) if context_parts else "No specific context"
         rendered_prompt = [
-            RECIPE_PLAN_SYSTEM_PROMPT.format(num_tools=num_tools, tool_names=tool_names),
-            RECIPE_ARTICLE_CHAT_PROMPT.format(selected_recipe=state.get("selected_recipe", {}), context=context)
+            prompt_assembler.system(RECIPE_PLAN_SYSTEM_PROMPT, all_tools),
+            RECIPE_ARTICLE_CHAT_PROMPT.format(selected_recipe=format_recipe(resolve_recipe(state.get("selected_recipe") or {})), context=context)
         ]
         return rendered_prompt, all_tools, "plan"
     else:        
         context = " | ".join(context_parts) if context_parts else "No specific context"
         rendered_prompt = [
-            RECIPE_SYSTEM_PROMPT.format(),
+            prompt_assembler.system(RECIPE_JSON_SYSTEM_PROMPT if RECIPE_STRUCTURED_OUTPUT else RECIPE_SYSTEM_PROMPT),
             RECIPE_CHAT_PROMPT.format(user_query=user_query, context=context)
         ]
         return rendered_prompt, all_tools, "recipe"
 
-async def _invoke_llm_with_tools(llm, rendered_prompt, tools=None):
-    """Invoke the LLM, binding tools if provided."""
+async def _invoke_llm_with_tools(rendered_prompt, tools=None, config: LLMConfig = DEFAULT_LLM_CONFIG):
+    """Invoke the shared LLM client, using its cached tool binding if tools are provided."""
+    llm = llm_registry.with_tools(tools, config)
     if tools:
-        llm = llm.bind_tools(tools)
         print("Invoking LLM asynchronously with tools...")
-        return llm.invoke(rendered_prompt)                
     else:
         # No tools, just invoke with the prompt
         print(f"Invoking LLM with prompt: {rendered_prompt}")
-        return llm.invoke(rendered_prompt)       
+    response = await ainvoke_with_retry(llm, rendered_prompt)
+    prompt_assembler.record_usage(response)
+    return response
 
 def _extract_recipes_from_response(response):
-    """Extract recipes from LLM response content."""
-    recipes = []
-    if response and hasattr(response, "content"):
-        content = response.content
-        # Try to extract title from the first line or bolded heading
-        title_match = re.search(r"^(.*?recipe.*?)\n", content, re.IGNORECASE)
-        if title_match:
-            title = title_match.group(1).strip()
-        else:
-            # Fallback: use first non-empty line
-            lines = [line.strip() for line in content.splitlines() if line.strip()]
-            title = lines[0] if lines else "Recipe"
-        # # Extract ingredients section (markdown style)
-        # ingredients_section = re.search(r"\*\*Ingredients:\*\*(.*?)(\*\*Instructions:\*\*|$)", content, re.DOTALL | re.IGNORECASE)
-        # ingredients = []
-        # if ingredients_section:
-        #     ingredients_text = ingredients_section.group(1)
-        #     # Match markdown bullet points
-        #     ingredients = re.findall(r"^\s*[\*\-•]\s+(.*)", ingredients_text, re.MULTILINE)
-        #     # Remove bolded subheadings (e.g., **For the Lamb Filling:**)
-        #     ingredients = [i for i in ingredients if not re.match(r"\*\*.*\*\*:", i)]
-        recipes.append({
-            "title": title,
-            "recipe_msg": response.content
-            # "title": title,
-            # "ingredients": [i.strip() for i in ingredients] if ingredients else []
-        })
-    return recipes
+    """Extract structured recipes from LLM response content.
+    
+    Returns the recipe dicts for the state and the text to show the user
+    (the rendered recipes when the response was JSON).
+    """
+    content = content_text(getattr(response, "content", None))
+    if not content:
+        return [], content
+    recipes, from_json = extract_recipes(content)
+    if from_json:
+        rendered = [render_recipe_markdown(recipe) for recipe in recipes]
+        return [recipe_state(recipe, text) for recipe, text in zip(recipes, rendered)], "\n\n".join(rendered)
+    return [recipe_state(recipe, content) for recipe in recipes], content
 
 async def llm_node(state: RecipeAgentState) -> Dict[str, Any]:
     """Unified and modular LLM node for both recipe and grocery workflow stages."""
     # Select prompts and tools
     rendered_prompt, all_tools, mode = _select_llm_prompts_and_tools(state)
     user_query = state.get("user_query", "")
-    # LLM setup
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
-        google_api_key=GEMINI_API_KEY,
-        temperature=0.1,
-        transport="rest",
-        client_options={"api_endpoint": "https://generativelanguage.googleapis.com"}
-    )
     try:
         # Mock for recipe mode
         if mode == "recipe":
@@ -158,23 +149,48 @@ async def llm_node(state: RecipeAgentState) -> Dict[str, Any]:
                     "error_message": None
                 }
         
+            # Serve repeated (or near-duplicate) queries from the response cache
+            cached = response_cache.get(rendered_prompt, RECIPE_LLM_CONFIG, query=user_query)
+            if cached is not None:
+                logger.info(f"Serving cached recipe response for: {user_query}")
+                return {
+                    "messages": compact_messages(state.get("messages", []), [AIMessage(content=cached.content)]),
+                    "recipes": [externalize_recipe(r) for r in cached.recipes] or state.get("recipes", []),
+                    "workflow_stage": "recipe_display",
+                    "user_wants_ingredients": False,
+                    "needs_user_input": True,
+                    "processing_complete": False,
+                    "error_message": None
+                }
+        
+        # Recipes with structured ingredients are planned without another LLM round-trip
+        if mode == "plan":
+            plan_extract = plan_from_recipe(state.get("selected_recipe") or {})
+            if plan_extract:
+                logger.debug(f"Built plan from structured ingredients:\n{plan_extract}")
+                return {
+                    "messages": compact_messages(state.get("messages", []), [AIMessage(content=plan_extract)]),
+                    "workflow_stage": "recipe_plan_display",
+                    "plan_extract": externalize(plan_extract),
+                    "recipe_plan_confirmed": False
+                }
+
         # LLM invocation
-        response = await _invoke_llm_with_tools(llm, rendered_prompt, all_tools if mode in ["plan","execute"] else None)
+        if mode == "recipe":
+            response = await _invoke_llm_with_tools(rendered_prompt, None, RECIPE_LLM_CONFIG)
+        else:
+            response = await _invoke_llm_with_tools(rendered_prompt, all_tools if mode in ["plan","execute"] else None)
         # print(f"LLM Response: {getattr(response, 'content', response)}")
-        messages = state.get("messages", [])
+        # Return only the new messages; add_messages appends them to the history
+        history = state.get("messages", [])
         if mode == "recipe":
-            messages.append(AIMessage(content=response.content))
-            recipes = _extract_recipes_from_response(response)
-            if recipes:
-                state["recipes"] = recipes
-            for msg in messages:
-                if hasattr(msg, 'content'):
-                    print(f"{type(msg).__name__}: {msg.content}")
-                else:
-                    print(str(msg))
+            recipes, display_content = _extract_recipes_from_response(response)
+            if recipes and display_content.strip():
+                response_cache.put(rendered_prompt, RECIPE_LLM_CONFIG, display_content, recipes, query=user_query)
+            logger.debug(f"{type(response).__name__}: {display_content}")
             return {
-                "messages": messages,
-                "recipes": state["recipes"],
+                "messages": compact_messages(history, [AIMessage(content=display_content)]),
+                "recipes": [externalize_recipe(r) for r in recipes] or state.get("recipes", []),
                 "workflow_stage": "recipe_display",
                 "user_wants_ingredients": False,
                 "needs_user_input": True,
@@ -182,39 +198,18 @@ async def llm_node(state: RecipeAgentState) -> Dict[str, Any]:
                 "error_message": None
             }
         elif mode == "plan":
-            messages.append(AIMessage(content=response.content))
-            plan_extract = response.content
-            
+            plan_extract = content_text(response.content)
             return {
-                "messages": messages,
+                "messages": compact_messages(history, [AIMessage(content=plan_extract)]),
                 "workflow_stage": "recipe_plan_display",
-                "plan_extract": plan_extract,
+                "plan_extract": externalize(plan_extract),
                 "recipe_plan_confirmed": False                
             }
         elif mode == "execute":
-            messages.append(AIMessage(content=response.content))    
-            if hasattr(response, 'tool_calls') and response.tool_calls:                
-                # Iterate over all tool_calls, invoke the tool, and capture the output
-                tool_outputs = {}
-                # for tool_call in response.tool_calls:
-                #     tool_name = tool_call.get("name")
-                #     tool_args = tool_call.get("args", {})
-                #     # Find the tool by name
-                #     tool = next((t for t in all_tools if t.name == tool_name), None)
-                #     if tool:
-                #         try:
-                #             # context7: invoke tool and capture output
-                #             output = await asyncio.to_thread(tool, **tool_args)
-                #             tool_outputs[tool_name] = output
-                #             print(f"Tool '{tool_name}' output: {output}")
-                #         except Exception as e:
-                #             tool_outputs[tool_name] = f"Error: {str(e)}"
-                #             print(f"Error invoking tool '{tool_name}': {e}")
-                #     else:
-                #         tool_outputs[tool_name] = "Tool not found"
-                #         print(f"Tool '{tool_name}' not found in available tools.")
-                # messages.append(AIMessage(content="Executed all tool calls."))
-                # state["tool_outputs"] = tool_outputs
+            # Keep the tool calls on the message; tool_execution runs them concurrently
+            messages = compact_messages(history, [response])
+            if hasattr(response, 'tool_calls') and response.tool_calls:
+                logger.info(f"LLM requested {len(response.tool_calls)} tool calls")
                 return {
                     "messages": messages,
                     "workflow_stage": "recipe_execution",
@@ -230,7 +225,7 @@ async def llm_node(state: RecipeAgentState) -> Dict[str, Any]:
                 "error_message": None
             }
         else:
-            messages.append(response)
+            messages = compact_messages(history, [response])
             if hasattr(response, 'tool_calls') and response.tool_calls:
                 return {
                     "messages": messages,
@@ -271,7 +266,7 @@ def recipe_confirmation_node(state: RecipeAgentState) -> Dict[str, Any]:
     confirmation_message = f"""
 Here is the reciepe for {selected_recipe.get('title', 'the recipe')}:
 
-{selected_recipe.get('recipe_msg', 'No recipe details available')}
+{resolve(selected_recipe.get('recipe_msg')) or 'No recipe details available'}
 
 Would you like me to search for these ingredients in local grocery stores? 
 You can say:
@@ -294,7 +289,7 @@ You can say:
 
 def recipe_plan_confirm_node(state: RecipeAgentState) -> Dict[str, Any]:
     """Display ingredients to user for confirmation before grocery search."""
-    recipes = state.get("plan_extract", {})
+    recipes = resolve(state.get("plan_extract", {}))
     if not recipes:
         return {
             "error_message": "No plan available for display",
@@ -379,11 +374,8 @@ def cart_confirmation_node(state: RecipeAgentState) -> Dict[str, Any]:
     confirmation_message = "\n".join(confirmation_parts)
     
     # Add confirmation message
-    messages = state.get("messages", [])
-    messages.append(AIMessage(content=confirmation_message))
-    
     return {
-        "messages": messages,
+        "messages": compact_messages(state.get("messages", []), [AIMessage(content=confirmation_message)]),
         "workflow_stage": "cart_confirmation",
         "needs_user_input": False,  # Auto-proceed for demo
         "grocery_items_confirmed": True,  # Auto-confirm for demo
@@ -448,11 +440,8 @@ Your ingredients are ready for checkout. You can proceed to the stores or use on
 Thank you for using the Recipe Agent! 🛒👨‍🍳"""
     
     # Add success message
-    messages = state.get("messages", [])
-    messages.append(AIMessage(content=success_message))
-    
     return {
-        "messages": messages,
+        "messages": compact_messages(state.get("messages", []), [AIMessage(content=success_message)]),
         "ingredients_to_cart": cart_items,
         "tool_outputs": {"cart_result": cart_result},
         "workflow_stage": "completed",
@@ -461,23 +450,39 @@ Thank you for using the Recipe Agent! 🛒👨‍🍳"""
     }
 
 
+# Question shown to the user at each confirmation point
+_CONFIRMATION_QUESTIONS = {
+    "recipe_confirmation": "Would you like me to plan the grocery search for this recipe? (yes / back)",
+    "recipe_plan_display": "Would you like me to proceed with executing the plan? (yes / back)",
+}
+
+
 def human_input_node(state: RecipeAgentState) -> Dict[str, Any]:
-    """Handle human input and update state."""
-    # In a real implementation, this would capture actual user input
-    # display the current stage of the agent in the stdio
+    """Pause for the user's reply and update state.
+    
+    The run is interrupted here and checkpointed; it resumes with the
+    user's reply as the value of ``interrupt``.
+    """
     workflow_stage = state.get("workflow_stage", "recipe_search")
+    selected_recipe = state.get("selected_recipe") or {}
     print(f"Current workflow stage: {workflow_stage}")
-    # Capture user input from stdio
-    user_input = input("Your response: ").strip()
-
-
-    if workflow_stage == "recipe_confirmation" and user_input in ["yes", "proceed", "continue"]:
+    # Wait for the user's reply without holding a thread
+    user_input = interrupt({
+        "workflow_stage": workflow_stage,
+        "question": _CONFIRMATION_QUESTIONS.get(workflow_stage, "Your response"),
+        "recipe_title": selected_recipe.get("title"),
+        "plan": resolve(state.get("plan_extract")) if workflow_stage == "recipe_plan_display" else None,
+    })
+    user_input = str(user_input or "").strip()
+    reply = user_input.lower()
+
+    if workflow_stage == "recipe_confirmation" and reply in ["yes", "proceed", "continue"]:
         return {
             "recipe_confirmed": True,
             "workflow_stage": "recipe_planning",
             "user_query": user_input           
         }
-    elif workflow_stage == "recipe_plan_display" and user_input in ["yes", "proceed", "confirm", "continue"]:
+    elif workflow_stage == "recipe_plan_display" and reply in ["yes", "proceed", "confirm", "continue"]:
         return {
             "recipe_plan_confirmed": True,
             "workflow_stage": "recipe_execution",
@@ -510,10 +515,12 @@ def human_approval_node(state: RecipeAgentState) -> dict:
     approval_parts.append("\nWould you like to add these items to your cart? (yes/no)")
     approval_message = "\n".join(approval_parts)
     print(approval_message)
-    user_input = input("Approve items for cart? (yes/no): ").strip().lower()
-    approved = user_input in ["yes", "y"]
+    user_input = interrupt({
+        "workflow_stage": "human_approval",
+        "question": approval_message,
+    })
+    approved = str(user_input or "").strip().lower() in ["yes", "y"]
     return {
-        "messages": state.get("messages", []),
         "searched_ingredients": searched_ingredients,
         "tool_outputs": tool_outputs,
         "workflow_stage": "human_approval",
@@ -0,0 +1,210 @@
+"""Response cache for recipe-mode LLM calls.
+
+Recipe prompts are rendered from fixed templates, so popular queries
+("how to make carbonara") produce identical prompts. Responses are cached
+under a digest of the normalized rendered prompt, model and temperature,
+with a TTL and LRU eviction, and the recipes extracted from the response
+are stored next to it so a hit skips extraction too.
+
+An optional semantic tier serves near-duplicate queries ("carbonara
+recipe"): the user query is embedded locally and compared against cached
+queries rendered from the same template, and the closest one is reused if
+its cosine similarity reaches the configured threshold. The default
+embedding is a hashed bag of search terms and character trigrams, which
+needs no model download; any ``str -> np.ndarray`` callable can be passed
+instead.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from agent.llm import LLMConfig
+from services.search_index import tokenize
+
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RECIPE_RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RECIPE_RESPONSE_CACHE_TTL_SECONDS", "3600"))
+# Cosine similarity needed for a semantic hit; 0 disables the semantic tier.
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("RECIPE_SEMANTIC_CACHE_THRESHOLD", "0"))
+
+EMBEDDING_DIM = 512
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(rendered_prompt: Sequence[Any]) -> str:
+    """Case- and whitespace-insensitive text of a rendered prompt."""
+    parts = [getattr(part, "content", part) for part in rendered_prompt]
+    return _WHITESPACE_RE.sub(" ", "\n".join(str(part) for part in parts)).strip().casefold()
+
+
+def hashed_embedding(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Unit-length hashed bag of search terms and their character trigrams."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for term in tokenize(text):
+        vector[zlib.crc32(term.encode()) % dim] += 2.0
+        padded = f" {term} "
+        for i in range(len(padded) - 2):
+            vector[zlib.crc32(padded[i:i + 3].encode()) % dim] += 1.0
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+@dataclass
+class CachedResponse:
+    """A cached LLM answer and the recipes extracted from it."""
+    content: str
+    recipes: List[Dict[str, Any]]
+    created_at: float
+    query: Optional[str] = None
+    scope: Optional[str] = None
+    embedding: Optional[np.ndarray] = field(default=None, repr=False)
+
+
+class ResponseCache:
+    """TTL + LRU cache of LLM responses with an optional semantic tier."""
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_SIZE,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+        semantic_threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        embed: Callable[[str], np.ndarray] = hashed_embedding,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self._embed = embed
+        self._clock = clock
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def _digest(*parts: str) -> str:
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def key(self, rendered_prompt: Sequence[Any], config: LLMConfig) -> str:
+        """Exact-match key for a rendered prompt sent with ``config``."""
+        return self._digest(config.provider, config.model, repr(config.temperature), normalize_prompt(rendered_prompt))
+
+    def _scope(self, rendered_prompt: Sequence[Any], config: LLMConfig, query: str) -> str:
+        """Key of the prompt template: the prompt with the user query blanked out."""
+        template = normalize_prompt(rendered_prompt).replace(normalize_prompt([query]), "\x00")
+        return self._digest(config.provider, config.model, repr(config.temperature), template)
+
+    def _expired(self, entry: CachedResponse, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry.created_at > self.ttl_seconds
+
+    def _semantic_match(self, scope: str, query: str, now: float) -> Optional[str]:
+        """Key of the most similar cached query in ``scope`` above the threshold."""
+        keys = []
+        vectors = []
+        for key, entry in self._entries.items():
+            if entry.scope == scope and entry.embedding is not None and not self._expired(entry, now):
+                keys.append(key)
+                vectors.append(entry.embedding)
+        if not keys:
+            return None
+        similarities = np.stack(vectors) @ self._embed(query)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.semantic_threshold:
+            return None
+        logger.info(f"Semantic cache hit for {query!r} (similarity {similarities[best]:.3f})")
+        return keys[best]
+
+    def get(
+        self,
+        rendered_prompt: Sequence[Any],
+        config: LLMConfig,
+        query: Optional[str] = None,
+    ) -> Optional[CachedResponse]:
+        """Return the cached response for a prompt, or ``None`` on a miss.
+
+        Args:
+            rendered_prompt: Prompt parts sent to the LLM
+            config: Model configuration the prompt is sent with
+            query: User query rendered into the prompt, enables the semantic tier
+        """
+        if not self.enabled:
+            return None
+        key = self.key(rendered_prompt, config)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            if entry is None and query and self.semantic_threshold > 0:
+                match = self._semantic_match(self._scope(rendered_prompt, config, query), query, now)
+                if match is not None:
+                    key, entry = match, self._entries[match]
+                    self.semantic_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return CachedResponse(
+                content=entry.content,
+                recipes=[dict(recipe) for recipe in entry.recipes],
+                created_at=entry.created_at,
+                query=entry.query,
+            )
+
+    def put(
+        self,
+        rendered_prompt: Sequence[Any],
+        config: LLMConfig,
+        content: str,
+        recipes: List[Dict[str, Any]],
+        query: Optional[str] = None,
+    ) -> None:
+        """Cache a response and its extracted recipes."""
+        if not self.enabled:
+            return
+        entry = CachedResponse(
+            content=content,
+            recipes=[dict(recipe) for recipe in recipes],
+            created_at=self._clock(),
+            query=query,
+        )
+        if query and self.semantic_threshold > 0:
+            entry.scope = self._scope(rendered_prompt, config, query)
+            entry.embedding = self._embed(query)
+        key = self.key(rendered_prompt, config)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every cached response."""
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,165 @@
+"""Long-lived Recipe Agent runtime.
+
+Building the MCP-enabled agent means connecting to the MCP server, listing
+its tools and compiling the StateGraph. The runtime does this once per
+process and hands the same compiled graph to every caller. Tools are
+refreshed in the background every ``MCP_TOOLS_REFRESH_SECONDS`` (or
+immediately after ``notify_tools_changed``), and the graph is only
+recompiled when the tool set actually changes. A failed refresh keeps the
+last good graph.
+"""
+
+import asyncio
+import logging
+import os
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+from langchain_core.tools import BaseTool
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+from agent.llm import tool_fingerprint
+from agent.sessions import SESSION_TTL_SECONDS, SessionManager, open_checkpointer, sweep_sessions_periodically
+from agent.streaming import stream_agent_events
+
+
+logger = logging.getLogger(__name__)
+
+MCP_TOOLS_REFRESH_SECONDS = float(os.getenv("MCP_TOOLS_REFRESH_SECONDS", "300"))
+
+
+async def _load_mcp_tools() -> List[BaseTool]:
+    from agent.graph import initialize_mcp_client
+    return await initialize_mcp_client()
+
+
+def _build_agent(include_mcp_tools: bool, checkpointer: Optional[BaseCheckpointSaver] = None) -> Any:
+    from agent.graph import create_recipe_agent
+    return create_recipe_agent(include_mcp_tools=include_mcp_tools, checkpointer=checkpointer)
+
+
+class AgentRuntime:
+    """Owns the MCP tool list and the compiled graph built from it.
+    
+    Every compiled graph shares one checkpointer, so paused sessions survive
+    a recompile after a tool refresh. Without an explicit checkpointer the
+    configured one (SQLite by default, see ``agent.sessions``) is opened on
+    start and closed on stop.
+    """
+
+    def __init__(
+        self,
+        refresh_seconds: float = MCP_TOOLS_REFRESH_SECONDS,
+        load_tools: Callable[[], Awaitable[List[BaseTool]]] = _load_mcp_tools,
+        build_agent: Optional[Callable[[bool], Any]] = None,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+    ):
+        self.refresh_seconds = refresh_seconds
+        self.checkpointer = checkpointer
+        self._load_tools = load_tools
+        self._open_checkpointer = checkpointer is None and build_agent is None
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._build_agent = build_agent or (lambda include: _build_agent(include, self.checkpointer))
+        self._agent: Any = None
+        self._fingerprint: Optional[str] = None
+        # asyncio primitives bind to the running loop on first use, not here
+        self._start_lock = asyncio.Lock()
+        self._refresh_lock = asyncio.Lock()
+        self._changed = asyncio.Event()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._sweep_task: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self._agent is not None
+
+    async def start(self) -> None:
+        """Load tools and compile the graph once; start the refresh task."""
+        async with self._start_lock:
+            if self._agent is not None:
+                return
+            if self._open_checkpointer and self.checkpointer is None:
+                self._exit_stack = AsyncExitStack()
+                self.checkpointer = await self._exit_stack.enter_async_context(open_checkpointer())
+            await self.refresh()
+            if self._agent is None:
+                # Tool loading failed outright; serve the static-tool graph.
+                self._agent = self._build_agent(False)
+            if self.refresh_seconds > 0:
+                self._refresh_task = asyncio.create_task(self._refresh_loop())
+            if SESSION_TTL_SECONDS > 0:
+                self._sweep_task = asyncio.create_task(sweep_sessions_periodically(self.sessions))
+
+    async def get_agent(self) -> Any:
+        """Return the shared compiled graph, starting the runtime on first use."""
+        if self._agent is None:
+            await self.start()
+        return self._agent
+
+    async def refresh(self) -> bool:
+        """Reload the MCP tools and recompile the graph if they changed.
+
+        Returns True if a new graph was installed.
+        """
+        async with self._refresh_lock:
+            try:
+                tools = await self._load_tools()
+            except Exception as e:
+                logger.error(f"Failed to refresh MCP tools: {e}")
+                return False
+            if not tools and self._fingerprint:
+                logger.warning("MCP server returned no tools; keeping the current agent")
+                return False
+            fingerprint = tool_fingerprint(tools)
+            if self._agent is not None and fingerprint == self._fingerprint:
+                return False
+            agent = await asyncio.to_thread(self._build_agent, True)
+            self._agent, self._fingerprint = agent, fingerprint
+            logger.info(f"Compiled recipe agent with {len(tools)} MCP tools")
+            return True
+
+    def notify_tools_changed(self) -> None:
+        """Ask the refresh task to reload tools now (e.g. on a list-changed event)."""
+        self._changed.set()
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=self.refresh_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._changed.clear()
+            await self.refresh()
+
+    async def invoke(self, state: dict, config: Optional[dict] = None) -> dict:
+        """Run the shared graph on an initial state."""
+        agent = await self.get_agent()
+        return await agent.ainvoke(state, config)
+
+    async def stream(self, state: dict, config: Optional[dict] = None) -> AsyncIterator[dict]:
+        """Stream events of a run of the shared graph (see ``agent.streaming``)."""
+        agent = await self.get_agent()
+        async for event in stream_agent_events(agent, state, config):
+            yield event
+
+    async def sessions(self) -> SessionManager:
+        """Session manager over the current shared graph."""
+        return SessionManager(await self.get_agent())
+
+    async def stop(self) -> None:
+        """Cancel the background refresh and session sweep tasks and close the checkpointer it opened."""
+        for task in (self._refresh_task, self._sweep_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._refresh_task = self._sweep_task = None
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+            self._agent = self._fingerprint = self.checkpointer = None
+
+
+agent_runtime = AgentRuntime()
@@ -0,0 +1,290 @@
+"""Checkpointed, resumable agent sessions.
+
+Confirmation points in the graph call LangGraph's ``interrupt`` instead of
+blocking on ``input()``. A run pauses there, its state is written to the
+checkpointer, and it gives up its task and any thread, so an idle user
+costs one stored checkpoint. The run resumes by thread ID with the
+user's reply.
+
+The checkpointer is SQLite by default (``RECIPE_AGENT_CHECKPOINTER=sqlite``,
+stored at ``RECIPE_AGENT_CHECKPOINT_PATH``). In-memory storage is
+available for tests and single-process demos.
+
+Opening a durable checkpointer also stores large state values as files
+next to it (see ``agent.compaction``), so references in a checkpoint
+still resolve after a restart. A thread's checkpoints are deleted as soon
+as its run completes without pausing. Paused threads that are never resumed are swept after
+``RECIPE_AGENT_SESSION_TTL_SECONDS``. Only one run per thread can be in
+flight at a time. Artifacts that no remaining checkpoint references are
+swept along with expired sessions.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+import weakref
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Set
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.types import Command
+
+from agent import compaction
+from agent.compaction import ARTIFACT_SWEEP_GRACE_SECONDS, DEFAULT_ARTIFACT_DIR_NAME, ArtifactStore, artifact_refs
+from agent.streaming import stream_agent_events
+
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTER = os.getenv("RECIPE_AGENT_CHECKPOINTER", "sqlite").lower()
+CHECKPOINT_PATH = os.getenv("RECIPE_AGENT_CHECKPOINT_PATH", "checkpoints.sqlite")
+# Paused sessions idle for longer than this are deleted (0 keeps them forever)
+SESSION_TTL_SECONDS = float(os.getenv("RECIPE_AGENT_SESSION_TTL_SECONDS", "86400"))
+SESSION_SWEEP_INTERVAL_SECONDS = float(os.getenv("RECIPE_AGENT_SESSION_SWEEP_INTERVAL_SECONDS", "600"))
+
+STATUS_WAITING = "waiting_for_input"
+STATUS_COMPLETED = "completed"
+
+
+@asynccontextmanager
+async def open_checkpointer(kind: str = CHECKPOINTER, path: str = CHECKPOINT_PATH) -> AsyncIterator[BaseCheckpointSaver]:
+    """Open the configured checkpointer for the lifetime of the context.
+    
+    A durable checkpointer also gets a file artifact store next to it,
+    unless one is configured already.
+    """
+    if kind == "memory":
+        yield InMemorySaver()
+        return
+    if kind != "sqlite":
+        raise ValueError(f"Unknown checkpointer {kind!r}; use 'sqlite' or 'memory'")
+    try:
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    except ImportError:
+        logger.warning("langgraph-checkpoint-sqlite not installed; sessions will not survive a restart")
+        yield InMemorySaver()
+        return
+    async with AsyncSqliteSaver.from_conn_string(path) as saver:
+        logger.info(f"Storing agent sessions in {path}")
+        if compaction.artifact_store is None:
+            # Checkpoints outlive the process, so the values they reference must too
+            directory = os.path.join(os.path.dirname(os.path.abspath(path)), DEFAULT_ARTIFACT_DIR_NAME)
+            logger.info(f"Storing agent artifacts in {directory}")
+            compaction.use_artifact_store(ArtifactStore(directory))
+        yield saver
+
+
+class SessionNotFound(KeyError):
+    """Raised when resuming a thread that has no paused run."""
+
+
+class SessionBusy(RuntimeError):
+    """Raised when a thread already has a run in flight."""
+
+
+# Threads with a run in flight in this process (shared by every SessionManager)
+_active_threads: Set[str] = set()
+# Checkpointers in use; artifacts referenced by any of them survive sweeps
+_checkpointers: "weakref.WeakSet[BaseCheckpointSaver]" = weakref.WeakSet()
+
+
+class SessionManager:
+    """Start, resume and inspect checkpointed runs of a compiled graph."""
+
+    def __init__(self, agent: Any):
+        self.agent = agent
+        checkpointer = getattr(agent, "checkpointer", None)
+        if isinstance(checkpointer, BaseCheckpointSaver):
+            _checkpointers.add(checkpointer)
+
+    @staticmethod
+    def _config(thread_id: str) -> Dict[str, Any]:
+        return {"configurable": {"thread_id": thread_id}}
+
+    async def status(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a session, or ``None`` if the thread is unknown."""
+        snapshot = await self.agent.aget_state(self._config(thread_id))
+        if not snapshot.values:
+            return None
+        interrupts = [item.value for item in snapshot.interrupts]
+        return {
+            "thread_id": thread_id,
+            "status": STATUS_WAITING if interrupts else STATUS_COMPLETED,
+            "interrupt": interrupts[0] if interrupts else None,
+            "state": snapshot.values,
+        }
+
+    @staticmethod
+    @contextmanager
+    def _claim(thread_id: str) -> Iterator[None]:
+        """Marks a thread as running; a second concurrent run of it raises SessionBusy."""
+        if thread_id in _active_threads:
+            raise SessionBusy(thread_id)
+        _active_threads.add(thread_id)
+        try:
+            yield
+        finally:
+            _active_threads.discard(thread_id)
+
+    async def _resume_command(self, thread_id: str, response: Any) -> Command:
+        session = await self.status(thread_id)
+        if session is None or session["status"] != STATUS_WAITING:
+            raise SessionNotFound(thread_id)
+        return Command(resume=response)
+
+    async def _finish(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Status after a run; a completed thread's checkpoints are deleted."""
+        session = await self.status(thread_id)
+        if session is not None and session["status"] == STATUS_COMPLETED:
+            await self.delete(thread_id)
+        return session
+
+    async def delete(self, thread_id: str) -> None:
+        """Delete every checkpoint of a thread."""
+        checkpointer = getattr(self.agent, "checkpointer", None)
+        if isinstance(checkpointer, BaseCheckpointSaver):
+            await checkpointer.adelete_thread(thread_id)
+
+    async def start(self, query: str, thread_id: Optional[str] = None, keep_paused: bool = True) -> Dict[str, Any]:
+        """Run a new query until it completes or pauses for input.
+        
+        A paused thread is kept for resuming unless ``keep_paused`` is false
+        (callers that never resume); a failed run's checkpoints are deleted.
+        """
+        from agent.graph import _initial_state
+        thread_id = thread_id or uuid.uuid4().hex
+        with self._claim(thread_id):
+            keep = False
+            try:
+                await self.agent.ainvoke(_initial_state(query), self._config(thread_id))
+                session = await self._finish(thread_id)
+                keep = keep_paused
+                return session
+            finally:
+                if not keep:
+                    await self.delete(thread_id)
+
+    async def resume(self, thread_id: str, response: Any) -> Dict[str, Any]:
+        """Resume a paused session with the user's reply."""
+        with self._claim(thread_id):
+            command = await self._resume_command(thread_id, response)
+            await self.agent.ainvoke(command, self._config(thread_id))
+            return await self._finish(thread_id)
+
+    async def stream(
+        self,
+        query: Optional[str] = None,
+        thread_id: Optional[str] = None,
+        response: Any = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a new query (or a resumed session when ``response`` is given).
+
+        The final ``done`` event carries the session status and pending
+        interrupt in addition to the state.
+        """
+        from agent.graph import _initial_state
+        thread_id = thread_id or uuid.uuid4().hex
+        with self._claim(thread_id):
+            if response is not None:
+                graph_input: Any = await self._resume_command(thread_id, response)
+            else:
+                graph_input = _initial_state(query)
+            async for event in stream_agent_events(self.agent, graph_input, self._config(thread_id)):
+                if event["event"] == "done":
+                    event = {"event": "done", **(await self._finish(thread_id) or {"thread_id": thread_id, "state": {}})}
+                yield event
+
+    async def sweep(self, max_age_seconds: float = SESSION_TTL_SECONDS) -> int:
+        """Delete threads whose latest checkpoint is older than ``max_age_seconds``.
+
+        Threads with a run in flight are kept. Returns the number of threads deleted.
+        """
+        checkpointer = getattr(self.agent, "checkpointer", None)
+        if max_age_seconds <= 0 or not isinstance(checkpointer, BaseCheckpointSaver):
+            return 0
+        latest: Dict[str, datetime] = {}
+        async for item in checkpointer.alist(None):
+            thread_id = item.config["configurable"]["thread_id"]
+            ts = datetime.fromisoformat(item.checkpoint["ts"])
+            if thread_id not in latest or ts > latest[thread_id]:
+                latest[thread_id] = ts
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)
+        expired = [t for t, ts in latest.items() if ts < cutoff and t not in _active_threads]
+        for thread_id in expired:
+            await checkpointer.adelete_thread(thread_id)
+        if expired:
+            logger.info(f"Deleted {len(expired)} expired agent sessions")
+        return len(expired)
+
+
+async def sweep_artifacts(min_age_seconds: float = ARTIFACT_SWEEP_GRACE_SECONDS) -> int:
+    """Delete stored artifacts that no checkpoint of any open checkpointer references."""
+    store = compaction.artifact_store
+    if store is None:
+        return 0
+    keep: Set[str] = set()
+    for checkpointer in list(_checkpointers):
+        async for item in checkpointer.alist(None):
+            keep |= artifact_refs(item.checkpoint.get("channel_values"))
+            keep |= artifact_refs([write[2] for write in item.pending_writes or ()])
+    return await asyncio.to_thread(store.sweep, keep, min_age_seconds)
+
+
+async def sweep_sessions_periodically(
+    get_manager: Any,
+    interval_seconds: float = SESSION_SWEEP_INTERVAL_SECONDS,
+    max_age_seconds: float = SESSION_TTL_SECONDS,
+) -> None:
+    """Sweep expired sessions, then unreferenced artifacts, every ``interval_seconds`` until cancelled."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            manager = get_manager()
+            if asyncio.iscoroutine(manager):
+                manager = await manager
+            await manager.sweep(max_age_seconds)
+            await sweep_artifacts()
+        except Exception as e:
+            logger.error(f"Session sweep failed: {e}")
+
+
+_exit_stack: Optional[AsyncExitStack] = None
+_session_manager: Optional[SessionManager] = None
+_sweeper: Optional[asyncio.Task] = None
+
+
+async def open_sessions(kind: str = CHECKPOINTER, path: str = CHECKPOINT_PATH) -> SessionManager:
+    """Open the checkpointer and install the process-wide session manager."""
+    global _exit_stack, _session_manager, _sweeper
+    from agent.graph import create_recipe_agent
+    await close_sessions()
+    _exit_stack = AsyncExitStack()
+    saver = await _exit_stack.enter_async_context(open_checkpointer(kind, path))
+    _session_manager = SessionManager(create_recipe_agent(checkpointer=saver))
+    if SESSION_TTL_SECONDS > 0:
+        _sweeper = asyncio.create_task(sweep_sessions_periodically(get_session_manager))
+    return _session_manager
+
+
+async def close_sessions() -> None:
+    """Close the checkpointer opened by ``open_sessions``."""
+    global _exit_stack, _session_manager, _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        await asyncio.gather(_sweeper, return_exceptions=True)
+    if _exit_stack is not None:
+        await _exit_stack.aclose()
+    _exit_stack, _session_manager, _sweeper = None, None, None
+
+
+def get_session_manager() -> SessionManager:
+    """The installed session manager, or an in-memory one if none was opened."""
+    global _session_manager
+    if _session_manager is None:
+        from agent.graph import create_recipe_agent
+        logger.info("No checkpointer opened; keeping agent sessions in memory")
+        _session_manager = SessionManager(create_recipe_agent(checkpointer=InMemorySaver()))
+    return _session_manager
@@ -8,7 +8,7 @@ from langgraph.graph.message import add_messages
 class RecipeAgentState(TypedDict):
     """State for the Recipe Agent."""
     
-    # Conversation history
+    # Conversation history, kept under a token budget by agent.compaction
     messages: Annotated[List[BaseMessage], add_messages]
     
     # Conversation messages to display
@@ -19,10 +19,10 @@ class RecipeAgentState(TypedDict):
     intent: Optional[str]  # search, recommend, substitute, plan, etc.
     
     # Recipe-related data    
-    recipes: List[Dict]
+    recipes: List[Dict]  # "recipe_msg" may be an artifact reference
     selected_recipe: Optional[Dict]  # Recipe selected by user    
 
-    plan_extract: Optional[str]  # Extracted plan from recipe article
+    plan_extract: Optional[str]  # Extracted plan from recipe article (or its artifact reference)
     
     # ingredients: List[str]
     searched_ingredients: List[Dict]  # Ingredients found via MCP search
@@ -40,5 +40,5 @@ class RecipeAgentState(TypedDict):
     error_message: Optional[str]
     processing_complete: bool
     
-    # Tool outputs
+    # Tool outputs; large outputs are artifact references
     tool_outputs: Dict[str, any]
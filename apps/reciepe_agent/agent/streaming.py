@@ -0,0 +1,123 @@
+"""Incremental event stream of a Recipe Agent run.
+
+``stream_agent_events`` runs the graph with ``astream_events`` and yields
+small event dicts as the run progresses:
+
+* ``{"event": "node_start", "node": ...}``
+* ``{"event": "token", "node": ..., "content": ...}`` for each LLM token
+* ``{"event": "recipe", "node": ..., "recipe": ...}`` as soon as a structured
+  recipe in the LLM output is complete (see ``agent.extraction``)
+* ``{"event": "tool_start" | "tool_end", "tool": ..., "input" | "output": ...}``
+* ``{"event": "node_end", "node": ..., "workflow_stage": ...}``
+* ``{"event": "done", "state": <final graph state>}``
+* ``{"event": "error", "error": ...}``
+
+The run executes in a producer task that feeds a bounded queue. When the
+consumer falls behind, the queue fills and the producer (and so the
+graph) waits: that is the backpressure. Closing the stream (for example
+when the client disconnects) cancels the producer, which also cancels any
+in-flight LLM or MCP call.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, Optional
+
+from langchain_core.messages import BaseMessage
+
+from agent.extraction import IncrementalRecipeParser
+
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of undelivered events buffered per stream
+STREAM_QUEUE_SIZE = int(os.getenv("RECIPE_AGENT_STREAM_QUEUE_SIZE", "256"))
+
+_END = object()
+
+
+def _content(value: Any) -> Any:
+    """Plain content of a message or tool output, for transport."""
+    if isinstance(value, BaseMessage):
+        return value.content
+    if hasattr(value, "content") and not isinstance(value, (dict, str)):
+        return value.content
+    return value
+
+
+def _map_event(event: Dict[str, Any], nodes: frozenset) -> Optional[Dict[str, Any]]:
+    """Translate a LangGraph ``astream_events`` (v2) event into a stream event."""
+    kind = event["event"]
+    name = event.get("name")
+    metadata = event.get("metadata", {})
+    node = metadata.get("langgraph_node")
+    data = event.get("data", {})
+    if kind == "on_chat_model_stream":
+        content = getattr(data.get("chunk"), "content", "")
+        if content:
+            return {"event": "token", "node": node, "content": content}
+    elif kind == "on_tool_start":
+        return {"event": "tool_start", "tool": name, "input": data.get("input")}
+    elif kind == "on_tool_end":
+        return {"event": "tool_end", "tool": name, "output": _content(data.get("output"))}
+    elif name in nodes and node == name:
+        if kind == "on_chain_start":
+            return {"event": "node_start", "node": name}
+        if kind == "on_chain_end":
+            output = data.get("output")
+            stage = output.get("workflow_stage") if isinstance(output, dict) else None
+            return {"event": "node_end", "node": name, "workflow_stage": stage}
+    return None
+
+
+async def _produce(agent: Any, graph_input: Any, config: Optional[Dict[str, Any]], queue: asyncio.Queue) -> None:
+    nodes = frozenset(getattr(agent, "nodes", {}) or ())
+    final_state: Optional[Dict[str, Any]] = None
+    parsers: Dict[str, IncrementalRecipeParser] = {}
+    try:
+        async for event in agent.astream_events(graph_input, config, version="v2"):
+            if event["event"] == "on_chain_end" and not event.get("parent_ids"):
+                output = event.get("data", {}).get("output")
+                if isinstance(output, dict):
+                    final_state = output
+                continue
+            mapped = _map_event(event, nodes)
+            if mapped is None:
+                continue
+            if mapped["event"] == "node_start":
+                parsers.pop(mapped["node"], None)
+            await queue.put(mapped)
+            if mapped["event"] == "token" and isinstance(mapped["content"], str):
+                parser = parsers.setdefault(mapped["node"], IncrementalRecipeParser())
+                for recipe in parser.feed(mapped["content"]):
+                    await queue.put({"event": "recipe", "node": mapped["node"], "recipe": recipe.model_dump(exclude_none=True)})
+        await queue.put({"event": "done", "state": final_state or {}})
+    except Exception as e:
+        logger.error(f"Agent stream failed: {e}")
+        await queue.put({"event": "error", "error": str(e)})
+    await queue.put(_END)
+
+
+async def stream_agent_events(
+    agent: Any,
+    graph_input: Any,
+    config: Optional[Dict[str, Any]] = None,
+    max_buffered: int = STREAM_QUEUE_SIZE,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield stream events for one run of ``agent`` on ``graph_input`` (a state or resume command)."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffered)
+    producer = asyncio.create_task(_produce(agent, graph_input, config, queue))
+    try:
+        while True:
+            event = await queue.get()
+            if event is _END:
+                break
+            yield event
+    finally:
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except (asyncio.CancelledError, Exception):
+                pass
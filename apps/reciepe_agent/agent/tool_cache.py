@@ -0,0 +1,210 @@
+"""Result cache in front of MCP tool invocation.
+
+The prompts pin a preferred store location, so many users search the same
+ingredients at the same store. Tool results are cached under the tool name
+and normalized arguments (string values trimmed and lower-cased, location
+arguments folded into one ``location`` key). Freshness depends on the tool:
+
+* price and availability lookups (searches included) stay fresh briefly,
+* product metadata stays fresh for much longer,
+* cart and checkout tools are never cached.
+
+After the TTL an entry is served stale for a grace period while a single
+background call refreshes it (stale-while-revalidate). The cache is size
+bounded with LRU eviction. Cached tools return exactly what the tool
+returned, so hits reach ``searched_ingredients`` through the same path as
+live calls.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.tools import BaseTool
+
+
+logger = logging.getLogger(__name__)
+
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "4096"))
+TOOL_CACHE_PRICE_TTL_SECONDS = float(os.getenv("TOOL_CACHE_PRICE_TTL_SECONDS", "120"))
+TOOL_CACHE_METADATA_TTL_SECONDS = float(os.getenv("TOOL_CACHE_METADATA_TTL_SECONDS", "86400"))
+TOOL_CACHE_STALE_SECONDS = float(os.getenv("TOOL_CACHE_STALE_SECONDS", "600"))
+
+# Tool name fragments that decide the cache policy, checked in this order.
+UNCACHED_TOOL_WORDS = ("cart", "checkout", "order", "add", "remove", "update", "delete")
+PRICE_TOOL_WORDS = ("price", "availability", "stock", "inventory", "search", "find")
+METADATA_TOOL_WORDS = ("detail", "info", "metadata", "location", "store", "product")
+
+_LOCATION_ARGS = ("location_id", "locationid", "location", "store_id", "storeid", "store_location")
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """Freshness of a tool's results; ``ttl`` of 0 disables caching."""
+    ttl: float
+    stale: float = TOOL_CACHE_STALE_SECONDS
+
+
+NO_CACHE = CachePolicy(ttl=0, stale=0)
+PRICE_POLICY = CachePolicy(ttl=TOOL_CACHE_PRICE_TTL_SECONDS)
+METADATA_POLICY = CachePolicy(ttl=TOOL_CACHE_METADATA_TTL_SECONDS)
+
+
+def default_policy(tool_name: str) -> CachePolicy:
+    """Cache policy for a tool, derived from its name."""
+    name = tool_name.lower()
+    if any(word in name for word in UNCACHED_TOOL_WORDS):
+        return NO_CACHE
+    if any(word in name for word in PRICE_TOOL_WORDS):
+        return PRICE_POLICY
+    if any(word in name for word in METADATA_TOOL_WORDS):
+        return METADATA_POLICY
+    return PRICE_POLICY
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.split()).lower()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def cache_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    """Key of a tool call with normalized arguments and location."""
+    args = {}
+    location = None
+    for name, value in arguments.items():
+        if name == "runtime":
+            continue
+        if name.lower() in _LOCATION_ARGS:
+            location = str(value).strip()
+        else:
+            args[name] = _normalize(value)
+    return json.dumps([tool_name, location, args], sort_keys=True, default=str)
+
+
+def _is_error(result: Any) -> bool:
+    """Whether a tool result reports an error (never cached)."""
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    return getattr(result, "status", None) == "error"
+
+
+@dataclass
+class _Entry:
+    value: Any
+    stored_at: float
+    policy: CachePolicy
+
+
+class ToolResultCache:
+    """TTL + stale-while-revalidate + LRU cache of tool results."""
+
+    def __init__(
+        self,
+        max_entries: int = TOOL_CACHE_SIZE,
+        policy: Callable[[str], CachePolicy] = default_policy,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.policy = policy
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._revalidating: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: str) -> Tuple[Optional[_Entry], bool]:
+        """Return (entry, is_fresh); expired entries are dropped."""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            age = now - entry.stored_at
+            if age > entry.policy.ttl + entry.policy.stale:
+                del self._entries[key]
+                return None, False
+            self._entries.move_to_end(key)
+            return entry, age <= entry.policy.ttl
+
+    def _store(self, key: str, value: Any, policy: CachePolicy) -> None:
+        if _is_error(value):
+            return
+        with self._lock:
+            self._entries[key] = _Entry(value=value, stored_at=self._clock(), policy=policy)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def _revalidate(self, key: str, call: Callable[[], Awaitable[Any]], policy: CachePolicy) -> None:
+        try:
+            self._store(key, await call(), policy)
+        except Exception as e:
+            logger.warning(f"Background refresh of cached tool result failed: {e}")
+        finally:
+            self._revalidating.discard(key)
+
+    async def get_or_call(self, tool_name: str, arguments: Dict[str, Any], call: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached result of a tool call, calling the tool on a miss."""
+        policy = self.policy(tool_name)
+        if policy.ttl <= 0 or self.max_entries <= 0:
+            return await call()
+        key = cache_key(tool_name, arguments)
+        entry, fresh = self._lookup(key)
+        if entry is not None:
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                if key not in self._revalidating:
+                    self._revalidating.add(key)
+                    task = asyncio.create_task(self._revalidate(key, call, policy))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+            return entry.value
+        self.misses += 1
+        value = await call()
+        self._store(key, value, policy)
+        return value
+
+    def clear(self) -> None:
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+
+
+def cache_tools(tools: Sequence[BaseTool], cache: "ToolResultCache") -> List[BaseTool]:
+    """Copies of ``tools`` that serve repeated calls from ``cache``."""
+    wrapped = []
+    for tool in tools:
+        original = getattr(tool, "coroutine", None)
+        if original is None or cache.policy(tool.name).ttl <= 0:
+            wrapped.append(tool)
+            continue
+
+        def make(name: str, original: Callable[..., Awaitable[Any]]):
+            async def cached(**arguments: Any) -> Any:
+                return await cache.get_or_call(name, arguments, lambda: original(**arguments))
+            return cached
+
+        wrapped.append(tool.model_copy(update={"coroutine": make(tool.name, original)}))
+    return wrapped
+
+
+tool_result_cache = ToolResultCache()
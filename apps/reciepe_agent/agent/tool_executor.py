@@ -0,0 +1,175 @@
+"""Concurrent execution of batched tool calls.
+
+The execution prompt asks the model to emit every grocery tool call at
+once (one product search per ingredient). ``ConcurrentToolExecutor`` runs
+all tool calls of a response in parallel. A global limit and per-tool
+limits cap load on the MCP server, each call has its own timeout, and a
+failing or slow call yields an error result without discarding the
+others.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import BaseTool
+
+from agent.compaction import externalize
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_tool_limits(value: str) -> Dict[str, int]:
+    """Parse per-tool concurrency limits written as ``"search_products=4,add_to_cart=1"``."""
+    limits: Dict[str, int] = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, sep, limit = item.partition("=")
+        if not sep or not name.strip() or not limit.strip().isdigit():
+            raise ValueError(f"Invalid tool concurrency limit {item.strip()!r}; expected name=limit")
+        limits[name.strip()] = int(limit)
+    return limits
+
+
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "8"))
+TOOL_CALL_TIMEOUT_SECONDS = float(os.getenv("TOOL_CALL_TIMEOUT_SECONDS", "20"))
+# Per-tool caps on in-flight calls (e.g. "search_products=4,add_to_cart=1"), within the global limit
+TOOL_CONCURRENCY_LIMITS = parse_tool_limits(os.getenv("TOOL_CONCURRENCY_LIMITS", ""))
+
+# Argument names that carry the ingredient a search tool looks up.
+_INGREDIENT_ARGS = ("term", "query", "ingredient", "name", "product", "search_term")
+
+
+def _parse_output(output: Any) -> Any:
+    """Decode JSON text returned by MCP tools; leave anything else as is."""
+    if isinstance(output, list) and output and all(isinstance(part, dict) and "text" in part for part in output):
+        output = "".join(part["text"] for part in output)
+    if isinstance(output, str):
+        try:
+            return json.loads(output)
+        except ValueError:
+            return output
+    return output
+
+
+def _is_search_tool(name: str) -> bool:
+    name = name.lower()
+    return "search" in name or "product" in name
+
+
+def _ingredient_name(args: Dict[str, Any]) -> Optional[str]:
+    for key in _INGREDIENT_ARGS:
+        if isinstance(args.get(key), str):
+            return args[key]
+    return next((value for value in args.values() if isinstance(value, str)), None)
+
+
+def _search_result(output: Any) -> Dict[str, Any]:
+    """First product of a search tool's output, as shown in the cart confirmation."""
+    if isinstance(output, dict):
+        for key in ("products", "results", "data", "items"):
+            if isinstance(output.get(key), list):
+                output = output[key]
+                break
+        else:
+            return output
+    if isinstance(output, list) and output and isinstance(output[0], dict):
+        return output[0]
+    return {"result": output}
+
+
+class ConcurrentToolExecutor:
+    """Run a model response's tool calls concurrently with bounded fan-out."""
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool],
+        max_concurrency: int = TOOL_MAX_CONCURRENCY,
+        per_tool_limits: Optional[Dict[str, int]] = None,
+        timeout: Optional[float] = TOOL_CALL_TIMEOUT_SECONDS,
+    ):
+        self.tools = {tool.name: tool for tool in tools}
+        self.max_concurrency = max_concurrency
+        self.per_tool_limits = per_tool_limits or {}
+        self.timeout = timeout
+
+    async def _call(
+        self,
+        tool_call: Dict[str, Any],
+        slots: asyncio.Semaphore,
+        tool_slots: Dict[str, asyncio.Semaphore],
+    ) -> Dict[str, Any]:
+        name = tool_call.get("name")
+        args = tool_call.get("args") or {}
+        result = {"id": tool_call.get("id"), "name": name, "args": args, "output": None, "error": None}
+        tool = self.tools.get(name)
+        if tool is None:
+            result["error"] = f"Tool '{name}' not found"
+            return result
+        # The per-tool slot comes first, so calls queued on a busy tool hold no global slot
+        limit = tool_slots.get(name) or contextlib.nullcontext()
+        try:
+            async with limit, slots:
+                output = await asyncio.wait_for(tool.ainvoke(args), timeout=self.timeout)
+            result["output"] = _parse_output(output)
+        except asyncio.TimeoutError:
+            result["error"] = f"Timed out after {self.timeout}s"
+        except Exception as e:
+            result["error"] = f"Error: {str(e)}"
+        if result["error"]:
+            logger.warning(f"Tool '{name}' failed: {result['error']}")
+        return result
+
+    async def run(self, tool_calls: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Execute ``tool_calls`` concurrently; results keep the call order."""
+        slots = asyncio.Semaphore(self.max_concurrency if self.max_concurrency > 0 else len(tool_calls) or 1)
+        tool_slots = {name: asyncio.Semaphore(limit) for name, limit in self.per_tool_limits.items() if limit > 0}
+        return await asyncio.gather(*(self._call(call, slots, tool_slots) for call in tool_calls))
+
+
+def make_tool_execution_node(tools: Sequence[BaseTool], **executor_kwargs):
+    """Graph node running the last message's tool calls through a ConcurrentToolExecutor."""
+    executor = ConcurrentToolExecutor(tools, **executor_kwargs)
+
+    async def tool_execution_node(state) -> Dict[str, Any]:
+        messages = state.get("messages", [])
+        tool_calls = getattr(messages[-1], "tool_calls", None) if messages else None
+        if not tool_calls:
+            return {}
+        logger.info(f"Executing {len(tool_calls)} tool calls concurrently")
+        results = await executor.run(tool_calls)
+
+        tool_messages = []
+        tool_outputs = dict(state.get("tool_outputs") or {})
+        searched_ingredients = list(state.get("searched_ingredients") or [])
+        for result in results:
+            content = result["error"] or result["output"]
+            tool_messages.append(ToolMessage(
+                content=content if isinstance(content, str) else json.dumps(content, default=str),
+                tool_call_id=result["id"],
+                name=result["name"],
+                status="error" if result["error"] else "success",
+            ))
+            # Large outputs are kept in the artifact store, not inline in the state
+            tool_outputs[result["id"] or result["name"]] = {**result, "output": externalize(result["output"])}
+            if not result["error"] and _is_search_tool(result["name"]):
+                searched_ingredients.append({
+                    "name": _ingredient_name(result["args"]) or result["name"],
+                    "search_result": _search_result(result["output"]),
+                })
+        failed = sum(1 for result in results if result["error"])
+        if failed:
+            logger.warning(f"{failed} of {len(results)} tool calls failed")
+        return {
+            "messages": tool_messages,
+            "tool_outputs": tool_outputs,
+            "searched_ingredients": searched_ingredients,
+        }
+
+    return tool_execution_node
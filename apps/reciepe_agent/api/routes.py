@@ -1,12 +1,23 @@
 """FastAPI routes for Recipe Agent."""
 
-from typing import List, Optional
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from functools import lru_cache
+from typing import Any, AsyncIterator, Deque, Iterator, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
 
-from agent.graph import run_recipe_agent
+from agent.compaction import resolve_recipe
+from agent.graph import aresume_recipe_agent, arun_recipe_agent, astream_recipe_agent
+from agent.sessions import SessionBusy, SessionNotFound, get_session_manager
+from services.recipe_service import RecipeService
 
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1", tags=["recipe-agent"])
 
 
@@ -25,32 +36,67 @@ class QueryResponse(BaseModel):
     error: Optional[str] = None
 
 
+class ResumeRequest(BaseModel):
+    """Request model for resuming a paused session."""
+    response: str
+
+
+class BatchSubstitutionRequest(BaseModel):
+    """Request model for batch ingredient substitutions."""
+    ingredients: Optional[List[str]] = None
+    recipe_ids: Optional[List[str]] = None
+    context: Optional[str] = None
+
+
+class BatchNutritionRequest(BaseModel):
+    """Request model for batch nutrition lookups."""
+    recipe_ids: List[str]
+
+
+# Number of items resolved per streamed NDJSON chunk
+BATCH_CHUNK_SIZE = 64
+# Messages a WebSocket client may send while a run is in progress; later ones are rejected
+WS_MAX_QUEUED_MESSAGES = int(os.getenv("RECIPE_WS_MAX_QUEUED_MESSAGES", "8"))
+
+
+@lru_cache(maxsize=1)
+def get_recipe_service() -> RecipeService:
+    """Shared recipe service, created on first use."""
+    return RecipeService()
+
+
+def _response_data(result: dict) -> dict:
+    """Extract the client-facing fields of a final agent state."""
+    return {
+        "intent": result.get("intent"),
+        "workflow_stage": result.get("workflow_stage"),
+        "recipes": [resolve_recipe(recipe) for recipe in result.get("recipes", [])],
+        "search_results": result.get("search_results", []),
+        "recommendations": result.get("recommendations", []),
+        "ingredient_substitutions": result.get("ingredient_substitutions", {}),
+        "meal_plan": result.get("meal_plan"),
+        "messages": [msg.content if hasattr(msg, 'content') else str(msg) 
+                    for msg in result.get("messages", [])],
+        "thread_id": result.get("thread_id"),
+        "session_status": result.get("session_status"),
+        "interrupt": result.get("interrupt"),
+    }
+
+
 @router.post("/query", response_model=QueryResponse)
 async def query_recipe_agent(request: QueryRequest):
     """Query the recipe agent."""
     try:
-        result = run_recipe_agent(
+        result = await arun_recipe_agent(
             query=request.query,
             dietary_restrictions=request.dietary_restrictions,
             cuisine_preference=request.cuisine_preference
         )
         
-        # Extract relevant information from result
-        response_data = {
-            "intent": result.get("intent"),
-            "recipes": result.get("recipes", []),
-            "search_results": result.get("search_results", []),
-            "recommendations": result.get("recommendations", []),
-            "ingredient_substitutions": result.get("ingredient_substitutions", {}),
-            "meal_plan": result.get("meal_plan"),
-            "messages": [msg.content if hasattr(msg, 'content') else str(msg) 
-                        for msg in result.get("messages", [])]
-        }
-        
         return QueryResponse(
             success=True,
             message="Query processed successfully",
-            data=response_data
+            data=_response_data(result)
         )
         
     except Exception as e:
@@ -60,6 +106,41 @@ async def query_recipe_agent(request: QueryRequest):
         )
 
 
+@router.post("/sessions/{thread_id}/resume", response_model=QueryResponse)
+async def resume_session(thread_id: str, request: ResumeRequest):
+    """Resume a session paused at a confirmation point with the user's reply."""
+    try:
+        result = await aresume_recipe_agent(thread_id, request.response)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail=f"No paused session {thread_id}")
+    except SessionBusy:
+        raise HTTPException(status_code=409, detail=f"Session {thread_id} is already running")
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error resuming session: {str(e)}"
+        )
+    return QueryResponse(
+        success=True,
+        message="Session resumed successfully",
+        data=_response_data(result)
+    )
+
+
+@router.get("/sessions/{thread_id}")
+async def get_session(thread_id: str):
+    """Get the status and pending question of a session."""
+    session = await get_session_manager().status(thread_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown session {thread_id}")
+    return {
+        "thread_id": thread_id,
+        "status": session["status"],
+        "interrupt": session["interrupt"],
+        "workflow_stage": session["state"].get("workflow_stage"),
+    }
+
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint."""
@@ -77,14 +158,15 @@ async def search_recipes_endpoint(
     try:
         dietary_list = dietary_restrictions.split(",") if dietary_restrictions else []
         
-        result = run_recipe_agent(
+        result = await arun_recipe_agent(
             query=f"search for {q}",
             dietary_restrictions=dietary_list,
-            cuisine_preference=cuisine
+            cuisine_preference=cuisine,
+            keep_paused=False
         )
         
         return {
-            "recipes": result.get("recipes", []),
+            "recipes": [resolve_recipe(recipe) for recipe in result.get("recipes", [])],
             "total": len(result.get("recipes", []))
         }
         
@@ -105,10 +187,11 @@ async def recommend_recipes_endpoint(
     try:
         dietary_list = dietary_restrictions.split(",") if dietary_restrictions else []
         
-        result = run_recipe_agent(
+        result = await arun_recipe_agent(
             query="recommend recipes",
             dietary_restrictions=dietary_list,
-            cuisine_preference=cuisine
+            cuisine_preference=cuisine,
+            keep_paused=False
         )
         
         return {
@@ -131,8 +214,9 @@ async def substitute_ingredient_endpoint(request: dict):
         if not ingredient:
             raise HTTPException(status_code=400, detail="Ingredient is required")
         
-        result = run_recipe_agent(
+        result = await arun_recipe_agent(
             query=f"substitute {ingredient}",
+            keep_paused=False
         )
         
         return {
@@ -153,9 +237,10 @@ async def create_meal_plan_endpoint(request: dict):
         days = request.get("days", 7)
         dietary_restrictions = request.get("dietary_restrictions", [])
         
-        result = run_recipe_agent(
+        result = await arun_recipe_agent(
             query=f"create a {days} day meal plan",
-            dietary_restrictions=dietary_restrictions
+            dietary_restrictions=dietary_restrictions,
+            keep_paused=False
         )
         
         return {
@@ -167,3 +252,191 @@ async def create_meal_plan_endpoint(request: dict):
             status_code=500,
             detail=f"Error creating meal plan: {str(e)}"
         )
+
+
+def _ndjson(line: dict) -> str:
+    return json.dumps(line, separators=(",", ":")) + "\n"
+
+
+@router.post("/ingredients/substitute/batch")
+def substitute_ingredients_batch_endpoint(
+    request: BatchSubstitutionRequest,
+    service: RecipeService = Depends(get_recipe_service)
+):
+    """Stream substitutions for a list of ingredients or recipes as NDJSON.
+    
+    Each line is an IngredientSubstitution; lines produced from
+    ``recipe_ids`` also carry the ``recipe_id`` they belong to. The agent
+    graph is not involved.
+    """
+    if not request.ingredients and not request.recipe_ids:
+        raise HTTPException(status_code=400, detail="ingredients or recipe_ids is required")
+    
+    def _stream() -> Iterator[str]:
+        sources = [(None, request.ingredients or [])]
+        for recipe_id in request.recipe_ids or []:
+            recipe = service.get_recipe_by_id(recipe_id)
+            if recipe is None:
+                yield _ndjson({"recipe_id": recipe_id, "error": "Recipe not found"})
+                continue
+            sources.append((recipe_id, [ingredient.name for ingredient in recipe.ingredients]))
+        
+        for recipe_id, ingredients in sources:
+            for start in range(0, len(ingredients), BATCH_CHUNK_SIZE):
+                chunk = ingredients[start:start + BATCH_CHUNK_SIZE]
+                substitutions = service.get_ingredient_substitutions_batch(chunk, request.context)
+                lines = []
+                for substitution in substitutions:
+                    line = substitution.model_dump()
+                    if recipe_id is not None:
+                        line["recipe_id"] = recipe_id
+                    lines.append(_ndjson(line))
+                yield "".join(lines)
+    
+    return StreamingResponse(_stream(), media_type="application/x-ndjson")
+
+
+@router.post("/recipes/nutrition/batch")
+def nutrition_batch_endpoint(
+    request: BatchNutritionRequest,
+    service: RecipeService = Depends(get_recipe_service)
+):
+    """Stream nutrition information for a list of recipe IDs as NDJSON."""
+    
+    def _stream() -> Iterator[str]:
+        for start in range(0, len(request.recipe_ids), BATCH_CHUNK_SIZE):
+            chunk = request.recipe_ids[start:start + BATCH_CHUNK_SIZE]
+            yield "".join(
+                _ndjson({"recipe_id": recipe_id, "nutrition": service.get_nutrition_info(recipe_id)})
+                for recipe_id in chunk
+            )
+    
+    return StreamingResponse(_stream(), media_type="application/x-ndjson")
+
+
+def _stream_payload(event: dict) -> dict:
+    """JSON-safe form of an agent stream event."""
+    if event["event"] == "done":
+        return {
+            "event": "done",
+            "data": _response_data({
+                **event["state"],
+                "thread_id": event.get("thread_id"),
+                "session_status": event.get("status"),
+                "interrupt": event.get("interrupt"),
+            }),
+        }
+    return event
+
+
+async def _sse_events(query: QueryRequest) -> AsyncIterator[str]:
+    async for event in astream_recipe_agent(
+        query=query.query,
+        dietary_restrictions=query.dietary_restrictions,
+        cuisine_preference=query.cuisine_preference
+    ):
+        payload = _stream_payload(event)
+        yield f"event: {payload['event']}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+@router.post("/query/stream")
+async def stream_recipe_agent_endpoint(request: QueryRequest):
+    """Stream LLM tokens, node transitions and tool results as Server-Sent Events.
+    
+    If the client disconnects, the run is cancelled along with its in-flight LLM and tool calls.
+    """
+    return StreamingResponse(
+        _sse_events(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _send_events(websocket: WebSocket, message: dict) -> None:
+    try:
+        if "response" in message:
+            events = astream_recipe_agent(thread_id=message.get("thread_id"), response=str(message["response"]))
+        else:
+            request = QueryRequest(**message)
+            events = astream_recipe_agent(
+                query=request.query,
+                thread_id=message.get("thread_id"),
+                dietary_restrictions=request.dietary_restrictions,
+                cuisine_preference=request.cuisine_preference
+            )
+        async for event in events:
+            await websocket.send_text(json.dumps(_stream_payload(event), default=str))
+    except WebSocketDisconnect:
+        raise
+    except ValidationError as e:
+        await websocket.send_json({"event": "error", "error": f"Invalid message: {e.errors(include_url=False)}"})
+    except SessionNotFound:
+        await websocket.send_json({"event": "error", "error": f"No paused session {message.get('thread_id')}"})
+    except SessionBusy:
+        await websocket.send_json({"event": "error", "error": f"Session {message.get('thread_id')} is already running"})
+    except Exception as e:
+        logger.error(f"WebSocket run failed: {e}")
+        await websocket.send_json({"event": "error", "error": str(e)})
+
+
+@router.websocket("/query/ws")
+async def recipe_agent_websocket(websocket: WebSocket):
+    """Stream agent events over a WebSocket.
+    
+    The client sends ``{"query": ...}`` and receives one JSON message per
+    event, ending with a ``done`` or ``error`` event. A ``done`` event that
+    carries an ``interrupt`` is answered with ``{"thread_id": ...,
+    "response": ...}``. Sending ``{"type": "cancel"}`` or closing the socket
+    aborts the run. Other messages sent during a run are queued (up to
+    WS_MAX_QUEUED_MESSAGES) and run after it.
+    """
+    await websocket.accept()
+    queued: Deque[Any] = deque()
+    # Outstanding receive; it is kept across runs so no client message is dropped
+    receiver: Optional[asyncio.Task] = None
+    try:
+        while True:
+            if queued:
+                message = queued.popleft()
+            else:
+                receiver = receiver or asyncio.create_task(websocket.receive_json())
+                try:
+                    # Raises WebSocketDisconnect if the client went away
+                    message = await receiver
+                finally:
+                    receiver = None
+            if not isinstance(message, dict):
+                await websocket.send_json({"event": "error", "error": "Expected a JSON object"})
+                continue
+            if message.get("type") == "cancel":
+                # Nothing is running
+                continue
+            sender = asyncio.create_task(_send_events(websocket, message))
+            try:
+                while not sender.done():
+                    receiver = receiver or asyncio.create_task(websocket.receive_json())
+                    await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                    if receiver.done() and not sender.done():
+                        incoming = receiver.result()
+                        receiver = None
+                        if isinstance(incoming, dict) and incoming.get("type") == "cancel":
+                            sender.cancel()
+                            await asyncio.gather(sender, return_exceptions=True)
+                            await websocket.send_json({"event": "cancelled"})
+                            break
+                        if len(queued) >= WS_MAX_QUEUED_MESSAGES:
+                            await websocket.send_json({"event": "error", "error": "Too many queued messages; message rejected"})
+                        else:
+                            queued.append(incoming)
+                if not sender.cancelled():
+                    sender.result()
+            finally:
+                if not sender.done():
+                    sender.cancel()
+                    await asyncio.gather(sender, return_exceptions=True)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if receiver is not None:
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
@@ -8,7 +8,9 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
-from agent.graph import run_recipe_agent, recipe_agent, run_recipe_agent_with_mcp
+from agent.graph import astream_recipe_agent_with_mcp, install_node_executor, mcp_transport_pool
+from agent.runtime import agent_runtime
+from agent.sessions import close_sessions, open_sessions
 from api.routes import router
 
 # Load environment variables
@@ -35,6 +37,21 @@ app.add_middleware(
 # Include API routes
 app.include_router(router)
 
+
+@app.on_event("startup")
+async def configure_executor():
+    """Bound the thread pool used for sync graph nodes and open the session store."""
+    install_node_executor()
+    await open_sessions()
+
+
+@app.on_event("shutdown")
+async def stop_agent_runtime():
+    """Stop the background MCP tool refresh and close pooled MCP connections."""
+    await agent_runtime.stop()
+    await mcp_transport_pool.aclose()
+    await close_sessions()
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -49,6 +66,14 @@ async def root():
 
 def run_cli():
     """Run the CLI interface."""
+    try:
+        asyncio.run(_run_cli_loop())
+    except KeyboardInterrupt:
+        print("\n👋 Happy cooking!")
+
+
+async def _run_cli_loop():
+    """CLI loop on a single event loop, so the agent runtime is built once."""
     print("🍳 Enhanced Recipe Agent CLI")
     print("=" * 50)
     print("Features:")
@@ -60,9 +85,13 @@ def run_cli():
     print("Ask me to find recipes and I'll help you get the ingredients!")
     print("Type 'quit' or 'exit' to stop.\n")
     
+    # Session paused at a confirmation point, answered by the next input
+    thread_id = None
+    pending = None
+    
     while True:
         try:
-            user_input = input("You: ").strip()
+            user_input = (await asyncio.to_thread(input, "You: ")).strip()
             
             if user_input.lower() in ['quit', 'exit', 'q']:
                 print("👋 Happy cooking!")
@@ -73,9 +102,24 @@ def run_cli():
             
             print("🤔 Processing working for you...")
             
-            # Run the enhanced agent
+            # Run the enhanced agent, printing LLM tokens as they arrive
             # result = run_recipe_agent(user_input)
-            result = asyncio.run(run_recipe_agent_with_mcp(user_input))
+            if pending:
+                events = astream_recipe_agent_with_mcp(thread_id=thread_id, response=user_input)
+            else:
+                events = astream_recipe_agent_with_mcp(user_input)
+            result = {}
+            pending = None
+            async for event in events:
+                if event["event"] == "token" and isinstance(event["content"], str):
+                    print(event["content"], end="", flush=True)
+                elif event["event"] == "done":
+                    result = event["state"]
+                    thread_id = event.get("thread_id")
+                    pending = event.get("interrupt")
+                elif event["event"] == "error":
+                    result = {"error_message": event["error"]}
+            print()
 
             # Extract and display the response
             messages = result.get("display_messages", [])
@@ -127,6 +171,9 @@ def run_cli():
             if result.get("error_message"):
                 print(f"❌ Error: {result['error_message']}")
             
+            if pending:
+                print(f"\n❓ {pending.get('question', 'Your response')}")
+            
             print("-" * 70)
             
         except KeyboardInterrupt:
@@ -134,6 +181,8 @@ def run_cli():
             break
         except Exception as e:
             print(f"❌ Error: {str(e)}")
+    
+    await agent_runtime.stop()
 
 
 def main():
@@ -19,6 +19,12 @@ class DietaryRestriction(str, Enum):
     LOW_SODIUM = "low-sodium"
 
 
+class DietaryMatch(str, Enum):
+    """How multiple dietary restrictions are combined."""
+    ALL = "all"
+    ANY = "any"
+
+
 class CuisineType(str, Enum):
     """Enumeration of cuisine types."""
     ITALIAN = "italian"
@@ -85,6 +91,7 @@ class RecipeQuery(BaseModel):
     query: str = Field(..., description="Search query")
     cuisine: Optional[str] = Field(None, description="Cuisine type filter")
     dietary_restrictions: Optional[List[str]] = Field(None, description="Dietary restrictions")
+    dietary_match: DietaryMatch = Field(DietaryMatch.ALL, description="Require all or any of the dietary restrictions")
     max_prep_time: Optional[int] = Field(None, description="Maximum preparation time")
     max_cook_time: Optional[int] = Field(None, description="Maximum cooking time")
     difficulty: Optional[str] = Field(None, description="Difficulty level")
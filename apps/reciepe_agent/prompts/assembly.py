@@ -0,0 +1,165 @@
+"""Prompt assembly with cached prefixes and token budgets.
+
+System prompts depend only on the template and the tool set, so each one
+is rendered once per tool-set version and the same message is reused on
+every call. A byte-identical prefix is also what the provider's implicit
+context caching keys on (Gemini reports those tokens as ``cache_read`` in
+the usage metadata, which ``PromptAssembler.record_usage`` collects).
+
+Recipe articles and plans are sent in readable form instead of a
+``str(dict)``, and are condensed to ``RECIPE_PROMPT_ARTICLE_TOKEN_BUDGET``
+and ``RECIPE_PROMPT_PLAN_TOKEN_BUDGET`` tokens. Ingredients are kept
+first, then the title and introduction, then the instructions.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+from langchain_core.prompts import SystemMessagePromptTemplate
+
+
+logger = logging.getLogger(__name__)
+
+RECIPE_PROMPT_ARTICLE_TOKEN_BUDGET = int(os.getenv("RECIPE_PROMPT_ARTICLE_TOKEN_BUDGET", "1500"))
+RECIPE_PROMPT_PLAN_TOKEN_BUDGET = int(os.getenv("RECIPE_PROMPT_PLAN_TOKEN_BUDGET", "1500"))
+
+TRUNCATION_MARKER = "[...]"
+
+_HEADING = re.compile(r"^\s*(#{1,6}\s+\S.*|\*\*[^*]+\*\*:?|[A-Z][A-Za-z /&]{2,40}:)\s*$")
+_SECTION_PRIORITY = (
+    (re.compile(r"ingredient", re.IGNORECASE), 0),
+    (re.compile(r"instruction|method|step|direction|preparation", re.IGNORECASE), 2),
+)
+_INTRO_PRIORITY = 1
+_OTHER_PRIORITY = 3
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count of ``text`` (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def _sections(text: str) -> List[Tuple[Optional[str], List[str]]]:
+    """Split markdown-ish text into (heading, lines) sections."""
+    sections: List[Tuple[Optional[str], List[str]]] = [(None, [])]
+    for line in text.splitlines():
+        if _HEADING.match(line):
+            sections.append((line, [line]))
+        else:
+            sections[-1][1].append(line)
+    return [(heading, lines) for heading, lines in sections if any(l.strip() for l in lines)]
+
+
+def _priority(index: int, heading: Optional[str]) -> int:
+    if heading is None:
+        return _INTRO_PRIORITY if index == 0 else _OTHER_PRIORITY
+    for pattern, priority in _SECTION_PRIORITY:
+        if pattern.search(heading):
+            return priority
+    return _OTHER_PRIORITY
+
+
+def _take_lines(lines: List[str], budget: int) -> List[str]:
+    kept, used = [], 0
+    for line in lines:
+        cost = count_tokens(line + "\n")
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+def condense_article(text: str, budget: int) -> str:
+    """Condense ``text`` to about ``budget`` tokens, keeping the most useful sections."""
+    text = re.sub(r"[ \t]+\n", "\n", text.strip())
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    if count_tokens(text) <= budget:
+        return text
+
+    sections = _sections(text)
+    order = sorted(range(len(sections)), key=lambda i: (_priority(i, sections[i][0]), i))
+    marker_cost = count_tokens(TRUNCATION_MARKER + "\n")
+    remaining = budget
+    kept: Dict[int, List[str]] = {}
+    for index in order:
+        lines = sections[index][1]
+        cost = count_tokens("\n".join(lines) + "\n")
+        if cost <= remaining:
+            kept[index] = lines
+            remaining -= cost
+        elif remaining > marker_cost:
+            partial = _take_lines(lines, remaining - marker_cost)
+            if partial:
+                kept[index] = partial + [TRUNCATION_MARKER]
+                remaining -= count_tokens("\n".join(kept[index]) + "\n")
+    logger.debug(f"Condensed article from {count_tokens(text)} to about {budget - remaining} tokens")
+    return "\n".join(line for index in sorted(kept) for line in kept[index]).strip()
+
+
+def format_recipe(recipe: Dict[str, Any], budget: int = RECIPE_PROMPT_ARTICLE_TOKEN_BUDGET) -> str:
+    """Readable, budgeted text of a recipe dict for a prompt."""
+    body = recipe.get("recipe_msg")
+    if not body:
+        fields = {k: v for k, v in recipe.items() if k != "title"}
+        body = json.dumps(fields, indent=1, default=str) if fields else ""
+    title = recipe.get("title")
+    article = condense_article(str(body), budget)
+    return f"Title: {title}\n\n{article}" if title else article
+
+
+class PromptAssembler:
+    """Renders system prompt prefixes once per tool set and tracks token usage."""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._prefixes: "OrderedDict[Tuple[str, Tuple[str, ...]], BaseMessage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.hits = 0
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+
+    def system(self, template: SystemMessagePromptTemplate, tools: Optional[Sequence[Any]] = None) -> BaseMessage:
+        """The rendered system message of ``template`` for ``tools``."""
+        tool_names = tuple(tool.name for tool in tools or ())
+        key = (template.prompt.template, tool_names)
+        with self._lock:
+            message = self._prefixes.get(key)
+            if message is not None:
+                self._prefixes.move_to_end(key)
+                self.hits += 1
+                return message
+        variables = {"num_tools": len(tool_names), "tool_names": ", ".join(tool_names)}
+        message = template.format(**{k: v for k, v in variables.items() if k in template.input_variables})
+        with self._lock:
+            self._prefixes[key] = message
+            self.renders += 1
+            while len(self._prefixes) > self.max_entries:
+                self._prefixes.popitem(last=False)
+        return message
+
+    def record_usage(self, response: Any) -> None:
+        """Add a response's input token usage (and provider cache hits) to the totals."""
+        usage = getattr(response, "usage_metadata", None) or {}
+        input_tokens = usage.get("input_tokens") or 0
+        cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+        with self._lock:
+            self.input_tokens += input_tokens
+            self.cached_input_tokens += cached
+        if input_tokens:
+            logger.info(f"LLM call used {input_tokens} input tokens ({cached} served from the provider cache)")
+
+    def clear(self) -> None:
+        """Drop every rendered prefix."""
+        with self._lock:
+            self._prefixes.clear()
+
+
+prompt_assembler = PromptAssembler()
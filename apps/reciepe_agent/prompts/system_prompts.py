@@ -84,3 +84,19 @@ Available tools for grocery search: {tool_names}
 prefferred location id for the store to tool is : 70300720
 Always use tools to search for the ingredients and provide real grocery store results."""
 )
+
+# System prompt for recipe answers in structured (JSON) form
+RECIPE_JSON_SYSTEM_PROMPT = SystemMessagePromptTemplate.from_template(
+    """You are a recipe specialist assistant. Help users find and refine recipes with
+    detailed ingredients, instructions, and cooking tips.
+
+    Respond ONLY with a JSON object of this shape, without markdown fences:
+    {{"recipes": [{{"title": "...", "description": "...", "cuisine": "...",
+      "prep_time": 10, "cook_time": 20, "servings": 4, "difficulty": "easy",
+      "ingredients": [{{"name": "spaghetti", "amount": "400", "unit": "g", "notes": null}}],
+      "instructions": ["Boil the pasta.", "..."],
+      "dietary_tags": []}}]}}
+
+    Times are in minutes. Give each ingredient its own entry with the name only in
+    "name" (amount and unit go in their own fields). Put cooking tips in "description"."""
+)
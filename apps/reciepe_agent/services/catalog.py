@@ -0,0 +1,336 @@
+"""Persistent columnar recipe catalog.
+
+Recipes are ingested once from JSONL/JSON/CSV into a single catalog file:
+
+    MAGIC | header length (uint64) | JSON header | column blobs
+
+Numeric fields are stored as fixed-width arrays, cuisine, difficulty and
+dietary tags are interned into string tables, dietary restrictions are
+also packed into a bitset column, full records are kept as per-recipe
+JSON blobs, and the BM25 search index is persisted next to them. Recipe
+ids and index terms are string columns with a sorted order, so lookups
+are binary searches over the mapped bytes rather than dicts. Opening a
+catalog memory-maps every column, so several API workers share a single
+page-cached copy and startup does not parse any recipe.
+
+Build a catalog from the command line with:
+
+    python -m services.catalog build recipes.jsonl recipes.qmcat
+"""
+
+import csv
+import json
+import logging
+import os
+import struct
+import sys
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from services.filters import encode_dietary_tags
+from services.search_index import RecipeSearchIndex
+from services.strings import StringColumn
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"QMRCAT01"
+FORMAT_VERSION = 3
+_ALIGN = 64
+
+# Missing integer values are stored as -1, missing ratings as NaN.
+INT_COLUMNS = ("prep_time", "cook_time", "total_time", "servings", "reviews_count")
+FLOAT_COLUMNS = ("rating",)
+
+# Record fields holding lists when ingesting CSV files.
+_CSV_LIST_FIELDS = ("ingredients", "instructions", "dietary_tags")
+
+
+def _to_int(value: Any) -> int:
+    if value is None or value == "":
+        return -1
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return -1
+
+
+def _to_float(value: Any) -> float:
+    if value is None or value == "":
+        return float("nan")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _parse_csv_row(row: Dict[str, str]) -> Dict[str, Any]:
+    """Convert a CSV row into a recipe dict.
+
+    List fields may hold a JSON array or a ``;``-separated string.
+    Ingredients given as plain strings become ``{"name": ...}`` dicts.
+    """
+    record: Dict[str, Any] = {k: v for k, v in row.items() if v not in (None, "")}
+    for field in _CSV_LIST_FIELDS:
+        raw = record.get(field)
+        if raw is None:
+            continue
+        if raw.lstrip().startswith("["):
+            record[field] = json.loads(raw)
+        else:
+            record[field] = [part.strip() for part in raw.split(";") if part.strip()]
+    record["ingredients"] = [
+        item if isinstance(item, dict) else {"name": item}
+        for item in record.get("ingredients", [])
+    ]
+    for field in INT_COLUMNS:
+        if field in record:
+            record[field] = _to_int(record[field])
+    for field in FLOAT_COLUMNS:
+        if field in record:
+            record[field] = _to_float(record[field])
+    return record
+
+
+def iter_source_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield recipe dicts from a ``.jsonl``, ``.json`` or ``.csv`` file."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline="", encoding="utf-8") as fh:
+        if ext == ".csv":
+            for row in csv.DictReader(fh):
+                yield _parse_csv_row(row)
+        elif ext == ".json":
+            yield from json.load(fh)
+        else:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def _code_dtype(vocabulary_size: int) -> np.dtype:
+    """Smallest unsigned integer dtype that can hold codes ``0..vocabulary_size - 1``."""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if vocabulary_size <= np.iinfo(dtype).max + 1:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+class RecipeCatalog:
+    """Column-oriented, optionally memory-mapped store of recipes.
+
+    Documents are addressed by their position (``doc_id``); the search
+    index and filter columns all share this numbering.
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, np.ndarray],
+        cuisines: Sequence[str],
+        tags: Sequence[str],
+        difficulties: Sequence[str],
+        path: Optional[str] = None,
+    ):
+        self.ids = StringColumn.from_arrays(columns, "id")
+        self.columns = columns
+        self.cuisines = list(cuisines)
+        self.tags = list(tags)
+        self.difficulties = list(difficulties)
+        self.path = path
+        self._cuisine_codes = {name: i for i, name in enumerate(self.cuisines)}
+        self._tag_codes = {name: i for i, name in enumerate(self.tags)}
+        self._difficulty_codes = {name: i for i, name in enumerate(self.difficulties)}
+        self.search_index = RecipeSearchIndex.from_arrays(columns)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "RecipeCatalog":
+        """Build an in-memory catalog from recipe dicts."""
+        records = list(records)
+        n = len(records)
+        cuisines: Dict[str, int] = {"": 0}
+        difficulties: Dict[str, int] = {"": 0}
+        tags: Dict[str, int] = {}
+        columns: Dict[str, np.ndarray] = {
+            name: np.array([_to_int(r.get(name)) for r in records], dtype=np.int32)
+            for name in INT_COLUMNS
+        }
+        for name in FLOAT_COLUMNS:
+            columns[name] = np.array([_to_float(r.get(name)) for r in records], dtype=np.float32)
+
+        # Codes are collected as int64 and narrowed once the vocabulary sizes are known
+        cuisine_codes = np.zeros(n, dtype=np.int64)
+        difficulty_codes = np.zeros(n, dtype=np.int64)
+        dietary_bits = np.zeros(n, dtype=np.uint32)
+        tag_offsets = np.zeros(n + 1, dtype=np.int64)
+        tag_codes: List[int] = []
+        blobs: List[bytes] = []
+        for i, record in enumerate(records):
+            cuisine = (record.get("cuisine") or "").lower()
+            cuisine_codes[i] = cuisines.setdefault(cuisine, len(cuisines))
+            difficulty = (record.get("difficulty") or "").lower()
+            difficulty_codes[i] = difficulties.setdefault(difficulty, len(difficulties))
+            record_tags = record.get("dietary_tags") or []
+            for tag in record_tags:
+                tag_codes.append(tags.setdefault(tag.lower(), len(tags)))
+            dietary_bits[i] = encode_dietary_tags(record_tags)
+            tag_offsets[i + 1] = len(tag_codes)
+            blobs.append(json.dumps(record, separators=(",", ":")).encode("utf-8"))
+
+        doc_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in blobs], out=doc_offsets[1:])
+        columns.update({
+            "cuisine": cuisine_codes.astype(_code_dtype(len(cuisines))),
+            "difficulty": difficulty_codes.astype(_code_dtype(len(difficulties))),
+            "dietary_bits": dietary_bits,
+            "tag_offsets": tag_offsets,
+            "tag_codes": np.array(tag_codes, dtype=_code_dtype(len(tags))),
+            "doc_offsets": doc_offsets,
+            "docs": np.frombuffer(b"".join(blobs), dtype=np.uint8),
+        })
+        columns.update(StringColumn.from_strings([str(r["id"]) for r in records], sort=True).to_arrays("id"))
+        columns.update(RecipeSearchIndex.build(records).to_arrays())
+        return cls(
+            columns=columns,
+            cuisines=list(cuisines),
+            tags=list(tags),
+            difficulties=list(difficulties),
+        )
+
+    @classmethod
+    def open(cls, path: str) -> "RecipeCatalog":
+        """Memory-map a catalog file written by ``save``."""
+        with open(path, "rb") as fh:
+            if fh.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a recipe catalog file")
+            (header_len,) = struct.unpack("<Q", fh.read(8))
+            header = json.loads(fh.read(header_len))
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported catalog version {header.get('version')} in {path}; rebuild it from the source data"
+            )
+
+        # One shared read-only mapping; columns are aligned views into it.
+        mapped = np.memmap(path, dtype=np.uint8, mode="r")
+        columns = {}
+        for name, spec in header["columns"].items():
+            dtype = np.dtype(spec["dtype"])
+            start = spec["offset"]
+            columns[name] = mapped[start:start + spec["length"] * dtype.itemsize].view(dtype)
+        logger.info(f"Opened recipe catalog {path} with {header['count']} recipes")
+        return cls(
+            columns=columns,
+            cuisines=header["cuisines"],
+            tags=header["tags"],
+            difficulties=header["difficulties"],
+            path=path,
+        )
+
+    def save(self, path: str) -> None:
+        """Write the catalog to ``path`` in the memory-mappable format."""
+        header: Dict[str, Any] = {
+            "version": FORMAT_VERSION,
+            "count": len(self),
+            "cuisines": self.cuisines,
+            "tags": self.tags,
+            "difficulties": self.difficulties,
+            "columns": {},
+        }
+        # Offsets depend on the header size, so lay columns out relative to
+        # the data section and fix them up once the header length is known.
+        layout = []
+        cursor = 0
+        for name, array in self.columns.items():
+            cursor = -(-cursor // _ALIGN) * _ALIGN
+            layout.append((name, array, cursor))
+            cursor += array.nbytes
+        for name, array, rel in layout:
+            header["columns"][name] = {"dtype": array.dtype.str, "offset": rel, "length": len(array)}
+        # Absolute offsets only add digits, so reserve room for them up front.
+        prefix = len(MAGIC) + 8
+        reserve = len(json.dumps(header)) + 20 * len(layout)
+        data_start = -(-(prefix + reserve) // _ALIGN) * _ALIGN
+        for spec in header["columns"].values():
+            spec["offset"] += data_start
+        header_bytes = json.dumps(header).encode("utf-8")
+
+        # A unique temp file, so concurrent builds of the same catalog never share one
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), prefix=f"{os.path.basename(path)}.", suffix=".tmp"
+        )
+        try:
+            # mkstemp creates the file owner-only; catalogs are shared read-only files
+            os.chmod(tmp_path, 0o644)
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(MAGIC)
+                fh.write(struct.pack("<Q", len(header_bytes)))
+                fh.write(header_bytes)
+                for name, array, rel in layout:
+                    fh.seek(data_start + rel)
+                    fh.write(np.ascontiguousarray(array).tobytes())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def position(self, recipe_id: str) -> Optional[int]:
+        """Return the doc_id of a recipe, or ``None`` if unknown."""
+        return self.ids.find(recipe_id)
+
+    def record(self, doc_id: int) -> Dict[str, Any]:
+        """Decode the full recipe dict stored for ``doc_id``."""
+        offsets = self.columns["doc_offsets"]
+        start, end = int(offsets[doc_id]), int(offsets[doc_id + 1])
+        return json.loads(self.columns["docs"][start:end].tobytes())
+
+    def recipe_tags(self, doc_id: int) -> List[str]:
+        """Return the interned dietary tags of a recipe."""
+        offsets = self.columns["tag_offsets"]
+        codes = self.columns["tag_codes"][offsets[doc_id]:offsets[doc_id + 1]]
+        return [self.tags[c] for c in codes]
+
+    def cuisine_code(self, cuisine: str) -> int:
+        """Interned code of a cuisine, or -1 if no recipe has it."""
+        return self._cuisine_codes.get(cuisine.lower(), -1)
+
+    def difficulty_code(self, difficulty: str) -> int:
+        """Interned code of a difficulty level, or -1 if no recipe has it."""
+        return self._difficulty_codes.get(difficulty.lower(), -1)
+
+    def tag_code(self, tag: str) -> Optional[int]:
+        """Interned code of a dietary tag, or ``None`` if no recipe has it."""
+        return self._tag_codes.get(tag.lower())
+
+
+def load_catalog(path: str) -> RecipeCatalog:
+    """Open a catalog file, building it first if ``path`` is a JSONL/JSON/CSV source."""
+    if path.lower().endswith((".jsonl", ".json", ".csv")):
+        target = os.path.splitext(path)[0] + ".qmcat"
+        if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(path):
+            logger.info(f"Building recipe catalog {target} from {path}")
+            RecipeCatalog.from_records(iter_source_records(path)).save(target)
+        path = target
+    return RecipeCatalog.open(path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point: ``build <source> <catalog>``."""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3 or argv[0] != "build":
+        print("Usage: python -m services.catalog build <recipes.jsonl|.json|.csv> <catalog.qmcat>")
+        return 1
+    catalog = RecipeCatalog.from_records(iter_source_records(argv[1]))
+    catalog.save(argv[2])
+    print(f"Wrote {len(catalog)} recipes to {argv[2]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Vectorized evaluation of RecipeQuery constraints over catalog columns.
+
+Dietary restrictions are stored per recipe as a bitset with one bit per
+``DietaryRestriction`` value. Tags imply the restrictions they satisfy
+(a vegan recipe is also vegetarian and dairy-free), so the implication
+closure is folded into the bitset when the catalog is built.
+
+Semantics:
+
+* Different constraint kinds (cuisine, dietary, difficulty, times) are
+  combined with AND.
+* Multiple dietary restrictions are combined with AND by default
+  (``DietaryMatch.ALL``: the recipe satisfies every restriction) or with OR
+  (``DietaryMatch.ANY``: it satisfies at least one).
+* Restrictions that are not ``DietaryRestriction`` values are matched
+  against the raw tag list with the same AND/OR rule.
+* A recipe with an unknown prep or cook time never satisfies a time limit.
+"""
+
+import logging
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from models.recipe import DietaryMatch, DietaryRestriction, RecipeQuery
+
+if TYPE_CHECKING:
+    from services.catalog import RecipeCatalog
+
+
+logger = logging.getLogger(__name__)
+
+DIETARY_BITS: Dict[str, int] = {r.value: 1 << i for i, r in enumerate(DietaryRestriction)}
+
+# Restrictions satisfied by a recipe carrying the key tag.
+DIETARY_IMPLICATIONS: Dict[str, List[str]] = {
+    DietaryRestriction.VEGAN.value: [DietaryRestriction.VEGETARIAN.value, DietaryRestriction.DAIRY_FREE.value],
+    DietaryRestriction.KETO.value: [DietaryRestriction.LOW_CARB.value],
+    DietaryRestriction.PALEO.value: [DietaryRestriction.GLUTEN_FREE.value, DietaryRestriction.DAIRY_FREE.value],
+}
+
+
+def encode_dietary_tags(tags: Iterable[str]) -> int:
+    """Return the dietary bitset for a recipe's tags, including implied restrictions."""
+    bits = 0
+    for tag in tags:
+        tag = tag.lower()
+        bits |= DIETARY_BITS.get(tag, 0)
+        for implied in DIETARY_IMPLICATIONS.get(tag, ()):
+            bits |= DIETARY_BITS[implied]
+    return bits
+
+
+class RecipeFilterEngine:
+    """Evaluate RecipeQuery constraints as boolean masks over a catalog."""
+
+    def __init__(self, catalog: "RecipeCatalog"):
+        self.catalog = catalog
+        self._tag_owners: Optional[np.ndarray] = None
+
+    def _has_tag(self, tag: str) -> np.ndarray:
+        """Mask of recipes whose raw tag list contains ``tag`` (slow path)."""
+        has_tag = np.zeros(len(self.catalog), dtype=bool)
+        code = self.catalog.tag_code(tag)
+        if code is None:
+            return has_tag
+        if self._tag_owners is None:
+            counts = np.diff(self.catalog["tag_offsets"])
+            self._tag_owners = np.repeat(np.arange(len(self.catalog), dtype=np.int32), counts)
+        has_tag[self._tag_owners[self.catalog["tag_codes"] == code]] = True
+        return has_tag
+
+    def _dietary_mask(self, restrictions: List[str], match: DietaryMatch, out: np.ndarray) -> np.ndarray:
+        """Write the dietary constraint into ``out`` and return it."""
+        wanted = 0
+        extra: List[str] = []
+        for restriction in restrictions:
+            restriction = restriction.strip().lower()
+            if restriction in DIETARY_BITS:
+                wanted |= DIETARY_BITS[restriction]
+            elif restriction:
+                extra.append(restriction)
+        bits = self.catalog["dietary_bits"]
+        scratch = np.bitwise_and(bits, np.uint32(wanted))
+        if match == DietaryMatch.ANY:
+            np.not_equal(scratch, 0, out=out)
+            for tag in extra:
+                out |= self._has_tag(tag)
+        else:
+            np.equal(scratch, wanted, out=out)
+            for tag in extra:
+                out &= self._has_tag(tag)
+        return out
+
+    def mask(self, query: RecipeQuery) -> Optional[np.ndarray]:
+        """Boolean mask of recipes satisfying ``query``; ``None`` if it has no constraints.
+
+        Every constraint is evaluated over whole columns and folded into a
+        single result buffer in place, so a query costs one pass per
+        constraint with no per-recipe Python work.
+        """
+        catalog = self.catalog
+        n = len(catalog)
+        mask: Optional[np.ndarray] = None
+        scratch = np.empty(n, dtype=bool)
+
+        def _and(cond: np.ndarray) -> None:
+            nonlocal mask, scratch
+            if mask is None:
+                mask, scratch = cond, np.empty(n, dtype=bool)
+            else:
+                np.logical_and(mask, cond, out=mask)
+
+        if query.cuisine:
+            _and(np.equal(catalog["cuisine"], catalog.cuisine_code(query.cuisine), out=scratch))
+        if query.difficulty:
+            _and(np.equal(catalog["difficulty"], catalog.difficulty_code(query.difficulty), out=scratch))
+        if query.dietary_restrictions:
+            _and(self._dietary_mask(query.dietary_restrictions, query.dietary_match, out=scratch))
+        for name, limit in (("prep_time", query.max_prep_time), ("cook_time", query.max_cook_time)):
+            if limit is not None:
+                # Missing times are stored as -1; compare unsigned so they sort above any limit.
+                _and(np.less_equal(catalog[name].view(np.uint32), max(limit, 0), out=scratch))
+        return mask
+
+    def candidates(self, query: RecipeQuery) -> np.ndarray:
+        """Indices of recipes satisfying ``query``, in catalog order."""
+        mask = self.mask(query)
+        if mask is None:
+            return np.arange(len(self.catalog))
+        return np.flatnonzero(mask)
@@ -1,223 +1,178 @@
 """Recipe service for business logic."""
 
+import os
+import threading
+from collections import OrderedDict
 from typing import List, Optional, Dict, Any
 import json
 from models.recipe import Recipe, RecipeQuery, IngredientSubstitution, MealPlan
+from services.catalog import RecipeCatalog, load_catalog
+from services.filters import RecipeFilterEngine
+from services.substitutions import SUBSTITUTIONS, substitution_index
+
+
+# Built-in catalog used when no external recipe data is configured
+SAMPLE_RECIPES: List[Dict[str, Any]] = [
+    {
+        "id": "1",
+        "title": "Classic Spaghetti Carbonara",
+        "description": "Authentic Italian pasta dish with eggs, cheese, and pancetta",
+        "cuisine": "italian",
+        "prep_time": 15,
+        "cook_time": 20,
+        "total_time": 35,
+        "servings": 4,
+        "difficulty": "medium",
+        "ingredients": [
+            {"name": "spaghetti", "amount": "400", "unit": "g"},
+            {"name": "pancetta", "amount": "200", "unit": "g"},
+            {"name": "eggs", "amount": "4", "unit": "large"},
+            {"name": "Pecorino Romano cheese", "amount": "100", "unit": "g"},
+            {"name": "black pepper", "amount": "to taste"},
+            {"name": "salt", "amount": "to taste"}
+        ],
+        "instructions": [
+            "Cook spaghetti in salted boiling water until al dente",
+            "Cook pancetta until crispy",
+            "Whisk eggs with cheese and pepper",
+            "Combine hot pasta with pancetta",
+            "Add egg mixture off heat, tossing quickly",
+            "Serve immediately"
+        ],
+        "dietary_tags": ["gluten-containing"],
+        "rating": 4.8,
+        "reviews_count": 1250
+    },
+    {
+        "id": "2",
+        "title": "Vegetarian Buddha Bowl",
+        "description": "Healthy and colorful bowl with quinoa, roasted vegetables, and tahini dressing",
+        "cuisine": "fusion",
+        "prep_time": 20,
+        "cook_time": 25,
+        "total_time": 45,
+        "servings": 2,
+        "difficulty": "easy",
+        "ingredients": [
+            {"name": "quinoa", "amount": "1", "unit": "cup"},
+            {"name": "mixed vegetables", "amount": "2", "unit": "cups"},
+            {"name": "avocado", "amount": "1", "unit": "large"},
+            {"name": "tahini", "amount": "2", "unit": "tbsp"},
+            {"name": "lemon", "amount": "1", "unit": "whole"},
+            {"name": "olive oil", "amount": "2", "unit": "tbsp"},
+            {"name": "salt", "amount": "to taste"},
+            {"name": "pepper", "amount": "to taste"}
+        ],
+        "instructions": [
+            "Cook quinoa according to package directions",
+            "Roast vegetables with olive oil at 400°F for 20 minutes",
+            "Make tahini dressing with lemon juice",
+            "Assemble bowl with quinoa, vegetables, and avocado",
+            "Drizzle with dressing and serve"
+        ],
+        "dietary_tags": ["vegetarian", "vegan", "gluten-free"],
+        "rating": 4.6,
+        "reviews_count": 890
+    },
+    {
+        "id": "3",
+        "title": "Chicken Tikka Masala",
+        "description": "Creamy Indian curry with tender chicken in spiced tomato sauce",
+        "cuisine": "indian",
+        "prep_time": 30,
+        "cook_time": 45,
+        "total_time": 75,
+        "servings": 6,
+        "difficulty": "medium",
+        "ingredients": [
+            {"name": "chicken breast", "amount": "2", "unit": "lbs"},
+            {"name": "yogurt", "amount": "1", "unit": "cup"},
+            {"name": "garam masala", "amount": "2", "unit": "tsp"},
+            {"name": "tomato sauce", "amount": "1", "unit": "can"},
+            {"name": "heavy cream", "amount": "1/2", "unit": "cup"},
+            {"name": "ginger", "amount": "2", "unit": "tbsp"},
+            {"name": "garlic", "amount": "4", "unit": "cloves"}
+        ],
+        "instructions": [
+            "Marinate chicken in yogurt and spices for 30 minutes",
+            "Grill or pan-cook chicken until done",
+            "Make sauce with tomatoes, cream, and spices",
+            "Combine chicken with sauce",
+            "Simmer for 15 minutes",
+            "Serve with rice or naan"
+        ],
+        "dietary_tags": ["gluten-free"],
+        "rating": 4.7,
+        "reviews_count": 2100
+    }
+]
+
+# Recipe models kept built, least recently used evicted first (0 disables)
+RECIPE_MODEL_CACHE_SIZE = int(os.getenv("RECIPE_MODEL_CACHE_SIZE", "4096"))
+
+NO_SUBSTITUTION: Dict[str, Any] = {
+    "substitutes": ["No specific substitutions found. Consult a recipe database."],
+    "notes": "Consider the ingredient's role in the recipe when substituting."
+}
 
 
 class RecipeService:
     """Service class for recipe-related business logic."""
     
-    def __init__(self):
-        """Initialize the recipe service."""
-        self.recipes_cache = {}
+    def __init__(self, catalog: Optional[RecipeCatalog] = None, cache_size: int = RECIPE_MODEL_CACHE_SIZE):
+        """Initialize the recipe service.
+        
+        Args:
+            catalog: Recipe catalog to serve. Defaults to the file named by
+                RECIPE_CATALOG_PATH, or the built-in sample recipes.
+            cache_size: Most Recipe models kept built, by doc_id
+        """
+        if catalog is None:
+            catalog_path = os.getenv("RECIPE_CATALOG_PATH")
+            if catalog_path:
+                catalog = load_catalog(catalog_path)
+            else:
+                catalog = RecipeCatalog.from_records(SAMPLE_RECIPES)
+        self.catalog = catalog
+        self.search_index = catalog.search_index
+        self.filter_engine = RecipeFilterEngine(catalog)
+        self.cache_size = cache_size
+        self.recipes_cache: "OrderedDict[int, Recipe]" = OrderedDict()
+        self._cache_lock = threading.Lock()
         self.substitutions_cache = {}
         
     def search_recipes(self, query: RecipeQuery) -> List[Recipe]:
         """Search for recipes based on query parameters."""
-        # This would typically interface with a real recipe database
-        # For now, return mock data
-        
-        mock_recipes = [
-            {
-                "id": "1",
-                "title": "Classic Spaghetti Carbonara",
-                "description": "Authentic Italian pasta dish with eggs, cheese, and pancetta",
-                "cuisine": "italian",
-                "prep_time": 15,
-                "cook_time": 20,
-                "total_time": 35,
-                "servings": 4,
-                "difficulty": "medium",
-                "ingredients": [
-                    {"name": "spaghetti", "amount": "400", "unit": "g"},
-                    {"name": "pancetta", "amount": "200", "unit": "g"},
-                    {"name": "eggs", "amount": "4", "unit": "large"},
-                    {"name": "Pecorino Romano cheese", "amount": "100", "unit": "g"},
-                    {"name": "black pepper", "amount": "to taste"},
-                    {"name": "salt", "amount": "to taste"}
-                ],
-                "instructions": [
-                    "Cook spaghetti in salted boiling water until al dente",
-                    "Cook pancetta until crispy",
-                    "Whisk eggs with cheese and pepper",
-                    "Combine hot pasta with pancetta",
-                    "Add egg mixture off heat, tossing quickly",
-                    "Serve immediately"
-                ],
-                "dietary_tags": ["gluten-containing"],
-                "rating": 4.8,
-                "reviews_count": 1250
-            },
-            {
-                "id": "2",
-                "title": "Vegetarian Buddha Bowl",
-                "description": "Healthy and colorful bowl with quinoa, roasted vegetables, and tahini dressing",
-                "cuisine": "fusion",
-                "prep_time": 20,
-                "cook_time": 25,
-                "total_time": 45,
-                "servings": 2,
-                "difficulty": "easy",
-                "ingredients": [
-                    {"name": "quinoa", "amount": "1", "unit": "cup"},
-                    {"name": "mixed vegetables", "amount": "2", "unit": "cups"},
-                    {"name": "avocado", "amount": "1", "unit": "large"},
-                    {"name": "tahini", "amount": "2", "unit": "tbsp"},
-                    {"name": "lemon", "amount": "1", "unit": "whole"},
-                    {"name": "olive oil", "amount": "2", "unit": "tbsp"},
-                    {"name": "salt", "amount": "to taste"},
-                    {"name": "pepper", "amount": "to taste"}
-                ],
-                "instructions": [
-                    "Cook quinoa according to package directions",
-                    "Roast vegetables with olive oil at 400°F for 20 minutes",
-                    "Make tahini dressing with lemon juice",
-                    "Assemble bowl with quinoa, vegetables, and avocado",
-                    "Drizzle with dressing and serve"
-                ],
-                "dietary_tags": ["vegetarian", "vegan", "gluten-free"],
-                "rating": 4.6,
-                "reviews_count": 890
-            },
-            {
-                "id": "3",
-                "title": "Chicken Tikka Masala",
-                "description": "Creamy Indian curry with tender chicken in spiced tomato sauce",
-                "cuisine": "indian",
-                "prep_time": 30,
-                "cook_time": 45,
-                "total_time": 75,
-                "servings": 6,
-                "difficulty": "medium",
-                "ingredients": [
-                    {"name": "chicken breast", "amount": "2", "unit": "lbs"},
-                    {"name": "yogurt", "amount": "1", "unit": "cup"},
-                    {"name": "garam masala", "amount": "2", "unit": "tsp"},
-                    {"name": "tomato sauce", "amount": "1", "unit": "can"},
-                    {"name": "heavy cream", "amount": "1/2", "unit": "cup"},
-                    {"name": "ginger", "amount": "2", "unit": "tbsp"},
-                    {"name": "garlic", "amount": "4", "unit": "cloves"}
-                ],
-                "instructions": [
-                    "Marinate chicken in yogurt and spices for 30 minutes",
-                    "Grill or pan-cook chicken until done",
-                    "Make sauce with tomatoes, cream, and spices",
-                    "Combine chicken with sauce",
-                    "Simmer for 15 minutes",
-                    "Serve with rice or naan"
-                ],
-                "dietary_tags": ["gluten-free"],
-                "rating": 4.7,
-                "reviews_count": 2100
-            }
-        ]
-        
-        # Filter based on query
-        filtered_recipes = []
-        for recipe_data in mock_recipes:
-            # Check if query matches title or cuisine
-            if (query.query.lower() in recipe_data["title"].lower() or 
-                query.query.lower() in recipe_data.get("cuisine", "").lower() or
-                query.query.lower() == "popular"):
-                
-                # Apply filters
-                if query.cuisine and recipe_data.get("cuisine") != query.cuisine.lower():
-                    continue
-                    
-                if query.dietary_restrictions:
-                    recipe_tags = recipe_data.get("dietary_tags", [])
-                    if not any(restriction in recipe_tags for restriction in query.dietary_restrictions):
-                        # For vegetarian/vegan, be more flexible
-                        if "vegetarian" in query.dietary_restrictions and "vegetarian" not in recipe_tags:
-                            continue
-                        if "gluten-free" in query.dietary_restrictions and "gluten-free" not in recipe_tags:
-                            continue
-                
-                if query.max_prep_time and recipe_data.get("prep_time", 0) > query.max_prep_time:
-                    continue
-                    
-                if query.max_cook_time and recipe_data.get("cook_time", 0) > query.max_cook_time:
-                    continue
-                
-                # Convert to Recipe model
-                recipe = Recipe(**recipe_data)
-                filtered_recipes.append(recipe)
-        
-        return filtered_recipes[:query.max_results]
+        candidates = self.filter_engine.mask(query)
+        hits = self.search_index.search(query.query, k=query.max_results, candidates=candidates)
+        return [self._recipe_at(doc_id) for doc_id, _ in hits]
+
+    def _recipe_at(self, doc_id: int) -> Recipe:
+        """Return the Recipe model for an indexed document, reusing recently built ones."""
+        with self._cache_lock:
+            recipe = self.recipes_cache.get(doc_id)
+            if recipe is not None:
+                self.recipes_cache.move_to_end(doc_id)
+                return recipe
+        recipe = Recipe(**self.catalog.record(doc_id))
+        if self.cache_size > 0:
+            with self._cache_lock:
+                self.recipes_cache[doc_id] = recipe
+                while len(self.recipes_cache) > self.cache_size:
+                    self.recipes_cache.popitem(last=False)
+        return recipe
     
     def get_recipe_by_id(self, recipe_id: str) -> Optional[Recipe]:
         """Get a specific recipe by ID."""
-        # Mock implementation
-        if recipe_id in self.recipes_cache:
-            return self.recipes_cache[recipe_id]
-        return None
+        doc_id = self.catalog.position(recipe_id)
+        if doc_id is None:
+            return None
+        return self._recipe_at(doc_id)
     
     def get_ingredient_substitutions(self, ingredient: str, context: Optional[str] = None) -> IngredientSubstitution:
         """Get substitutions for an ingredient."""
-        substitutions_db = {
-            "eggs": {
-                "substitutes": [
-                    "flax eggs (1 tbsp ground flaxseed + 3 tbsp water per egg)",
-                    "applesauce (1/4 cup per egg)",
-                    "mashed banana (1/4 cup per egg)",
-                    "commercial egg replacer"
-                ],
-                "notes": "Best for baking. Flax eggs work well for binding."
-            },
-            "butter": {
-                "substitutes": [
-                    "coconut oil (same amount)",
-                    "olive oil (3/4 amount)",
-                    "vegan butter (same amount)",
-                    "applesauce (1/2 amount for baking)"
-                ],
-                "notes": "For baking, applesauce reduces fat content."
-            },
-            "milk": {
-                "substitutes": [
-                    "almond milk",
-                    "oat milk", 
-                    "soy milk",
-                    "coconut milk",
-                    "rice milk"
-                ],
-                "notes": "Use same amount. Coconut milk is richer."
-            },
-            "flour": {
-                "substitutes": [
-                    "almond flour (1:1 ratio)",
-                    "coconut flour (1/4 amount)",
-                    "rice flour (1:1 ratio)",
-                    "gluten-free flour blend (1:1 ratio)"
-                ],
-                "notes": "Coconut flour is very absorbent, use less."
-            },
-            "sugar": {
-                "substitutes": [
-                    "honey (3/4 amount)",
-                    "maple syrup (3/4 amount)",
-                    "stevia (much less, to taste)",
-                    "coconut sugar (1:1 ratio)"
-                ],
-                "notes": "Liquid sweeteners may affect texture."
-            }
-        }
-        
-        ingredient_lower = ingredient.lower()
-        substitution_data = None
-        
-        # Find matching substitution
-        for key, data in substitutions_db.items():
-            if key in ingredient_lower or ingredient_lower in key:
-                substitution_data = data
-                break
-        
-        if not substitution_data:
-            substitution_data = {
-                "substitutes": ["No specific substitutions found. Consult a recipe database."],
-                "notes": "Consider the ingredient's role in the recipe when substituting."
-            }
+        key = substitution_index.lookup(ingredient)
+        substitution_data = SUBSTITUTIONS[key] if key else NO_SUBSTITUTION
         
         return IngredientSubstitution(
             original_ingredient=ingredient,
@@ -225,6 +180,19 @@ class RecipeService:
             notes=substitution_data["notes"]
         )
     
+    def get_ingredient_substitutions_batch(self, ingredients: List[str],
+                                           context: Optional[str] = None) -> List[IngredientSubstitution]:
+        """Get substitutions for every ingredient of a list, in order."""
+        keys = substitution_index.lookup_many(ingredients)
+        return [
+            IngredientSubstitution(
+                original_ingredient=ingredient,
+                substitutes=(SUBSTITUTIONS[key] if key else NO_SUBSTITUTION)["substitutes"],
+                notes=(SUBSTITUTIONS[key] if key else NO_SUBSTITUTION)["notes"]
+            )
+            for ingredient, key in zip(ingredients, keys)
+        ]
+    
     def create_meal_plan(self, days: int, dietary_restrictions: List[str] = None, 
                         cuisine_preferences: List[str] = None) -> MealPlan:
         """Create a meal plan."""
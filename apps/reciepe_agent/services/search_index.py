@@ -0,0 +1,233 @@
+"""Inverted index and BM25 ranking for recipe search."""
+
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.strings import StringColumn
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how",
+    "i", "in", "is", "it", "me", "make", "my", "of", "on", "or", "recipe",
+    "recipes", "some", "the", "to", "with", "find", "search",
+})
+
+# Relative weight of each recipe field when computing term frequencies.
+FIELD_WEIGHTS: Dict[str, float] = {
+    "title": 3.0,
+    "cuisine": 2.0,
+    "dietary_tags": 2.0,
+    "ingredients": 1.5,
+    "description": 1.0,
+}
+
+# Array names used when the index is persisted alongside the catalog.
+INDEX_ARRAYS = ("term_offsets", "posting_docs", "posting_tfs", "doc_lengths", "popularity")
+
+
+def _stem(token: str) -> str:
+    """Very light plural folding so that "eggs" matches "egg"."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into normalized search terms."""
+    if not text:
+        return []
+    return [_stem(tok) for tok in _TOKEN_RE.findall(text.lower()) if tok not in _STOPWORDS]
+
+
+def _field_texts(recipe: Dict) -> Iterable[Tuple[str, str]]:
+    """Yield (field, text) pairs for every indexed field of a recipe."""
+    yield "title", recipe.get("title") or ""
+    yield "description", recipe.get("description") or ""
+    yield "cuisine", recipe.get("cuisine") or ""
+    for ingredient in recipe.get("ingredients") or []:
+        name = ingredient.get("name") if isinstance(ingredient, dict) else ingredient
+        yield "ingredients", name or ""
+    for tag in recipe.get("dietary_tags") or []:
+        yield "dietary_tags", tag
+
+
+def popularity_score(recipe: Dict) -> float:
+    """Static popularity prior used to break ties and rank empty queries."""
+    rating = recipe.get("rating") or 0.0
+    reviews = recipe.get("reviews_count") or 0
+    return float(rating * np.log1p(reviews)) if reviews else float(rating)
+
+
+class RecipeSearchIndex:
+    """Inverted index over recipe records with BM25 ranking.
+
+    Documents are addressed by their position in the catalog. Postings are
+    stored in CSR form: the postings of term ``t`` are
+    ``posting_docs[term_offsets[t]:term_offsets[t + 1]]`` (ascending doc
+    ids) with matching weighted term frequencies in ``posting_tfs``. The
+    arrays may be plain in-memory arrays or memory-mapped catalog columns.
+    Terms are a sorted ``StringColumn``, looked up by binary search.
+    """
+
+    def __init__(
+        self,
+        terms: StringColumn,
+        term_offsets: np.ndarray,
+        posting_docs: np.ndarray,
+        posting_tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+        popularity: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.k1 = k1
+        self.b = b
+        self.terms = terms
+        self.term_offsets = term_offsets
+        self.posting_docs = posting_docs
+        self.posting_tfs = posting_tfs
+        self.doc_lengths = doc_lengths
+        self.popularity = popularity
+        n_docs = len(doc_lengths)
+        self.avg_doc_length = float(doc_lengths.mean()) if n_docs else 0.0
+        df = np.diff(term_offsets).astype(np.float64)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        self._max_scores: Dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, recipes: Sequence[Dict], **kwargs) -> "RecipeSearchIndex":
+        """Build an index over a sequence of recipe dicts."""
+        postings: Dict[str, Tuple[List[int], List[float]]] = {}
+        doc_lengths = np.zeros(len(recipes), dtype=np.float32)
+        popularity = np.zeros(len(recipes), dtype=np.float32)
+        for doc_id, recipe in enumerate(recipes):
+            term_freqs: Dict[str, float] = {}
+            for field, text in _field_texts(recipe):
+                weight = FIELD_WEIGHTS[field]
+                for term in tokenize(text):
+                    term_freqs[term] = term_freqs.get(term, 0.0) + weight
+            for term, tf in term_freqs.items():
+                docs, tfs = postings.setdefault(term, ([], []))
+                docs.append(doc_id)
+                tfs.append(tf)
+            doc_lengths[doc_id] = sum(term_freqs.values())
+            popularity[doc_id] = popularity_score(recipe)
+
+        terms = sorted(postings)
+        sizes = [len(postings[t][0]) for t in terms]
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=term_offsets[1:])
+        posting_docs = np.fromiter(
+            (d for t in terms for d in postings[t][0]), dtype=np.int32, count=int(term_offsets[-1])
+        )
+        posting_tfs = np.fromiter(
+            (f for t in terms for f in postings[t][1]), dtype=np.float32, count=int(term_offsets[-1])
+        )
+        return cls(StringColumn.from_strings(terms), term_offsets, posting_docs, posting_tfs, doc_lengths, popularity, **kwargs)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], **kwargs) -> "RecipeSearchIndex":
+        """Rebuild an index from arrays produced by ``to_arrays``."""
+        terms = StringColumn.from_arrays(arrays, "term")
+        return cls(terms, *(arrays[name] for name in INDEX_ARRAYS), **kwargs)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Return the arrays needed to persist this index."""
+        arrays = {name: getattr(self, name) for name in INDEX_ARRAYS}
+        arrays.update(self.terms.to_arrays("term"))
+        return arrays
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+        return self.posting_docs[start:end], self.posting_tfs[start:end]
+
+    def _bm25(self, idf: float, tfs: np.ndarray, docs: np.ndarray) -> np.ndarray:
+        norm = 1.0 - self.b + self.b * self.doc_lengths[docs] / (self.avg_doc_length or 1.0)
+        return idf * tfs * (self.k1 + 1.0) / (tfs + self.k1 * norm)
+
+    def _max_score(self, term_id: int) -> float:
+        """Upper bound of a term's contribution, computed once per term."""
+        score = self._max_scores.get(term_id)
+        if score is None:
+            docs, tfs = self._postings(term_id)
+            score = float(self._bm25(self.idf[term_id], tfs, docs).max())
+            self._max_scores[term_id] = score
+        return score
+
+    def _top_k(self, docs: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if len(docs) > k:
+            keep = np.argpartition(-scores, k - 1)[:k]
+            docs, scores = docs[keep], scores[keep]
+        order = np.lexsort((-self.popularity[docs], -scores))
+        return [(int(docs[i]), float(scores[i])) for i in order]
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        candidates: Optional[np.ndarray] = None,
+    ) -> List[Tuple[int, float]]:
+        """Return the top-``k`` (doc_id, score) pairs for ``query``.
+
+        Terms are scored in descending order of their maximum possible
+        contribution. Once the k-th best accumulated score exceeds what the
+        remaining terms could add, no new documents are admitted and the
+        remaining postings are only probed for the surviving candidates.
+        An empty query ranks ``candidates`` (or all docs) by popularity.
+
+        Args:
+            query: Free-text query
+            k: Number of results to return
+            candidates: Optional boolean mask of documents allowed to match
+        """
+        if k <= 0 or not len(self):
+            return []
+        tokens = tokenize(query)
+        term_ids = [i for i in map(self.terms.find, dict.fromkeys(tokens)) if i is not None]
+        if not term_ids:
+            if tokens and query.strip().lower() != "popular":
+                return []
+            docs = np.flatnonzero(candidates) if candidates is not None else np.arange(len(self))
+            return self._top_k(docs, self.popularity[docs].astype(np.float64), k)
+
+        term_ids.sort(key=self._max_score, reverse=True)
+        remaining = np.zeros(len(term_ids) + 1)
+        for i in range(len(term_ids) - 1, -1, -1):
+            remaining[i] = remaining[i + 1] + self._max_score(term_ids[i])
+
+        cand_docs = np.empty(0, dtype=np.int64)
+        cand_scores = np.empty(0, dtype=np.float64)
+        admitting = True
+        for i, term_id in enumerate(term_ids):
+            docs, tfs = self._postings(term_id)
+            idf = self.idf[term_id]
+            if admitting:
+                if candidates is not None:
+                    allowed = candidates[docs]
+                    docs, tfs = docs[allowed], tfs[allowed]
+                merged = np.concatenate([cand_docs, docs])
+                weights = np.concatenate([cand_scores, self._bm25(idf, tfs, docs)])
+                cand_docs, inverse = np.unique(merged, return_inverse=True)
+                cand_scores = np.bincount(inverse, weights=weights)
+            elif len(docs):
+                pos = np.minimum(np.searchsorted(docs, cand_docs), len(docs) - 1)
+                hit = docs[pos] == cand_docs
+                cand_scores[hit] += self._bm25(idf, tfs[pos[hit]], cand_docs[hit])
+
+            if admitting and len(cand_docs) >= k:
+                threshold = np.partition(cand_scores, -k)[-k]
+                if threshold >= remaining[i + 1]:
+                    admitting = False
+                    keep = cand_scores + remaining[i + 1] >= threshold
+                    cand_docs, cand_scores = cand_docs[keep], cand_scores[keep]
+
+        return self._top_k(cand_docs, cand_scores, k)
@@ -0,0 +1,81 @@
+"""Memory-mappable string columns with binary-search lookup."""
+
+from typing import Dict, Iterator, Optional, Sequence
+
+import numpy as np
+
+
+class StringColumn:
+    """A list of strings stored as one UTF-8 byte array plus offsets.
+
+    String ``i`` is ``chars[offsets[i]:offsets[i + 1]]``. ``order`` lists
+    the positions in ascending byte order of their strings; when it is
+    ``None`` the strings themselves are stored sorted. Either way ``find``
+    is a binary search, so looking a string up builds no per-process dict
+    and the arrays can be memory-mapped catalog columns.
+    """
+
+    def __init__(self, chars: np.ndarray, offsets: np.ndarray, order: Optional[np.ndarray] = None):
+        self.chars = chars
+        self.offsets = offsets
+        self.order = order
+
+    @classmethod
+    def from_strings(cls, strings: Sequence[str], sort: bool = False) -> "StringColumn":
+        """Encode ``strings`` in order; ``sort=True`` adds the sorted permutation.
+
+        Without ``sort`` the strings must already be in ascending order.
+        """
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        chars = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        order = None
+        if sort:
+            order = np.array(sorted(range(len(encoded)), key=encoded.__getitem__), dtype=np.int64)
+        return cls(chars, offsets, order)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], prefix: str) -> "StringColumn":
+        """Rebuild a column from arrays produced by ``to_arrays``."""
+        return cls(arrays[f"{prefix}_chars"], arrays[f"{prefix}_char_offsets"], arrays.get(f"{prefix}_order"))
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """Return the arrays needed to persist this column, named after ``prefix``."""
+        arrays = {f"{prefix}_chars": self.chars, f"{prefix}_char_offsets": self.offsets}
+        if self.order is not None:
+            arrays[f"{prefix}_order"] = self.order
+        return arrays
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _bytes(self, i: int) -> bytes:
+        return self.chars[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i: int) -> str:
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        return self._bytes(i % len(self)).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[i] for i in range(len(self)))
+
+    def _sorted(self, rank: int) -> int:
+        return rank if self.order is None else int(self.order[rank])
+
+    def find(self, value: str) -> Optional[int]:
+        """Return the position of ``value``, or ``None`` if it is not stored."""
+        target = value.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(self._sorted(mid)) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self):
+            position = self._sorted(lo)
+            if self._bytes(position) == target:
+                return position
+        return None
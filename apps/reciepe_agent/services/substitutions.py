@@ -0,0 +1,200 @@
+"""Prebuilt index for ingredient substitution lookup.
+
+Ingredient names are matched against substitution phrases on whole
+tokens with a trie, and only a phrase that ends the name (its head noun)
+counts: "unsalted butter" and "2 large eggs" resolve, while "buttermilk",
+"milk chocolate" and "egg noodles" do not. Notes after a comma or in
+parentheses ("butter, softened") are ignored. When no phrase matches,
+each token that is neither a phrase token nor a known word is corrected
+to the closest phrase token that shares a character trigram with it and
+lies within a small edit distance ("egs" -> "egg", "suger" -> "sugar"),
+and the match is retried. Both paths cost time proportional to the length
+of the ingredient name, not the size of the table.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Set
+
+from services.search_index import tokenize
+
+
+SUBSTITUTIONS: Dict[str, Dict] = {
+    "eggs": {
+        "substitutes": [
+            "flax eggs (1 tbsp ground flaxseed + 3 tbsp water per egg)",
+            "applesauce (1/4 cup per egg)",
+            "mashed banana (1/4 cup per egg)",
+            "commercial egg replacer"
+        ],
+        "notes": "Best for baking. Flax eggs work well for binding."
+    },
+    "butter": {
+        "substitutes": [
+            "coconut oil (same amount)",
+            "olive oil (3/4 amount)",
+            "vegan butter (same amount)",
+            "applesauce (1/2 amount for baking)"
+        ],
+        "notes": "For baking, applesauce reduces fat content."
+    },
+    "milk": {
+        "substitutes": [
+            "almond milk",
+            "oat milk",
+            "soy milk",
+            "coconut milk",
+            "rice milk"
+        ],
+        "notes": "Use same amount. Coconut milk is richer."
+    },
+    "flour": {
+        "substitutes": [
+            "almond flour (1:1 ratio)",
+            "coconut flour (1/4 amount)",
+            "rice flour (1:1 ratio)",
+            "gluten-free flour blend (1:1 ratio)"
+        ],
+        "notes": "Coconut flour is very absorbent, use less."
+    },
+    "sugar": {
+        "substitutes": [
+            "honey (3/4 amount)",
+            "maple syrup (3/4 amount)",
+            "stevia (much less, to taste)",
+            "coconut sugar (1:1 ratio)"
+        ],
+        "notes": "Liquid sweeteners may affect texture."
+    }
+}
+
+# Phrases that contain a substitutable head noun but name a different
+# ingredient; they resolve to "no substitution" instead of the head noun.
+DISTINCT_PHRASES = (
+    "peanut butter", "almond butter", "cocoa butter", "apple butter",
+    "almond milk", "oat milk", "soy milk", "coconut milk", "rice milk",
+)
+
+# Real words within the fuzzy edit budget of a phrase token; they are never
+# corrected ("bitter" is not a typo of "butter").
+KNOWN_WORDS = (
+    "bitter", "batter", "better", "mile", "mill", "mild", "silk", "floor", "four", "flout",
+)
+
+_NOTES_RE = re.compile(r"\([^)]*\)|,.*$")
+
+# Marks a trie terminal for a phrase that deliberately has no substitutions.
+_NO_MATCH = ""
+
+# Tokens shorter than this are never fuzzily corrected.
+MIN_FUZZY_LENGTH = 3
+
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_edits(token: str) -> int:
+    return 1 if len(token) <= 6 else 2
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, or ``limit + 1`` once it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class SubstitutionIndex:
+    """Token trie over substitution phrases with a trigram fuzzy fallback."""
+
+    def __init__(
+        self,
+        table: Dict[str, Dict],
+        distinct_phrases: Sequence[str] = DISTINCT_PHRASES,
+        known_words: Sequence[str] = KNOWN_WORDS,
+        cache_size: int = 4096,
+    ):
+        self.table = table
+        self._trie: Dict = {}
+        self._vocabulary: Set[str] = set()
+        self._known_words: Set[str] = {token for word in known_words for token in tokenize(word)}
+        self._trigram_postings: Dict[str, Set[str]] = {}
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+        for key in table:
+            self.add_phrase(key, key)
+        for phrase in distinct_phrases:
+            self.add_phrase(phrase, None)
+
+    def add_phrase(self, phrase: str, key: Optional[str]) -> None:
+        """Make ``phrase`` resolve to the table entry ``key`` (``None`` blocks matching)."""
+        tokens = tokenize(phrase)
+        if not tokens:
+            return
+        node = self._trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+            if token not in self._vocabulary:
+                self._vocabulary.add(token)
+                for gram in _trigrams(token):
+                    self._trigram_postings.setdefault(gram, set()).add(token)
+        node[None] = _NO_MATCH if key is None else key
+        self.lookup.cache_clear()
+
+    def _match_phrase(self, tokens: Sequence[str]) -> Optional[str]:
+        """Longest whole-token phrase that ends the name (the head noun is last)."""
+        for start in range(len(tokens)):
+            node = self._trie
+            for token in tokens[start:]:
+                node = node.get(token)
+                if node is None:
+                    break
+            if node is not None and None in node:
+                return node[None]
+        return None
+
+    def _correct(self, token: str) -> str:
+        """Closest vocabulary token within the edit budget, or ``token`` itself."""
+        if token in self._vocabulary or token in self._known_words or len(token) < MIN_FUZZY_LENGTH:
+            return token
+        limit = _max_edits(token)
+        candidates: Set[str] = set()
+        for gram in _trigrams(token):
+            candidates.update(self._trigram_postings.get(gram, ()))
+        best, best_distance = token, limit + 1
+        for candidate in sorted(candidates):
+            distance = _edit_distance(token, candidate, limit)
+            if distance < best_distance:
+                best, best_distance = candidate, distance
+        return best
+
+    def _lookup(self, ingredient: str) -> Optional[str]:
+        tokens = tokenize(_NOTES_RE.sub(" ", ingredient)) or tokenize(ingredient)
+        if not tokens:
+            return None
+        key = self._match_phrase(tokens)
+        if key is None:
+            corrected = [self._correct(token) for token in tokens]
+            if corrected != tokens:
+                key = self._match_phrase(corrected)
+        return key or None
+
+    def lookup_many(self, ingredients: Sequence[str]) -> List[Optional[str]]:
+        """Resolve a whole ingredient list in one call."""
+        return [self.lookup(ingredient) for ingredient in ingredients]
+
+
+substitution_index = SubstitutionIndex(SUBSTITUTIONS)
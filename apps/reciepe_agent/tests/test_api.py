@@ -0,0 +1,79 @@
+"""Tests for the Recipe Agent API routes."""
+
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.routes import router
+
+
+@pytest.fixture
+def client():
+    """Fixture for a test client over the API router."""
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+class TestBatchEndpoints:
+    """Test cases for the NDJSON batch endpoints."""
+    
+    def test_substitute_batch_ingredients(self, client):
+        """Test streaming substitutions for a list of ingredients."""
+        response = client.post("/api/v1/ingredients/substitute/batch", json={"ingredients": ["eggs", "butter"]})
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = _lines(response)
+        assert [line["original_ingredient"] for line in lines] == ["eggs", "butter"]
+        assert all(line["substitutes"] for line in lines)
+    
+    def test_substitute_batch_recipe_ids(self, client):
+        """Test expanding recipe IDs into their ingredients."""
+        response = client.post("/api/v1/ingredients/substitute/batch", json={"recipe_ids": ["1", "nope"]})
+        
+        lines = _lines(response)
+        assert lines[0] == {"recipe_id": "nope", "error": "Recipe not found"}
+        assert {line["recipe_id"] for line in lines[1:]} == {"1"}
+        assert "eggs" in [line["original_ingredient"] for line in lines[1:]]
+    
+    def test_substitute_batch_requires_input(self, client):
+        """Test that an empty request is rejected."""
+        response = client.post("/api/v1/ingredients/substitute/batch", json={})
+        assert response.status_code == 400
+    
+    def test_nutrition_batch(self, client):
+        """Test streaming nutrition info for recipe IDs."""
+        response = client.post("/api/v1/recipes/nutrition/batch", json={"recipe_ids": ["1", "3"]})
+        
+        lines = _lines(response)
+        assert lines[0]["nutrition"]["calories"] == 450
+        assert lines[1] == {"recipe_id": "3", "nutrition": None}
+
+
+class TestQueryEndpoint:
+    """Test cases for agent-backed endpoints."""
+    
+    def test_query_runs_agent_inside_event_loop(self, client):
+        """Test that async routes await the graph instead of nesting event loops."""
+        response = client.post("/api/v1/query", json={"query": "hello there"})
+        
+        assert response.status_code == 200
+        assert response.json()["data"]["intent"] == "general"
+    
+    def test_sync_wrapper_rejects_running_loop(self):
+        """Test that the blocking wrapper refuses to run inside a loop."""
+        import asyncio
+        from agent.graph import run_recipe_agent
+        
+        async def _call():
+            with pytest.raises(RuntimeError):
+                run_recipe_agent("hello")
+        
+        asyncio.run(_call())
@@ -0,0 +1,146 @@
+"""Tests for conversation compaction and the artifact store."""
+
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.graph.message import add_messages
+
+from agent import compaction, nodes
+from agent.compaction import (
+    SUMMARY_MESSAGE_ID,
+    ArtifactStore,
+    artifact_refs,
+    compact_messages,
+    estimate_tokens,
+    externalize,
+    externalize_recipe,
+    is_artifact_ref,
+    resolve,
+    resolve_recipe,
+)
+
+
+def _history(turns, size=200):
+    """Alternating user/assistant messages with ids, as add_messages stores them."""
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"question {i} " + "q" * size, id=f"h{i}"))
+        messages.append(AIMessage(content=f"answer {i} " + "a" * size, id=f"a{i}"))
+    return messages
+
+
+class TestArtifactStore:
+    """Test cases for storing large values by reference."""
+    
+    def test_small_values_stay_inline(self):
+        """Values under the limit are returned unchanged."""
+        store = ArtifactStore()
+        assert externalize("short plan", store=store, limit=100) == "short plan"
+    
+    def test_large_values_round_trip(self):
+        """Large values become references that resolve to the original text."""
+        store = ArtifactStore()
+        text = "step\n" * 100
+        ref = externalize(text, store=store, limit=100)
+        assert is_artifact_ref(ref)
+        assert resolve(ref, store=store) == text
+        assert externalize(ref, store=store, limit=100) == ref
+    
+    def test_identical_content_shares_a_reference(self):
+        """The store is content addressed."""
+        store = ArtifactStore()
+        assert store.put("same") == store.put("same")
+    
+    def test_directory_store(self, tmp_path):
+        """A directory-backed store survives a new store instance."""
+        ref = ArtifactStore(str(tmp_path)).put("recipe text")
+        assert ArtifactStore(str(tmp_path)).get(ref) == "recipe text"
+    
+    def test_missing_artifact_resolves_empty(self):
+        """A reference the store no longer holds resolves to an empty string."""
+        assert resolve("artifact:" + "0" * 64, store=ArtifactStore()) == ""
+    
+    def test_no_store_keeps_values_inline(self, monkeypatch):
+        """Without a configured store nothing is moved out of the state."""
+        monkeypatch.setattr(compaction, "artifact_store", None)
+        text = "step\n" * 1000
+        assert externalize(text) == text
+        assert resolve(text) == text
+    
+    def test_sweep_keeps_referenced_and_recent_artifacts(self, tmp_path):
+        """Only unreferenced artifacts past the grace period are deleted."""
+        store = ArtifactStore(str(tmp_path))
+        kept, orphan = store.put("plan"), store.put("old plan")
+        assert store.sweep(artifact_refs({"plan_extract": kept}), min_age_seconds=3600) == 0
+        assert store.sweep(artifact_refs({"plan_extract": kept}), min_age_seconds=0) == 1
+        assert store.get(kept) == "plan"
+        assert store.get(orphan) is None
+    
+    def test_recipe_round_trip(self, monkeypatch):
+        """Only recipe_msg is externalized; other fields are untouched."""
+        monkeypatch.setattr(compaction, "artifact_store", ArtifactStore())
+        recipe = {"title": "Carbonara", "recipe_msg": "x" * 5000}
+        stored = externalize_recipe(recipe)
+        assert stored["title"] == "Carbonara"
+        assert is_artifact_ref(stored["recipe_msg"])
+        assert resolve_recipe(stored) == recipe
+
+
+class TestCompactMessages:
+    """Test cases for the token-bounded message window."""
+    
+    def test_under_budget_appends_only_new_messages(self):
+        """While the window fits, the update is just the new messages."""
+        new = [AIMessage(content="hi")]
+        assert compact_messages(_history(2), new, max_tokens=10_000) == new
+    
+    def test_over_budget_evicts_and_summarizes(self):
+        """Old turns are folded into one summary at the head of the window."""
+        history = _history(10)
+        new = [AIMessage(content="latest", id="new")]
+        merged = add_messages(history, compact_messages(history, new, max_tokens=1000, keep_last=2))
+        assert merged[0].id == SUMMARY_MESSAGE_ID
+        assert "question 0" in merged[0].content
+        assert merged[-1].id == "new"
+        assert sum(estimate_tokens(m) for m in merged) <= 1000
+        assert len(merged) < len(history)
+    
+    def test_summary_is_merged_on_later_compactions(self):
+        """A second compaction keeps a single summary with earlier lines."""
+        history = _history(10)
+        merged = add_messages(history, compact_messages(history, [], max_tokens=1000, keep_last=2))
+        merged = add_messages(merged, _history(6))
+        merged = add_messages(merged, compact_messages(merged, [], max_tokens=1000, keep_last=2))
+        summaries = [m for m in merged if m.id == SUMMARY_MESSAGE_ID]
+        assert len(summaries) == 1
+        assert "question 0" in summaries[0].content
+    
+    def test_keeps_recent_messages_even_over_budget(self):
+        """The last ``keep_last`` messages are never evicted."""
+        history = _history(3, size=4000)
+        merged = add_messages(history, compact_messages(history, [], max_tokens=100, keep_last=2))
+        assert [m.id for m in merged[1:]] == ["h2", "a2"]
+    
+    def test_tool_results_stay_with_their_call(self):
+        """Eviction never leaves a tool result without the call that produced it."""
+        call = AIMessage(content="", id="call", tool_calls=[{"name": "search", "args": {"q": "eggs"}, "id": "t1"}])
+        result = ToolMessage(content="r" * 400, tool_call_id="t1", id="result")
+        history = _history(5) + [call, result]
+        merged = add_messages(history, compact_messages(history, [], max_tokens=300, keep_last=1))
+        assert [m.id for m in merged[1:]] == ["call", "result"]
+    
+    def test_llm_node_returns_only_new_messages(self, monkeypatch):
+        """llm_node leaves the state's history alone and stores the plan by reference."""
+        async def fake_invoke(rendered_prompt, tools=None, config=None):
+            return AIMessage(content="1. Search eggs\n" * 200)
+        
+        monkeypatch.setattr(nodes, "_invoke_llm_with_tools", fake_invoke)
+        monkeypatch.setattr(compaction, "artifact_store", ArtifactStore())
+        history = _history(1)
+        state = {"messages": history, "workflow_stage": "recipe_planning",
+                 "selected_recipe": {"title": "Carbonara", "recipe_msg": "Eggs"}}
+        result = asyncio.run(nodes.llm_node(state))
+        assert len(history) == 2
+        assert [m.content for m in result["messages"]] == ["1. Search eggs\n" * 200]
+        assert is_artifact_ref(result["plan_extract"])
+        assert resolve(result["plan_extract"]) == "1. Search eggs\n" * 200
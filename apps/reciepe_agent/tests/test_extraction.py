@@ -0,0 +1,156 @@
+"""Tests for structured recipe extraction."""
+
+import asyncio
+import json
+
+from langchain_core.messages import AIMessage
+
+from agent import nodes
+from agent.extraction import (
+    IncrementalRecipeParser,
+    extract_recipes,
+    parse_ingredient_line,
+    parse_markdown_recipe,
+    plan_from_recipe,
+    render_recipe_markdown,
+)
+from agent.response_cache import ResponseCache
+
+
+RECIPES_JSON = json.dumps({"recipes": [
+    {
+        "title": "Spaghetti Carbonara",
+        "servings": 4,
+        "ingredients": [
+            {"name": "spaghetti", "amount": "400", "unit": "g"},
+            {"name": "eggs", "amount": "3", "notes": "room temperature, \"large\""},
+        ],
+        "instructions": ["Boil the pasta.", "Whisk eggs {and} cheese."],
+    },
+    {"title": "Cacio e Pepe", "ingredients": ["200 g pecorino, grated"]},
+]})
+
+MARKDOWN = """**Classic Carbonara Recipe**
+
+A Roman favourite.
+
+**Ingredients:**
+* 400 g spaghetti
+* 2 cloves garlic, crushed
+* **For the sauce:**
+* 3 eggs
+* pinch of salt
+
+**Instructions:**
+1. Boil the pasta.
+2. Mix with the eggs.
+
+**Tips:**
+* Serve hot.
+"""
+
+
+class TestIncrementalRecipeParser:
+    """Test cases for streaming JSON recipe parsing."""
+    
+    def test_recipes_complete_as_chunks_arrive(self):
+        """Each recipe is returned by the chunk that closes it."""
+        parser = IncrementalRecipeParser()
+        split = RECIPES_JSON.index('{"title": "Cacio')
+        first = parser.feed(RECIPES_JSON[:split])
+        assert [r.title for r in first] == ["Spaghetti Carbonara"]
+        assert [r.title for r in parser.feed(RECIPES_JSON[split:])] == ["Cacio e Pepe"]
+    
+    def test_character_by_character(self):
+        """Braces, quotes and escapes inside strings do not confuse the scanner."""
+        parser = IncrementalRecipeParser()
+        found = [r for ch in RECIPES_JSON for r in parser.feed(ch)]
+        assert [r.title for r in found] == ["Spaghetti Carbonara", "Cacio e Pepe"]
+        assert found[0].ingredients[1].notes == 'room temperature, "large"'
+        assert found[0].instructions[1] == "Whisk eggs {and} cheese."
+    
+    def test_string_ingredients_are_parsed(self):
+        """Ingredient strings are split into amount, unit, name and notes."""
+        recipe = IncrementalRecipeParser().feed(RECIPES_JSON)[1]
+        ingredient = recipe.ingredients[0]
+        assert (ingredient.amount, ingredient.unit, ingredient.name, ingredient.notes) == ("200", "g", "pecorino", "grated")
+    
+    def test_single_recipe_object(self):
+        """A lone fenced recipe object is found when the stream closes."""
+        parser = IncrementalRecipeParser()
+        parser.feed('```json\n{"title": "Pesto", "ingredients": [{"name": "basil"}]}\n```')
+        assert [r.title for r in parser.close()] == ["Pesto"]
+    
+    def test_invalid_recipes_are_skipped(self):
+        """Objects that fail validation are dropped."""
+        parser = IncrementalRecipeParser()
+        parser.feed('{"recipes": [{"name": "no title"}, {"title": "Ok", "servings": "many"}, {"title": "Fine"}]}')
+        assert [r.title for r in parser.close()] == ["Fine"]
+
+
+class TestMarkdownFallback:
+    """Test cases for the regex markdown parser."""
+    
+    def test_sections_and_title(self):
+        """Title, ingredients and instructions are read from markdown."""
+        recipe = parse_markdown_recipe(MARKDOWN)
+        assert recipe.title == "Classic Carbonara Recipe"
+        assert [i.name for i in recipe.ingredients] == ["spaghetti", "garlic", "eggs", "salt"]
+        assert recipe.ingredients[1].notes == "crushed"
+        assert recipe.instructions == ["Boil the pasta.", "Mix with the eggs."]
+    
+    def test_ingredient_line(self):
+        """Amounts, fractions and units are recognised."""
+        ingredient = parse_ingredient_line("1 1/2 cups flour (sifted)")
+        assert (ingredient.amount, ingredient.unit, ingredient.name, ingredient.notes) == ("1 1/2", "cups", "flour", "sifted")
+        assert parse_ingredient_line("salt to taste").name == "salt to taste"
+    
+    def test_extract_falls_back_to_markdown(self):
+        """Prose responses go through the markdown parser."""
+        recipes, from_json = extract_recipes(MARKDOWN)
+        assert not from_json
+        assert recipes[0].title == "Classic Carbonara Recipe"
+
+
+class TestStructuredNodes:
+    """Test cases for structured recipes in the graph nodes."""
+    
+    def test_json_response_renders_for_display(self, monkeypatch):
+        """JSON answers are stored structured and shown as markdown."""
+        async def fake_invoke(rendered_prompt, tools=None, config=None):
+            return AIMessage(content=RECIPES_JSON)
+        
+        monkeypatch.setattr(nodes, "_invoke_llm_with_tools", fake_invoke)
+        monkeypatch.setattr(nodes, "response_cache", ResponseCache())
+        result = asyncio.run(nodes.llm_node({"user_query": "carbonara", "workflow_stage": "recipe_llm", "messages": []}))
+        recipe = result["recipes"][0]
+        assert recipe["title"] == "Spaghetti Carbonara"
+        assert recipe["ingredients"][0] == {"name": "spaghetti", "amount": "400", "unit": "g"}
+        assert result["messages"][-1].content.startswith("## Spaghetti Carbonara")
+        assert "**Ingredients:**\n* 400 g spaghetti" in render_recipe_markdown(IncrementalRecipeParser().feed(RECIPES_JSON)[0])
+    
+    def test_content_block_list_is_read_as_text(self, monkeypatch):
+        """List content (e.g. Gemini content blocks) is joined before extraction."""
+        half = len(RECIPES_JSON) // 2
+        blocks = [{"type": "text", "text": RECIPES_JSON[:half]}, {"type": "thinking", "thinking": "..."}, RECIPES_JSON[half:]]
+        
+        async def fake_invoke(rendered_prompt, tools=None, config=None):
+            return AIMessage(content=blocks)
+        
+        monkeypatch.setattr(nodes, "_invoke_llm_with_tools", fake_invoke)
+        monkeypatch.setattr(nodes, "response_cache", ResponseCache())
+        result = asyncio.run(nodes.llm_node({"user_query": "carbonara", "workflow_stage": "recipe_llm", "messages": []}))
+        assert result["recipes"][0]["title"] == "Spaghetti Carbonara"
+        assert result["messages"][-1].content.startswith("## Spaghetti Carbonara")
+    
+    def test_plan_stage_skips_llm_with_structured_ingredients(self, monkeypatch):
+        """The plan is built from structured ingredients without an LLM call."""
+        async def fail_invoke(rendered_prompt, tools=None, config=None):
+            raise AssertionError("LLM should not be called")
+        
+        monkeypatch.setattr(nodes, "_invoke_llm_with_tools", fail_invoke)
+        recipe = {"title": "Carbonara", "recipe_msg": "...", "ingredients": [{"name": "eggs", "amount": "3"}]}
+        result = asyncio.run(nodes.llm_node({"workflow_stage": "recipe_planning", "selected_recipe": recipe, "messages": []}))
+        assert result["workflow_stage"] == "recipe_plan_display"
+        assert "Search the grocery store for 3 eggs" in result["plan_extract"]
+        assert plan_from_recipe({"title": "Soup"}) is None
@@ -0,0 +1,199 @@
+"""Tests for the Recipe Agent LLM client layer."""
+
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+from langchain_core.tools import tool
+
+from agent.llm import LLMConfig, LLMRegistry, ainvoke_with_retry, create_llm_client, tool_fingerprint
+from agent.response_cache import ResponseCache
+
+
+@tool
+def lookup_price(item: str) -> str:
+    """Look up the price of a grocery item."""
+    return "$1.00"
+
+
+@tool
+def add_to_cart(item: str, quantity: int = 1) -> str:
+    """Add a grocery item to the cart."""
+    return "ok"
+
+
+@pytest.fixture
+def registry():
+    """Fixture for a registry whose factory returns mock clients."""
+    return LLMRegistry(factory=lambda config: Mock(name=config.model))
+
+
+class TestLLMRegistry:
+    """Test cases for the shared LLM client registry."""
+    
+    def test_one_client_per_config(self, registry):
+        """Test that equal configs share a client."""
+        assert registry.get(LLMConfig("m", 0.1)) is registry.get(LLMConfig("m", 0.1))
+        assert registry.get(LLMConfig("m", 0.1)) is not registry.get(LLMConfig("m", 0.7))
+    
+    def test_tool_bindings_cached_per_fingerprint(self, registry):
+        """Test that bind_tools runs once per tool set."""
+        config = LLMConfig("m", 0.1)
+        first = registry.with_tools([lookup_price, add_to_cart], config)
+        second = registry.with_tools([add_to_cart, lookup_price], config)
+        
+        assert first is second
+        assert registry.get(config).bind_tools.call_count == 1
+        assert registry.with_tools([], config) is registry.get(config)
+    
+    def test_schemas_are_not_rebuilt_per_call(self, registry, monkeypatch):
+        """Test that a known tool set is looked up without converting its schemas again."""
+        config = LLMConfig("m", 0.1)
+        first = registry.with_tools([lookup_price, add_to_cart], config)
+        
+        def fail(tools):
+            raise AssertionError("tool schemas converted again")
+        
+        monkeypatch.setattr("agent.llm.tool_fingerprint", fail)
+        assert registry.with_tools([add_to_cart, lookup_price], config) is first
+    
+    def test_fingerprint_changes_with_tool_set(self):
+        """Test that different tool sets get different fingerprints."""
+        assert tool_fingerprint([lookup_price]) != tool_fingerprint([lookup_price, add_to_cart])
+
+
+class TestCreateLLMClient:
+    """Test cases for provider-specific client creation."""
+    
+    def test_openai_provider_targets_compatible_endpoint(self, monkeypatch):
+        """Test that provider="openai" builds a ChatOpenAI client for the configured base URL."""
+        from langchain_openai import ChatOpenAI
+        
+        monkeypatch.setattr("agent.llm.OPENAI_BASE_URL", "http://localhost:8000/v1")
+        client = create_llm_client(LLMConfig("llama", 0.2, "application/json", provider="openai"))
+        
+        assert isinstance(client, ChatOpenAI)
+        assert client.model_name == "llama"
+        assert client.openai_api_base == "http://localhost:8000/v1"
+        assert client.model_kwargs["response_format"] == {"type": "json_object"}
+        # ainvoke_with_retry owns the retry policy
+        assert client.max_retries == 0
+    
+    def test_unknown_provider(self):
+        """Test that an unknown provider is rejected."""
+        with pytest.raises(ValueError):
+            create_llm_client(LLMConfig("m", provider="nope"))
+
+
+class _FlakyLLM:
+    """Fake chat model that fails a number of times before answering."""
+    
+    def __init__(self, failures, delay=0.0):
+        self.failures = list(failures)
+        self.delay = delay
+        self.calls = 0
+    
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            raise self.failures.pop(0)
+        return "answer"
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class TestAinvokeWithRetry:
+    """Test cases for async LLM invocation with retries."""
+    
+    @pytest.fixture(autouse=True)
+    def no_backoff(self, monkeypatch):
+        """Skip backoff sleeps."""
+        monkeypatch.setattr("agent.llm.backoff_delay", lambda attempt: 0)
+    
+    def test_retries_transient_errors(self):
+        """Test that 429/5xx and timeouts are retried."""
+        llm = _FlakyLLM([_StatusError(429), ConnectionError("reset")])
+        assert asyncio.run(ainvoke_with_retry(llm, [], max_retries=2)) == "answer"
+        assert llm.calls == 3
+    
+    def test_does_not_retry_client_errors(self):
+        """Test that non-transient errors are raised immediately."""
+        llm = _FlakyLLM([_StatusError(400)])
+        with pytest.raises(_StatusError):
+            asyncio.run(ainvoke_with_retry(llm, [], max_retries=2))
+        assert llm.calls == 1
+    
+    def test_timeout_per_attempt(self):
+        """Test that a slow attempt times out and is retried up to the limit."""
+        llm = _FlakyLLM([], delay=0.2)
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(ainvoke_with_retry(llm, [], timeout=0.01, max_retries=1))
+        assert llm.calls == 2
+
+
+def _recipe_prompt(query):
+    return ["You are a recipe assistant.", f"User query: {query}\nContext: No specific context"]
+
+
+class TestResponseCache:
+    """Test cases for the recipe response cache."""
+    
+    def test_exact_hit_ignores_case_and_whitespace(self):
+        """Test that normalized identical prompts share an entry."""
+        cache = ResponseCache()
+        config = LLMConfig(model="m")
+        cache.put(_recipe_prompt("how to make carbonara"), config, "Carbonara recipe", [{"title": "Carbonara"}])
+        hit = cache.get(_recipe_prompt("How to make   Carbonara "), config)
+        assert hit.content == "Carbonara recipe"
+        assert hit.recipes == [{"title": "Carbonara"}]
+        assert cache.get(_recipe_prompt("how to make carbonara"), LLMConfig(model="m", temperature=0.7)) is None
+        assert cache.get(_recipe_prompt("how to make carbonara"), LLMConfig(model="m", provider="openai")) is None
+    
+    def test_ttl_and_lru_eviction(self):
+        """Test that entries expire and the least recently used entry is evicted."""
+        now = [0.0]
+        cache = ResponseCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+        config = LLMConfig(model="m")
+        for query in ("a1", "b1"):
+            cache.put(_recipe_prompt(query), config, query, [])
+        cache.get(_recipe_prompt("a1"), config)
+        cache.put(_recipe_prompt("c1"), config, "c1", [])
+        assert cache.get(_recipe_prompt("b1"), config) is None
+        assert cache.get(_recipe_prompt("a1"), config) is not None
+        now[0] = 11.0
+        assert cache.get(_recipe_prompt("a1"), config) is None
+    
+    def test_semantic_tier_serves_near_duplicates(self):
+        """Test that similar queries hit while different dishes miss."""
+        cache = ResponseCache(semantic_threshold=0.9)
+        config = LLMConfig(model="m")
+        cache.put(_recipe_prompt("how to make carbonara"), config, "Carbonara", [], query="how to make carbonara")
+        hit = cache.get(_recipe_prompt("carbonara recipe"), config, query="carbonara recipe")
+        assert hit is not None and hit.content == "Carbonara"
+        assert cache.get(_recipe_prompt("vegan lasagna"), config, query="vegan lasagna") is None
+        assert cache.semantic_hits == 1
+    
+    def test_llm_node_skips_llm_and_extraction_on_hit(self, monkeypatch):
+        """Test that a repeated recipe query is answered from the cache."""
+        from langchain_core.messages import AIMessage
+        from agent import nodes
+        
+        calls = []
+        
+        async def fake_invoke(rendered_prompt, tools=None, config=None):
+            calls.append(rendered_prompt)
+            return AIMessage(content="Carbonara recipe\nEggs, pecorino, guanciale")
+        
+        monkeypatch.setattr(nodes, "response_cache", ResponseCache())
+        monkeypatch.setattr(nodes, "_invoke_llm_with_tools", fake_invoke)
+        state = {"user_query": "how to make carbonara", "workflow_stage": "recipe_llm", "messages": []}
+        first = asyncio.run(nodes.llm_node(dict(state, messages=[])))
+        second = asyncio.run(nodes.llm_node(dict(state, messages=[])))
+        assert len(calls) == 1
+        assert second["recipes"] == first["recipes"]
+        assert second["messages"][-1].content == first["messages"][-1].content
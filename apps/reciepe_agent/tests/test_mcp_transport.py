@@ -0,0 +1,112 @@
+"""Tests for MCP configuration, pooled transport and call coalescing."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from langchain_core.tools import StructuredTool
+
+from agent.mcp_config import MCPConfig, MCPServerConfig, load_mcp_config
+from agent.mcp_transport import MCPTransportPool, SingleFlight, coalesce_tools
+
+
+class TestMCPConfig:
+    """Test cases for MCP configuration loading."""
+    
+    def test_load_from_file(self, tmp_path):
+        """Test that servers and pool sizes are read from a config file."""
+        path = tmp_path / "mcp.json"
+        path.write_text(json.dumps({
+            "servers": {"grocery": {"url": "http://grocery:9000/mcp/", "max_connections": 4}},
+            "coalesce_calls": False,
+        }))
+        config = load_mcp_config(str(path))
+        
+        assert config.servers["grocery"].url == "http://grocery:9000/mcp/"
+        assert config.servers["grocery"].max_connections == 4
+        assert config.coalesce_calls is False
+    
+    def test_pooled_clients_share_transport(self):
+        """Test that closing a per-call client leaves the shared pool open."""
+        server = MCPServerConfig(name="grocery", url="http://grocery/mcp/")
+        pool = MCPTransportPool(MCPConfig(servers={"grocery": server}))
+        connection = pool.connections()["grocery"]
+        
+        async def run():
+            for _ in range(2):
+                async with connection["httpx_client_factory"]() as client:
+                    assert client._transport._pool is pool._pool(server)
+            assert len(pool._pools) == 1
+            await pool.aclose()
+        
+        assert connection["url"] == "http://grocery/mcp/"
+        asyncio.run(run())
+
+
+class TestCallCoalescing:
+    """Test cases for SingleFlight and coalesced tools."""
+    
+    def test_identical_calls_share_one_request(self):
+        """Test that concurrent identical searches hit the server once."""
+        calls = []
+        
+        async def search_products(term: str, location_id: str) -> str:
+            calls.append((term, location_id))
+            await asyncio.sleep(0.05)
+            return f"{term}@{location_id}"
+        
+        tool = StructuredTool.from_function(coroutine=search_products, name="search_products", description="Search.")
+        single_flight = SingleFlight()
+        (coalesced,) = coalesce_tools([tool], single_flight)
+        
+        async def run():
+            return await asyncio.gather(
+                coalesced.ainvoke({"term": "eggs", "location_id": "70300720"}),
+                coalesced.ainvoke({"location_id": "70300720", "term": "eggs"}),
+                coalesced.ainvoke({"term": "milk", "location_id": "70300720"}),
+            )
+        
+        results = asyncio.run(run())
+        assert results == ["eggs@70300720", "eggs@70300720", "milk@70300720"]
+        assert len(calls) == 2
+        assert single_flight.coalesced == 1
+    
+    def test_errors_propagate_to_all_waiters(self):
+        """Test that a failed shared call fails every waiter and is not cached."""
+        single_flight = SingleFlight()
+        attempts = []
+        
+        async def failing():
+            attempts.append(1)
+            await asyncio.sleep(0.01)
+            raise httpx.ConnectError("down")
+        
+        async def run():
+            results = await asyncio.gather(*(single_flight.do("k", failing) for _ in range(3)), return_exceptions=True)
+            assert all(isinstance(r, httpx.ConnectError) for r in results)
+            with pytest.raises(httpx.ConnectError):
+                await single_flight.do("k", failing)
+        
+        asyncio.run(run())
+        assert len(attempts) == 2
+
+
+class TestInitializeMCPClient:
+    """Test cases for loading MCP tools."""
+    
+    def test_failed_refresh_keeps_last_tools(self, monkeypatch):
+        """Test that a transient failure returns the last loaded tools."""
+        from agent import graph
+        
+        class _DownClient:
+            async def get_tools(self):
+                raise httpx.ConnectError("down")
+        
+        tool = StructuredTool.from_function(func=lambda term: term, name="search_products", description="Search.")
+        monkeypatch.setattr(graph, "MCP_AVAILABLE", True)
+        monkeypatch.setattr(graph, "_mcp_client", _DownClient())
+        monkeypatch.setattr(graph, "_mcp_tools", [tool])
+        
+        assert asyncio.run(graph.initialize_mcp_client()) == [tool]
+        assert graph.get_mcp_tools() == [tool]
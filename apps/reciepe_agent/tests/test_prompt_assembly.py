@@ -0,0 +1,97 @@
+"""Tests for prompt assembly, prefix caching and article budgets."""
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from prompts.assembly import (
+    TRUNCATION_MARKER,
+    PromptAssembler,
+    condense_article,
+    count_tokens,
+    format_recipe,
+)
+from prompts.system_prompts import GROCERY_EXEC_SYSTEM_PROMPT, RECIPE_SYSTEM_PROMPT
+
+
+@tool
+def search_products(term: str) -> str:
+    """Search grocery products."""
+    return term
+
+
+@tool
+def add_to_cart(product_id: str) -> str:
+    """Add a product to the cart."""
+    return product_id
+
+
+ARTICLE = "\n".join(
+    ["Classic Carbonara Recipe", "A Roman pasta dish. " * 20, "",
+     "## Ingredients"] + [f"- ingredient {i}" for i in range(10)] +
+    ["", "## Instructions"] + [f"{i}. Do step {i} carefully. " * 5 for i in range(20)] +
+    ["", "## Tips", "Serve immediately. " * 40]
+)
+
+
+class TestPromptAssembler:
+    """Test cases for PromptAssembler."""
+    
+    def test_prefix_rendered_once_per_tool_set(self):
+        """The same tool set reuses the rendered system message."""
+        assembler = PromptAssembler()
+        first = assembler.system(GROCERY_EXEC_SYSTEM_PROMPT, [search_products, add_to_cart])
+        second = assembler.system(GROCERY_EXEC_SYSTEM_PROMPT, [search_products, add_to_cart])
+        assert first is second
+        assert "search_products, add_to_cart" in first.content
+        assert "2 tools" in first.content
+        assert (assembler.renders, assembler.hits) == (1, 1)
+    
+    def test_new_tool_set_renders_new_prefix(self):
+        """A changed tool set renders a new system message."""
+        assembler = PromptAssembler()
+        first = assembler.system(GROCERY_EXEC_SYSTEM_PROMPT, [search_products])
+        second = assembler.system(GROCERY_EXEC_SYSTEM_PROMPT, [search_products, add_to_cart])
+        assert first.content != second.content
+        assert assembler.renders == 2
+    
+    def test_template_without_variables(self):
+        """Templates without tool variables render as-is."""
+        assert PromptAssembler().system(RECIPE_SYSTEM_PROMPT).content == RECIPE_SYSTEM_PROMPT.format().content
+    
+    def test_record_usage_counts_cache_reads(self):
+        """Input tokens and provider cache hits are accumulated."""
+        assembler = PromptAssembler()
+        response = AIMessage(content="ok", usage_metadata={
+            "input_tokens": 100, "output_tokens": 5, "total_tokens": 105,
+            "input_token_details": {"cache_read": 60},
+        })
+        assembler.record_usage(response)
+        assembler.record_usage(AIMessage(content="no usage"))
+        assert (assembler.input_tokens, assembler.cached_input_tokens) == (100, 60)
+
+
+class TestCondenseArticle:
+    """Test cases for budgeted recipe articles."""
+    
+    def test_short_article_unchanged(self):
+        """Articles within budget are only whitespace-normalized."""
+        assert condense_article("Title\n\n\n\nBody  \n", 100) == "Title\n\nBody"
+    
+    def test_condensed_to_budget(self):
+        """Long articles are cut to roughly the token budget."""
+        condensed = condense_article(ARTICLE, 300)
+        assert count_tokens(condensed) <= 310
+        assert TRUNCATION_MARKER in condensed
+    
+    def test_ingredients_kept_before_tips(self):
+        """Ingredients survive condensing; low-priority sections go first."""
+        condensed = condense_article(ARTICLE, 300)
+        assert "ingredient 9" in condensed
+        assert "Classic Carbonara Recipe" in condensed
+        assert "Serve immediately" not in condensed
+        assert condensed.index("## Ingredients") < condensed.index("## Instructions")
+    
+    def test_format_recipe_is_readable(self):
+        """Recipes are sent as title plus article, not as a dict repr."""
+        text = format_recipe({"title": "Carbonara", "recipe_msg": "Eggs and pecorino"})
+        assert text == "Title: Carbonara\n\nEggs and pecorino"
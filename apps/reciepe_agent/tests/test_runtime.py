@@ -0,0 +1,141 @@
+"""Tests for the long-lived agent runtime."""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent import runtime as runtime_module
+from agent.runtime import AgentRuntime
+
+
+@tool
+def find_product(query: str) -> str:
+    """Search the grocery catalog."""
+    return query
+
+
+@tool
+def add_to_cart(product_id: str) -> str:
+    """Add a product to the cart."""
+    return product_id
+
+
+class _FakeAgent:
+    def __init__(self, include_mcp_tools):
+        self.include_mcp_tools = include_mcp_tools
+
+    async def ainvoke(self, state, config=None):
+        return {"agent": self, **state}
+
+
+class _FakeMCP:
+    """Tool loader and graph builder that count their calls."""
+
+    def __init__(self, tools):
+        self.tools = tools
+        self.loads = 0
+        self.builds = 0
+
+    async def load(self):
+        self.loads += 1
+        if isinstance(self.tools, Exception):
+            raise self.tools
+        return list(self.tools)
+
+    def build(self, include_mcp_tools):
+        self.builds += 1
+        return _FakeAgent(include_mcp_tools)
+
+
+class TestAgentRuntime:
+    """Test cases for AgentRuntime."""
+    
+    def test_builds_once_across_queries(self):
+        """Test that repeated queries share one tool load and one compiled graph."""
+        mcp = _FakeMCP([find_product])
+        runtime = AgentRuntime(refresh_seconds=0, load_tools=mcp.load, build_agent=mcp.build)
+    
+        async def run():
+            results = await asyncio.gather(*(runtime.invoke({"user_query": str(i)}) for i in range(5)))
+            return {id(r["agent"]) for r in results}
+    
+        assert len(asyncio.run(run())) == 1
+        assert (mcp.loads, mcp.builds) == (1, 1)
+    
+    def test_refresh_recompiles_only_on_change(self):
+        """Test that refresh keeps the graph until the tool set changes."""
+        mcp = _FakeMCP([find_product])
+        runtime = AgentRuntime(refresh_seconds=0, load_tools=mcp.load, build_agent=mcp.build)
+    
+        async def run():
+            first = await runtime.get_agent()
+            assert await runtime.refresh() is False
+            mcp.tools = [find_product, add_to_cart]
+            assert await runtime.refresh() is True
+            second = await runtime.get_agent()
+            mcp.tools = RuntimeError("server down")
+            assert await runtime.refresh() is False
+            return first, second, await runtime.get_agent()
+    
+        first, second, third = asyncio.run(run())
+        assert first is not second
+        assert third is second
+        assert mcp.builds == 2
+    
+    def test_refresh_before_start(self):
+        """Test that refresh can be called before the runtime is started."""
+        mcp = _FakeMCP([find_product])
+        runtime = AgentRuntime(refresh_seconds=0, load_tools=mcp.load, build_agent=mcp.build)
+        runtime.notify_tools_changed()
+        assert asyncio.run(runtime.refresh()) is True
+        assert runtime.started
+    
+    def test_change_notification_triggers_background_refresh(self):
+        """Test that notify_tools_changed reloads tools without waiting for the TTL."""
+        mcp = _FakeMCP([find_product])
+        runtime = AgentRuntime(refresh_seconds=3600, load_tools=mcp.load, build_agent=mcp.build)
+    
+        async def run():
+            await runtime.start()
+            mcp.tools = [find_product, add_to_cart]
+            runtime.notify_tools_changed()
+            for _ in range(50):
+                await asyncio.sleep(0.01)
+                if mcp.builds == 2:
+                    break
+            await runtime.stop()
+    
+        asyncio.run(run())
+        assert mcp.loads == 2
+        assert mcp.builds == 2
+    
+    def test_opens_the_configured_checkpointer(self, monkeypatch):
+        """Test that the default runtime opens the session checkpointer and closes it on stop."""
+        mcp = _FakeMCP([find_product])
+        saver = InMemorySaver()
+        events = []
+        
+        @asynccontextmanager
+        async def fake_open_checkpointer():
+            events.append("open")
+            yield saver
+            events.append("close")
+        
+        def build(include_mcp_tools, checkpointer=None):
+            events.append(checkpointer)
+            return _FakeAgent(include_mcp_tools)
+        
+        monkeypatch.setattr(runtime_module, "open_checkpointer", fake_open_checkpointer)
+        monkeypatch.setattr(runtime_module, "_build_agent", build)
+        runtime = AgentRuntime(refresh_seconds=0, load_tools=mcp.load)
+        
+        async def run():
+            await runtime.start()
+            assert runtime.checkpointer is saver
+            await runtime.stop()
+        
+        asyncio.run(run())
+        assert events == ["open", saver, "close"]
+        assert runtime.checkpointer is None
@@ -0,0 +1,252 @@
+"""Tests for the Recipe Agent service layer."""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from models.recipe import RecipeQuery
+from services.catalog import RecipeCatalog, load_catalog
+from services.filters import DIETARY_BITS, RecipeFilterEngine, encode_dietary_tags
+from services.recipe_service import RecipeService, SAMPLE_RECIPES
+from services.search_index import RecipeSearchIndex, tokenize
+from services.substitutions import SubstitutionIndex, SUBSTITUTIONS
+
+
+@pytest.fixture
+def service():
+    """Fixture for a recipe service over the sample catalog."""
+    return RecipeService()
+
+
+class TestRecipeSearchIndex:
+    """Test cases for the inverted index."""
+    
+    def test_tokenize_folds_plurals_and_stopwords(self):
+        """Test that tokenization normalizes terms."""
+        assert tokenize("How to make Eggs with Cheese") == ["egg", "cheese"]
+    
+    def test_bm25_prefers_title_matches(self):
+        """Test that a title match outranks a description-only match."""
+        index = RecipeSearchIndex.build([
+            {"id": "a", "title": "Tomato Soup", "description": "with basil"},
+            {"id": "b", "title": "Basil Pesto", "description": "no tomato here"},
+        ])
+        hits = index.search("basil", k=2)
+        assert [doc for doc, _ in hits] == [1, 0]
+    
+    def test_top_k_matches_exhaustive_ranking(self):
+        """Test that early termination returns the exact top-k."""
+        recipes = [
+            {"id": str(i), "title": f"dish {i}", "description": "pasta " * (i % 5 + 1) + "sauce" * (i % 3)}
+            for i in range(200)
+        ]
+        index = RecipeSearchIndex.build(recipes)
+        exhaustive = index.search("pasta sauce", k=len(recipes))
+        top = index.search("pasta sauce", k=5)
+        assert [s for _, s in top] == pytest.approx([s for _, s in exhaustive[:5]])
+    
+
+
+class TestRecipeCatalog:
+    """Test cases for the columnar recipe catalog."""
+    
+    def test_round_trip_through_memory_mapped_file(self, tmp_path):
+        """Test that a saved catalog reopens with identical data."""
+        path = str(tmp_path / "recipes.qmcat")
+        RecipeCatalog.from_records(SAMPLE_RECIPES).save(path)
+        catalog = RecipeCatalog.open(path)
+        
+        assert len(catalog) == len(SAMPLE_RECIPES)
+        assert catalog["prep_time"].tolist() == [15, 20, 30]
+        assert catalog.record(catalog.position("3")) == SAMPLE_RECIPES[2]
+        assert catalog.recipe_tags(1) == ["vegetarian", "vegan", "gluten-free"]
+        assert catalog.search_index.search("quinoa", k=1)[0][0] == 1
+    
+    def test_load_catalog_ingests_csv(self, tmp_path):
+        """Test building a catalog from a CSV source."""
+        source = tmp_path / "recipes.csv"
+        source.write_text(
+            "id,title,cuisine,prep_time,ingredients,dietary_tags\n"
+            "x1,Miso Soup,Japanese,10,miso;tofu;scallions,vegan\n"
+        )
+        catalog = load_catalog(str(source))
+        
+        assert catalog.path.endswith(".qmcat")
+        assert catalog.record(0)["ingredients"] == [{"name": "miso"}, {"name": "tofu"}, {"name": "scallions"}]
+        assert catalog.cuisine_code("Japanese") == catalog["cuisine"][0]
+        assert catalog.tag_code("vegan") == 0
+    
+    def test_code_columns_widen_with_vocabulary(self, tmp_path):
+        """Test that interned codes do not wrap when there are many distinct values."""
+        records = [
+            {"id": str(i), "title": f"Dish {i}", "cuisine": f"c{i}", "difficulty": f"d{i}", "dietary_tags": [f"t{i}"]}
+            for i in range(300)
+        ]
+        path = str(tmp_path / "wide.qmcat")
+        RecipeCatalog.from_records(records).save(path)
+        catalog = RecipeCatalog.open(path)
+        
+        assert catalog["difficulty"][299] == catalog.difficulty_code("d299") == 300
+        assert catalog["cuisine"][299] == catalog.cuisine_code("c299")
+        assert catalog.recipe_tags(299) == ["t299"]
+
+    def test_concurrent_saves_use_separate_temp_files(self, tmp_path):
+        """Test that workers building the same catalog at once do not clobber each other's temp file."""
+        path = str(tmp_path / "recipes.qmcat")
+        catalog = RecipeCatalog.from_records(SAMPLE_RECIPES)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda _: catalog.save(path), range(8)))
+        
+        assert os.listdir(tmp_path) == ["recipes.qmcat"]
+        assert len(RecipeCatalog.open(path)) == len(SAMPLE_RECIPES)
+
+    def test_ids_and_terms_are_mapped_columns(self, tmp_path):
+        """Test that ids and terms live in mapped columns, not the header, and resolve by binary search."""
+        records = [
+            {"id": "b7", "title": "Crème brûlée"},
+            {"id": "a10", "title": "Tofu"},
+            {"id": "é1", "title": "Miso soup"},
+        ]
+        path = str(tmp_path / "ids.qmcat")
+        RecipeCatalog.from_records(records).save(path)
+        catalog = RecipeCatalog.open(path)
+        with open(path, "rb") as fh:
+            header = fh.read(4096)
+        
+        assert b'"ids"' not in header and b'"terms"' not in header
+        assert list(catalog.ids) == ["b7", "a10", "é1"]
+        assert [catalog.position(recipe_id) for recipe_id in ["a10", "b7", "é1", "a1", "zz"]] == [1, 0, 2, None, None]
+        assert catalog.search_index.search("brûlée", k=1)[0][0] == 0
+        assert catalog.search_index.search("unknown", k=1) == []
+
+
+class TestRecipeFilterEngine:
+    """Test cases for vectorized query filtering."""
+    
+    @pytest.fixture
+    def engine(self):
+        """Fixture for a filter engine over a small catalog."""
+        return RecipeFilterEngine(RecipeCatalog.from_records([
+            {"id": "a", "title": "A", "dietary_tags": ["vegan"], "prep_time": 10, "difficulty": "easy"},
+            {"id": "b", "title": "B", "dietary_tags": ["vegetarian", "gluten-free"], "prep_time": 40},
+            {"id": "c", "title": "C", "dietary_tags": ["gluten-containing"], "cuisine": "italian"},
+        ]))
+    
+    def test_encode_dietary_tags_applies_implications(self):
+        """Test that vegan implies vegetarian and dairy-free."""
+        assert encode_dietary_tags(["Vegan"]) == (
+            DIETARY_BITS["vegan"] | DIETARY_BITS["vegetarian"] | DIETARY_BITS["dairy-free"]
+        )
+    
+    def test_all_and_any_semantics(self, engine):
+        """Test AND and OR combination of dietary restrictions."""
+        both = RecipeQuery(query="", dietary_restrictions=["vegetarian", "gluten-free"])
+        either = RecipeQuery(query="", dietary_restrictions=["vegan", "gluten-free"], dietary_match="any")
+        assert engine.candidates(both).tolist() == [1]
+        assert engine.candidates(either).tolist() == [0, 1]
+        assert engine.candidates(RecipeQuery(query="", dietary_restrictions=["vegetarian"])).tolist() == [0, 1]
+    
+    def test_free_form_tags_and_missing_times(self, engine):
+        """Test non-enum tags and that unknown times fail time limits."""
+        assert engine.candidates(RecipeQuery(query="", dietary_restrictions=["gluten-containing"])).tolist() == [2]
+        assert engine.candidates(RecipeQuery(query="", max_prep_time=30)).tolist() == [0]
+    
+    def test_cuisine_and_difficulty(self, engine):
+        """Test interned column filters."""
+        assert engine.candidates(RecipeQuery(query="", cuisine="Italian")).tolist() == [2]
+        assert engine.candidates(RecipeQuery(query="", difficulty="easy")).tolist() == [0]
+        assert engine.candidates(RecipeQuery(query="", cuisine="thai")).tolist() == []
+        assert engine.mask(RecipeQuery(query="")) is None
+
+
+class TestSubstitutionIndex:
+    """Test cases for ingredient substitution lookup."""
+    
+    @pytest.fixture
+    def index(self):
+        """Fixture for a substitution index over the built-in table."""
+        return SubstitutionIndex(SUBSTITUTIONS)
+    
+    def test_whole_token_matching(self, index):
+        """Test that phrases match on whole tokens only."""
+        assert index.lookup("2 large eggs") == "eggs"
+        assert index.lookup("unsalted butter") == "butter"
+        assert index.lookup("buttermilk") is None
+    
+    def test_only_the_head_noun_matches(self, index):
+        """Test that a phrase must end the name, and notes after it are ignored."""
+        assert index.lookup("milk chocolate") is None
+        assert index.lookup("egg noodles") is None
+        assert index.lookup("butter, softened") == "butter"
+        assert index.lookup("butter (softened)") == "butter"
+    
+    def test_distinct_phrases_do_not_match_head_noun(self, index):
+        """Test that e.g. peanut butter is not treated as butter."""
+        assert index.lookup("peanut butter") is None
+        assert index.lookup("whole milk") == "milk"
+    
+    def test_fuzzy_fallback_corrects_typos(self, index):
+        """Test the trigram/edit-distance fallback."""
+        assert index.lookup("egs") == "eggs"
+        assert index.lookup("brown suger") == "sugar"
+        assert index.lookup("saffron") is None
+    
+    def test_fuzzy_fallback_keeps_real_words(self, index):
+        """Test that known words are not corrected and corrections must end the name."""
+        assert index.lookup("bitter") is None
+        assert index.lookup("mile") is None
+        assert index.lookup("bitter chocolate") is None
+        assert index.lookup("buter") == "butter"
+    
+    def test_batch_lookup(self, service):
+        """Test resolving a whole ingredient list at once."""
+        results = service.get_ingredient_substitutions_batch(["Eggs", "buttermilk", "flour"])
+        assert [r.original_ingredient for r in results] == ["Eggs", "buttermilk", "flour"]
+        assert results[0].substitutes == SUBSTITUTIONS["eggs"]["substitutes"]
+        assert results[1].substitutes[0].startswith("No specific substitutions")
+
+
+class TestRecipeServiceSearch:
+    """Test cases for RecipeService.search_recipes."""
+    
+    def test_search_by_ingredient(self, service):
+        """Test that ingredient names are searchable."""
+        results = service.search_recipes(RecipeQuery(query="quinoa"))
+        assert [r.id for r in results] == ["2"]
+    
+    def test_search_respects_filters_and_max_results(self, service):
+        """Test cuisine filtering and result limits."""
+        results = service.search_recipes(RecipeQuery(query="popular", cuisine="Indian"))
+        assert [r.id for r in results] == ["3"]
+        assert len(service.search_recipes(RecipeQuery(query="popular", max_results=2))) == 2
+    
+    def test_unmatched_query_returns_nothing(self, service):
+        """Test that unknown terms do not match."""
+        assert service.search_recipes(RecipeQuery(query="sushi")) == []
+    
+    def test_service_serves_catalog_file(self, tmp_path, monkeypatch):
+        """Test that RECIPE_CATALOG_PATH points the service at a catalog file."""
+        path = str(tmp_path / "recipes.qmcat")
+        RecipeCatalog.from_records(SAMPLE_RECIPES[:1]).save(path)
+        monkeypatch.setenv("RECIPE_CATALOG_PATH", path)
+        
+        assert RecipeService().get_recipe_by_id("1").title == "Classic Spaghetti Carbonara"
+    
+    def test_get_recipe_by_id_reuses_models(self, service):
+        """Test that recipe models are built once and cached."""
+        recipe = service.get_recipe_by_id("1")
+        assert recipe.title == "Classic Spaghetti Carbonara"
+        assert service.search_recipes(RecipeQuery(query="carbonara"))[0] is recipe
+        assert service.get_recipe_by_id("missing") is None
+    
+    def test_recipe_model_cache_is_bounded(self):
+        """Test that the model cache evicts the least recently used recipe."""
+        service = RecipeService(cache_size=2)
+        first = service.get_recipe_by_id("1")
+        second = service.get_recipe_by_id("2")
+        assert service.get_recipe_by_id("1") is first
+        service.get_recipe_by_id("3")
+        
+        assert list(service.recipes_cache) == [0, 2]
+        assert service.get_recipe_by_id("1") is first
+        assert service.get_recipe_by_id("2") is not second
@@ -0,0 +1,207 @@
+"""Tests for checkpointed, interrupt-based agent sessions."""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent import compaction, nodes, sessions
+from agent.compaction import ArtifactStore
+from agent.graph import create_recipe_agent
+from agent.response_cache import ResponseCache
+from agent.sessions import STATUS_COMPLETED, STATUS_WAITING, SessionBusy, SessionManager, SessionNotFound
+from api.routes import router
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Replace the LLM with canned recipe, plan and execution answers."""
+    async def fake_invoke(rendered_prompt, tools=None, config=None):
+        if tools is None:
+            return AIMessage(content="Carbonara recipe\nEggs, pecorino, guanciale")
+        return AIMessage(content="1. Search eggs\n2. Search pecorino")
+    
+    monkeypatch.setattr(nodes, "_invoke_llm_with_tools", fake_invoke)
+    monkeypatch.setattr(nodes, "response_cache", ResponseCache())
+
+
+@pytest.fixture
+def manager(fake_llm, monkeypatch):
+    """In-memory session manager installed as the process default."""
+    manager = SessionManager(create_recipe_agent(checkpointer=InMemorySaver()))
+    monkeypatch.setattr(sessions, "_session_manager", manager)
+    return manager
+
+
+class TestSessionManager:
+    """Test cases for pausing and resuming sessions."""
+    
+    def test_pauses_and_resumes_through_confirmations(self, manager):
+        """Test the recipe -> plan -> execution flow across interrupts."""
+        async def run():
+            first = await manager.start("how to make carbonara", thread_id="t1")
+            second = await manager.resume("t1", "yes")
+            third = await manager.resume("t1", "yes")
+            return first, second, third
+        
+        first, second, third = asyncio.run(run())
+        assert first["status"] == STATUS_WAITING
+        assert first["interrupt"]["workflow_stage"] == "recipe_confirmation"
+        assert first["interrupt"]["recipe_title"] == "Carbonara recipe"
+        assert second["interrupt"]["workflow_stage"] == "recipe_plan_display"
+        assert "Search eggs" in second["interrupt"]["plan"]
+        assert third["status"] == STATUS_COMPLETED
+        assert third["state"]["recipe_plan_confirmed"] is True
+    
+    def test_resume_unknown_session(self, manager):
+        """Test that resuming a thread with nothing paused is rejected."""
+        with pytest.raises(SessionNotFound):
+            asyncio.run(manager.resume("missing", "yes"))
+    
+    def test_concurrent_sessions_are_isolated(self, manager):
+        """Test that many paused sessions hold no tasks and resume independently."""
+        async def run():
+            started = await asyncio.gather(*(manager.start("how to make carbonara", f"s{i}") for i in range(20)))
+            assert all(s["status"] == STATUS_WAITING for s in started)
+            assert len(asyncio.all_tasks()) == 1
+            declined = await manager.resume("s3", "no")
+            other = await manager.status("s4")
+            return declined, other
+        
+        declined, other = asyncio.run(run())
+        assert declined["status"] == STATUS_COMPLETED
+        assert other["status"] == STATUS_WAITING
+    
+    def test_completed_sessions_are_deleted(self, manager):
+        """Test that a run that finishes without pausing leaves no checkpoints behind."""
+        async def run():
+            await manager.start("how to make carbonara", thread_id="done")
+            completed = await manager.resume("done", "no")
+            return completed, await manager.status("done")
+        
+        completed, status = asyncio.run(run())
+        assert completed["status"] == STATUS_COMPLETED
+        assert status is None
+    
+    def test_concurrent_resumes_of_one_thread(self, manager):
+        """Test that only one of two concurrent resumes of a thread runs."""
+        async def run():
+            await manager.start("how to make carbonara", thread_id="race")
+            return await asyncio.gather(
+                manager.resume("race", "yes"), manager.resume("race", "yes"), return_exceptions=True
+            )
+        
+        results = asyncio.run(run())
+        assert sum(isinstance(r, SessionBusy) for r in results) == 1
+        assert sum(isinstance(r, dict) for r in results) == 1
+    
+    def test_sweep_deletes_idle_paused_sessions(self, manager):
+        """Test that paused sessions past the TTL are swept and recent ones kept."""
+        async def run():
+            await manager.start("how to make carbonara", thread_id="old")
+            await asyncio.sleep(0.05)
+            await manager.start("how to make carbonara", thread_id="new")
+            swept = await manager.sweep(max_age_seconds=0.04)
+            return swept, await manager.status("old"), await manager.status("new")
+        
+        swept, old, new = asyncio.run(run())
+        assert swept == 1
+        assert old is None
+        assert new["status"] == STATUS_WAITING
+
+
+class TestSessionArtifacts:
+    """Test cases for state values stored by reference across a paused session."""
+    
+    def test_resume_with_fresh_artifact_store(self, manager, monkeypatch, tmp_path):
+        """Test that a session resumed after a restart still sees its recipe text."""
+        prompts = []
+        
+        async def fake_invoke(rendered_prompt, tools=None, config=None):
+            prompts.append(str(rendered_prompt))
+            if tools is None:
+                return AIMessage(content="Carbonara recipe\nEggs, pecorino, guanciale\n" + "Whisk the eggs slowly. " * 100)
+            return AIMessage(content="1. Search eggs")
+        
+        monkeypatch.setattr(nodes, "_invoke_llm_with_tools", fake_invoke)
+        monkeypatch.setattr(compaction, "artifact_store", ArtifactStore(str(tmp_path)))
+        
+        async def run():
+            await manager.start("how to make carbonara", thread_id="restart")
+            # A new process opens the same artifact directory
+            compaction.use_artifact_store(ArtifactStore(str(tmp_path)))
+            return await manager.resume("restart", "yes")
+        
+        resumed = asyncio.run(run())
+        assert resumed["interrupt"]["workflow_stage"] == "recipe_plan_display"
+        assert "Whisk the eggs slowly." in prompts[-1]
+    
+    def test_sweep_keeps_artifacts_of_paused_sessions(self, manager, monkeypatch, tmp_path):
+        """Test that the artifact sweep only removes values no checkpoint references."""
+        async def fake_invoke(rendered_prompt, tools=None, config=None):
+            return AIMessage(content="Carbonara recipe\nEggs, pecorino, guanciale\n" + "Whisk the eggs slowly. " * 100)
+        
+        monkeypatch.setattr(nodes, "_invoke_llm_with_tools", fake_invoke)
+        store = ArtifactStore(str(tmp_path))
+        monkeypatch.setattr(compaction, "artifact_store", store)
+        orphan = store.put("left over from a deleted session")
+        
+        async def run():
+            paused = await manager.start("how to make carbonara", thread_id="kept")
+            return paused, await sessions.sweep_artifacts(min_age_seconds=0)
+        
+        paused, deleted = asyncio.run(run())
+        assert deleted == 1
+        assert store.get(orphan) is None
+        assert compaction.resolve(paused["state"]["recipes"][0]["recipe_msg"]).startswith("Carbonara recipe")
+
+
+class TestSessionEndpoints:
+    """Test cases for the session API."""
+    
+    def test_query_then_resume(self, manager):
+        """Test that /query returns a thread ID that /sessions/{id}/resume continues."""
+        app = FastAPI()
+        app.include_router(router)
+        client = TestClient(app)
+        
+        data = client.post("/api/v1/query", json={"query": "how to make carbonara"}).json()["data"]
+        assert data["session_status"] == STATUS_WAITING
+        thread_id = data["thread_id"]
+        assert client.get(f"/api/v1/sessions/{thread_id}").json()["status"] == STATUS_WAITING
+        
+        resumed = client.post(f"/api/v1/sessions/{thread_id}/resume", json={"response": "yes"}).json()["data"]
+        assert resumed["interrupt"]["workflow_stage"] == "recipe_plan_display"
+        assert client.post("/api/v1/sessions/nope/resume", json={"response": "yes"}).status_code == 404
+    
+    def test_one_shot_routes_leave_no_threads(self, manager):
+        """Test that routes without a thread ID in their response delete paused runs."""
+        app = FastAPI()
+        app.include_router(router)
+        client = TestClient(app)
+        
+        assert client.get("/api/v1/recipes/search", params={"q": "how to make carbonara"}).json()["recipes"]
+        assert client.get("/api/v1/recipes/recommend").status_code == 200
+        assert client.post("/api/v1/ingredients/substitute", json={"ingredient": "eggs"}).status_code == 200
+        assert client.post("/api/v1/meal-plan", json={"days": 3}).status_code == 200
+        
+        async def threads():
+            return [c async for c in manager.agent.checkpointer.alist(None)]
+        
+        assert asyncio.run(threads()) == []
+    
+    def test_failed_runs_leave_no_threads(self, manager, monkeypatch):
+        """Test that a run that raises deletes the checkpoints it wrote."""
+        ainvoke = manager.agent.ainvoke
+        
+        async def failing_ainvoke(*args, **kwargs):
+            await ainvoke(*args, **kwargs)
+            raise RuntimeError("run failed after checkpointing")
+        
+        monkeypatch.setattr(manager.agent, "ainvoke", failing_ainvoke)
+        with pytest.raises(RuntimeError):
+            asyncio.run(manager.start("how to make carbonara", thread_id="failed"))
+        assert asyncio.run(manager.status("failed")) is None
@@ -0,0 +1,180 @@
+"""Tests for streaming agent events."""
+
+import asyncio
+import json
+from typing import TypedDict
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langgraph.graph import END, StateGraph
+
+from agent.streaming import stream_agent_events
+from api import routes
+
+
+class _State(TypedDict, total=False):
+    user_query: str
+    answer: str
+    workflow_stage: str
+
+
+def _graph(llm_node):
+    workflow = StateGraph(_State)
+    workflow.add_node("recipe_llm", llm_node)
+    workflow.set_entry_point("recipe_llm")
+    workflow.add_edge("recipe_llm", END)
+    return workflow.compile()
+
+
+class TestStreamAgentEvents:
+    """Test cases for stream_agent_events."""
+    
+    def test_tokens_nodes_and_final_state(self):
+        """Test that tokens and node transitions arrive before the final state."""
+        llm = GenericFakeChatModel(messages=iter([AIMessage(content="Carbonara needs eggs")]))
+        
+        async def llm_node(state):
+            response = await llm.ainvoke(state["user_query"])
+            return {"answer": response.content, "workflow_stage": "recipe_display"}
+        
+        async def collect():
+            return [e async for e in stream_agent_events(_graph(llm_node), {"user_query": "carbonara"})]
+        
+        events = asyncio.run(collect())
+        kinds = [e["event"] for e in events]
+        assert kinds[0] == "node_start" and kinds[-1] == "done"
+        assert "".join(e["content"] for e in events if e["event"] == "token") == "Carbonara needs eggs"
+        assert {"event": "node_end", "node": "recipe_llm", "workflow_stage": "recipe_display"} in events
+        assert events[-1]["state"]["answer"] == "Carbonara needs eggs"
+    
+    def test_recipes_surface_while_streaming(self):
+        """Test that a structured recipe is emitted before the response finishes."""
+        text = json.dumps({"recipes": [
+            {"title": "Carbonara", "ingredients": [{"name": "eggs", "amount": "3"}]},
+            {"title": "Cacio e pepe", "ingredients": [{"name": "pecorino"}]},
+        ]})
+        llm = GenericFakeChatModel(messages=iter([AIMessage(content=text)]))
+        
+        async def llm_node(state):
+            await llm.ainvoke("x")
+            return {}
+        
+        async def collect():
+            return [e async for e in stream_agent_events(_graph(llm_node), {"user_query": "x"})]
+        
+        events = asyncio.run(collect())
+        recipes = [i for i, e in enumerate(events) if e["event"] == "recipe"]
+        tokens = [i for i, e in enumerate(events) if e["event"] == "token"]
+        assert [events[i]["recipe"]["title"] for i in recipes] == ["Carbonara", "Cacio e pepe"]
+        assert recipes[0] < tokens[-1]
+    
+    def test_closing_stream_cancels_run(self):
+        """Test that abandoning the stream cancels in-flight work."""
+        cancelled = asyncio.Event()
+        
+        async def slow_node(state):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return {}
+        
+        async def run():
+            stream = stream_agent_events(_graph(slow_node), {"user_query": "x"})
+            assert (await stream.__anext__())["event"] == "node_start"
+            await stream.aclose()
+            await asyncio.wait_for(cancelled.wait(), timeout=1)
+        
+        asyncio.run(run())
+    
+    def test_slow_consumer_with_small_buffer(self):
+        """Test that a bounded buffer delivers every token to a slow consumer."""
+        text = " ".join(["tok"] * 50)
+        llm = GenericFakeChatModel(messages=iter([AIMessage(content=text)]))
+        
+        async def llm_node(state):
+            await llm.ainvoke("x")
+            return {}
+        
+        async def run():
+            events = []
+            async for event in stream_agent_events(_graph(llm_node), {}, max_buffered=2):
+                await asyncio.sleep(0.001)
+                events.append(event)
+            return events
+        
+        events = asyncio.run(run())
+        assert "".join(e["content"] for e in events if e["event"] == "token") == text
+        assert events[-1]["event"] == "done"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Test client whose agent stream yields canned events."""
+    async def fake_stream(query, **kwargs):
+        yield {"event": "node_start", "node": "recipe_llm"}
+        for token in ("Pasta ", "carbonara"):
+            yield {"event": "token", "node": "recipe_llm", "content": token}
+        yield {"event": "done", "state": {"workflow_stage": "recipe_display", "recipes": [{"title": query}]}}
+    
+    monkeypatch.setattr(routes, "astream_recipe_agent", fake_stream)
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+class TestStreamingEndpoints:
+    """Test cases for the SSE and WebSocket endpoints."""
+    
+    def test_sse_stream(self, client):
+        """Test that events are sent as Server-Sent Events."""
+        response = client.post("/api/v1/query/stream", json={"query": "carbonara"})
+        
+        assert response.headers["content-type"].startswith("text/event-stream")
+        frames = [f for f in response.text.split("\n\n") if f]
+        assert frames[0].startswith("event: node_start")
+        done = json.loads(frames[-1].split("data: ", 1)[1])
+        assert done["data"]["recipes"] == [{"title": "carbonara"}]
+    
+    def test_websocket_stream(self, client):
+        """Test that a WebSocket query receives every event."""
+        with client.websocket_connect("/api/v1/query/ws") as ws:
+            ws.send_json({"query": "carbonara"})
+            events = [ws.receive_json() for _ in range(4)]
+        
+        assert [e["event"] for e in events] == ["node_start", "token", "token", "done"]
+        assert events[-1]["data"]["workflow_stage"] == "recipe_display"
+    
+    def test_websocket_invalid_message_gets_error_event(self, client):
+        """Test that a malformed message is answered with an error and the socket stays open."""
+        with client.websocket_connect("/api/v1/query/ws") as ws:
+            ws.send_json({"dietary_restrictions": "vegan"})
+            error = ws.receive_json()
+            ws.send_json({"query": "carbonara"})
+            events = [ws.receive_json() for _ in range(4)]
+        
+        assert error["event"] == "error" and "query" in error["error"]
+        assert events[-1]["event"] == "done"
+    
+    def test_websocket_queues_messages_sent_during_a_run(self, monkeypatch):
+        """Test that a query sent mid-run runs after the current one instead of being dropped."""
+        async def slow_stream(query, **kwargs):
+            yield {"event": "node_start", "node": "recipe_llm"}
+            await asyncio.sleep(0.2)
+            yield {"event": "done", "state": {"recipes": [{"title": query}]}}
+        
+        monkeypatch.setattr(routes, "astream_recipe_agent", slow_stream)
+        app = FastAPI()
+        app.include_router(routes.router)
+        with TestClient(app).websocket_connect("/api/v1/query/ws") as ws:
+            ws.send_json({"query": "carbonara"})
+            assert ws.receive_json()["event"] == "node_start"
+            ws.send_json({"query": "ramen"})
+            events = [ws.receive_json() for _ in range(3)]
+        
+        done = [e["data"]["recipes"][0]["title"] for e in events if e["event"] == "done"]
+        assert done == ["carbonara", "ramen"]
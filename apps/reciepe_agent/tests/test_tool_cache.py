@@ -0,0 +1,87 @@
+"""Tests for the MCP tool result cache."""
+
+import asyncio
+import json
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+from agent.tool_cache import NO_CACHE, ToolResultCache, cache_key, cache_tools, default_policy
+from agent.tool_executor import make_tool_execution_node
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+def _search_tool(calls):
+    async def search_products(term: str, location_id: str) -> str:
+        calls.append(term)
+        return json.dumps([{"name": term, "price": f"${len(calls)}.00", "store_name": "Kroger"}])
+    return StructuredTool.from_function(coroutine=search_products, name="search_products", description="Search.")
+
+
+class TestToolResultCache:
+    """Test cases for ToolResultCache."""
+    
+    def test_key_normalizes_arguments_and_location(self):
+        """Test that equivalent calls share a key."""
+        assert cache_key("search", {"term": " Eggs ", "locationId": "70300720"}) == \
+            cache_key("search", {"term": "eggs", "locationid": 70300720})
+        assert cache_key("search", {"term": "eggs", "location_id": "1"}) != \
+            cache_key("search", {"term": "eggs", "location_id": "2"})
+    
+    def test_per_tool_policies(self):
+        """Test that cart tools are never cached and metadata lives longer than prices."""
+        assert default_policy("add_to_cart") == NO_CACHE
+        assert default_policy("get_product_details").ttl > default_policy("search_products").ttl
+    
+    def test_stale_while_revalidate(self):
+        """Test that a stale hit returns at once and refreshes in the background."""
+        clock = _Clock()
+        calls = []
+        (tool,) = cache_tools([_search_tool(calls)], ToolResultCache(clock=clock))
+        args = {"term": "eggs", "location_id": "70300720"}
+        
+        async def run():
+            first = await tool.ainvoke(args)
+            assert await tool.ainvoke(args) == first
+            clock.now = default_policy("search_products").ttl + 1
+            stale = await tool.ainvoke(args)
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            return first, stale, await tool.ainvoke(args)
+        
+        first, stale, refreshed = asyncio.run(run())
+        assert stale == first
+        assert refreshed != first
+        assert calls == ["eggs", "eggs"]
+    
+    def test_lru_eviction(self):
+        """Test that the least recently used result is evicted."""
+        calls = []
+        (tool,) = cache_tools([_search_tool(calls)], ToolResultCache(max_entries=2))
+        
+        async def run():
+            for term in ("eggs", "milk", "eggs", "flour", "milk"):
+                await tool.ainvoke({"term": term, "location_id": "1"})
+        
+        asyncio.run(run())
+        assert calls == ["eggs", "milk", "flour", "milk"]
+    
+    def test_hits_reach_searched_ingredients(self):
+        """Test that cached results fill searched_ingredients like live calls."""
+        calls = []
+        node = make_tool_execution_node(cache_tools([_search_tool(calls)], ToolResultCache()))
+        call = {"id": "c1", "name": "search_products", "args": {"term": "eggs", "location_id": "70300720"}}
+        state = {"messages": [AIMessage(content="", tool_calls=[call])], "tool_outputs": {}, "searched_ingredients": []}
+        
+        live = asyncio.run(node(state))
+        cached = asyncio.run(node(state))
+        assert calls == ["eggs"]
+        assert cached["searched_ingredients"] == live["searched_ingredients"]
+        assert cached["searched_ingredients"][0]["search_result"]["store_name"] == "Kroger"
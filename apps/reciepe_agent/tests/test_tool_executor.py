@@ -0,0 +1,118 @@
+"""Tests for concurrent tool call execution."""
+
+import asyncio
+import json
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from agent import graph
+from agent.tool_executor import ConcurrentToolExecutor, make_tool_execution_node, parse_tool_limits
+
+
+_active = {"now": 0, "peak": 0}
+
+
+@tool
+async def search_products(term: str) -> str:
+    """Search grocery products."""
+    _active["now"] += 1
+    _active["peak"] = max(_active["peak"], _active["now"])
+    try:
+        await asyncio.sleep(0.5 if term == "slow" else 0.05)
+        if term == "broken":
+            raise ValueError("store unavailable")
+        return json.dumps({"products": [{"name": term, "price": "$1.50", "store_name": "Corner"}]})
+    finally:
+        _active["now"] -= 1
+
+
+@tool
+async def lookup_price(product_id: str) -> str:
+    """Look up a product price."""
+    await asyncio.sleep(0.05)
+    return json.dumps({"price": "$1.50", "finished": time.perf_counter()})
+
+
+def _calls(*terms):
+    return [{"id": f"call_{i}", "name": "search_products", "args": {"term": t}} for i, t in enumerate(terms)]
+
+
+class TestConcurrentToolExecutor:
+    """Test cases for ConcurrentToolExecutor."""
+    
+    def setup_method(self):
+        _active.update(now=0, peak=0)
+    
+    def test_runs_calls_concurrently_in_order(self):
+        """Test that calls overlap and results keep the call order."""
+        executor = ConcurrentToolExecutor([search_products], max_concurrency=10)
+        start = time.perf_counter()
+        results = asyncio.run(executor.run(_calls(*[f"item{i}" for i in range(10)])))
+        
+        assert time.perf_counter() - start < 0.3
+        assert [r["args"]["term"] for r in results] == [f"item{i}" for i in range(10)]
+        assert _active["peak"] == 10
+    
+    def test_per_tool_limit(self):
+        """Test that a per-tool limit caps in-flight calls."""
+        executor = ConcurrentToolExecutor([search_products], per_tool_limits={"search_products": 2})
+        asyncio.run(executor.run(_calls("a", "b", "c", "d", "e")))
+        assert _active["peak"] == 2
+    
+    def test_configured_limits_reach_the_graph_node(self, monkeypatch):
+        """Test that limits parsed from configuration are passed in and enforced."""
+        limits = parse_tool_limits("search_products=2, add_to_cart=1")
+        assert limits == {"search_products": 2, "add_to_cart": 1}
+        with pytest.raises(ValueError):
+            parse_tool_limits("search_products")
+        
+        nodes = []
+        
+        def make_node(tools, **kwargs):
+            nodes.append(make_tool_execution_node([search_products], **kwargs))
+            return nodes[-1]
+        
+        monkeypatch.setattr(graph, "TOOL_CONCURRENCY_LIMITS", limits)
+        monkeypatch.setattr(graph, "make_tool_execution_node", make_node)
+        graph.create_recipe_agent()
+        message = AIMessage(content="", tool_calls=_calls("a", "b", "c", "d"))
+        asyncio.run(nodes[0]({"messages": [message]}))
+        assert _active["peak"] == 2
+    
+    def test_busy_tool_does_not_block_other_tools(self):
+        """Test that calls waiting on a saturated tool leave global slots to other tools."""
+        executor = ConcurrentToolExecutor(
+            [search_products, lookup_price], max_concurrency=2, per_tool_limits={"search_products": 1}
+        )
+        calls = _calls("slow", "slow") + [{"id": "p", "name": "lookup_price", "args": {"product_id": "1"}}]
+        start = time.perf_counter()
+        results = asyncio.run(executor.run(calls))
+        
+        assert results[2]["output"]["finished"] - start < 0.3
+        assert _active["peak"] == 1
+    
+    def test_partial_results_on_failure_and_timeout(self):
+        """Test that failed, slow and unknown calls do not discard the others."""
+        executor = ConcurrentToolExecutor([search_products], timeout=0.2)
+        calls = _calls("milk", "broken", "slow") + [{"id": "x", "name": "missing", "args": {}}]
+        results = asyncio.run(executor.run(calls))
+        
+        assert results[0]["error"] is None
+        assert "store unavailable" in results[1]["error"]
+        assert "Timed out" in results[2]["error"]
+        assert "not found" in results[3]["error"]
+    
+    def test_node_fills_tool_outputs_and_searched_ingredients(self):
+        """Test that the graph node records outputs and found products."""
+        node = make_tool_execution_node([search_products])
+        message = AIMessage(content="", tool_calls=_calls("eggs", "broken"))
+        update = asyncio.run(node({"messages": [message], "tool_outputs": {}, "searched_ingredients": []}))
+        
+        assert len(update["messages"]) == 2
+        assert set(update["tool_outputs"]) == {"call_0", "call_1"}
+        assert update["searched_ingredients"] == [
+            {"name": "eggs", "search_result": {"name": "eggs", "price": "$1.50", "store_name": "Corner"}}
+        ]
@@ -1,15 +1,107 @@
-import requests
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 
-VLLM_API_URL = "http://localhost:8000/v1/chat/completions"
-MODEL_NAME = "deepseek-ai/DeepSeek-R1-Distill-Qwen-1.5B"
+import httpx
+
+logger = logging.getLogger(__name__)
+
+VLLM_API_URL = os.getenv("VLLM_API_URL", "http://localhost:8000/v1/chat/completions")
+MODEL_NAME = os.getenv("SHOPPING_MODEL_NAME", "deepseek-ai/DeepSeek-R1-Distill-Qwen-1.5B")
+
+# Keep-alive pool and concurrency limit for calls to the LLM server
+LLM_MAX_CONNECTIONS = int(os.getenv("SHOPPING_LLM_MAX_CONNECTIONS", "32"))
+LLM_MAX_CONCURRENCY = int(os.getenv("SHOPPING_LLM_MAX_CONCURRENCY", "16"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("SHOPPING_LLM_TIMEOUT_SECONDS", "30"))
+# Retries for transient failures (connection errors, 429, 5xx) with jittered backoff
+LLM_MAX_RETRIES = int(os.getenv("SHOPPING_LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("SHOPPING_LLM_BACKOFF_BASE_SECONDS", "0.5"))
+# Answers for normalized queries (size 0 disables the cache)
+ITEM_CACHE_SIZE = int(os.getenv("SHOPPING_ITEM_CACHE_SIZE", "1024"))
+ITEM_CACHE_TTL_SECONDS = float(os.getenv("SHOPPING_ITEM_CACHE_TTL_SECONDS", "600"))
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
 
 PROMPT_TEMPLATE = (
     "You are a helpful shopping assistant. Respond ONLY with a JSON object in the following format:\n"
     "{{\n  \"items\": [\"<item1>\", \"<item2>\", \"<item3>\"]\n}}\n"
-    "List the top 3 most relevant products for the following user query. Respond only with valid JSON, no extra text.\n"    
+    "List the top 3 most relevant products for the following user query. Respond only with valid JSON, no extra text.\n"
 )
 
-def get_top3_items(query: str) -> dict:
+JSON_OBJECT = re.compile(r'\{[\s\S]*\}')
+
+_client: Optional[httpx.AsyncClient] = None
+_limiter: Optional[asyncio.Semaphore] = None
+_cache: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+_in_flight: Dict[str, asyncio.Task] = {}
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+def parse_items(content: str) -> dict:
+    """Extracts the JSON object from the model's reply; {"items": []} if there is none."""
+    match = JSON_OBJECT.search(content or "")
+    if not match:
+        return {"items": []}
+    try:
+        return json.loads(match.group())
+    except ValueError:
+        return {"items": []}
+
+def _get_client() -> httpx.AsyncClient:
+    global _client, _limiter
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=LLM_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+        )
+        _limiter = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _client
+
+def _cache_get(key: str) -> Optional[dict]:
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    created, value = entry
+    if time.monotonic() - created > ITEM_CACHE_TTL_SECONDS:
+        del _cache[key]
+        return None
+    _cache.move_to_end(key)
+    return value
+
+def _cache_put(key: str, value: dict) -> None:
+    if ITEM_CACHE_SIZE <= 0:
+        return
+    _cache[key] = (time.monotonic(), value)
+    _cache.move_to_end(key)
+    while len(_cache) > ITEM_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+async def _post_with_retry(payload: dict) -> dict:
+    client = _get_client()
+    attempt = 0
+    while True:
+        try:
+            async with _limiter:
+                response = await client.post(VLLM_API_URL, json=payload)
+            response.raise_for_status()
+            return response.json()
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+            if attempt >= LLM_MAX_RETRIES or (status is not None and status not in RETRYABLE_STATUS_CODES):
+                raise
+            delay = random.uniform(0, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt)
+            logger.warning(f"LLM request failed ({e}); retrying in {delay:.2f}s")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+async def _fetch_top3_items(query: str) -> dict:
     prompt = PROMPT_TEMPLATE.format(query=query)
     payload = {
         "model": MODEL_NAME,
@@ -20,20 +112,37 @@ def get_top3_items(query: str) -> dict:
         "max_tokens": 256,
         "temperature": 0.7
     }
-    response = requests.post(VLLM_API_URL, json=payload, timeout=30)
-    response.raise_for_status()
-    result = response.json()
-    print(f"LLM response: {result}")  # Debugging output
+    result = await _post_with_retry(payload)
+    logger.debug(f"LLM response: {result}")
     # Extract the model's reply (OpenAI format)
-    content = result["choices"][0]["message"]["content"]
-    try:
-        import re, json
-        match = re.search(r'\{[\s\S]*\}', content)
-        if match:
-            try:
-                return json.loads(match.group())
-            except Exception:
-                return {"items": []}
-        return {"items": []}
-    except Exception:
-        return {"items": []}
+    return parse_items(result["choices"][0]["message"]["content"])
+
+async def _fetch_and_cache(key: str, query: str) -> dict:
+    items = await _fetch_top3_items(query)
+    # Empty answers are not cached so the next shopper gets a fresh attempt
+    if items.get("items"):
+        _cache_put(key, items)
+    return items
+
+def _request_done(key: str, task: asyncio.Task) -> None:
+    _in_flight.pop(key, None)
+    if not task.cancelled():
+        # Marks a failure as retrieved even if every caller has gone away
+        task.exception()
+
+async def get_top3_items(query: str) -> dict:
+    """
+    Top 3 products for a shopping query. Answers are cached per normalized query, and
+    concurrent identical queries share one LLM request.
+    """
+    key = normalize_query(query)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_and_cache(key, query))
+        _in_flight[key] = task
+        task.add_done_callback(lambda t: _request_done(key, t))
+    # A shopper leaving does not cancel the request others are waiting on
+    return await asyncio.shield(task)
@@ -1,9 +1,13 @@
+import os
 import gradio as gr
 from llm_client import get_top3_items
 
-def llm_agent(input_text):
+# Shopping queries served at once (they mostly wait on the LLM server)
+UI_CONCURRENCY = int(os.getenv("SHOPPING_UI_CONCURRENCY", "64"))
+
+async def llm_agent(input_text):
     # Call local vLLM OpenAI API for top 3 items
-    result = get_top3_items(input_text)
+    result = await get_top3_items(input_text)
     return result
 
 def human_review(items_dict):
@@ -17,10 +21,11 @@ with gr.Blocks() as demo:
     gr.Markdown("# Shopping Agent (Human-in-the-Loop Demo)")
     inp = gr.Textbox(label="Shopping Query")
     out = gr.Textbox(label="Agent Output")
-    def run_pipeline(query):
-        llm_out = llm_agent(query)
+    async def run_pipeline(query):
+        llm_out = await llm_agent(query)
         human_out = human_review(llm_out)
         return human_out
     inp.submit(run_pipeline, inp, out)
 
+demo.queue(default_concurrency_limit=UI_CONCURRENCY)
 demo.launch()
@@ -0,0 +1,128 @@
+"""Tests for the shopping agent's LLM client."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from apps.shoppingagent import llm_client
+
+
+def reply(items):
+    """An OpenAI-style chat completion whose message holds the items as JSON."""
+    content = json.dumps({"items": items})
+    return {"choices": [{"message": {"content": content}}]}
+
+
+class FakeServer:
+    """Answers chat completions with queued status codes, then with the items."""
+
+    def __init__(self, items=("milk", "bread", "eggs"), statuses=()):
+        self.items = list(items)
+        self.statuses = list(statuses)
+        self.requests = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(json.loads(request.content))
+        # Lets concurrent callers pile up while the request is in flight
+        await asyncio.sleep(0.01)
+        if self.statuses:
+            return httpx.Response(self.statuses.pop(0), json={"error": "unavailable"})
+        return httpx.Response(200, json=reply(self.items))
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Routes the client to a FakeServer through a mocked httpx transport."""
+    fake = FakeServer()
+    monkeypatch.setattr(llm_client, "_cache", llm_client.OrderedDict())
+    monkeypatch.setattr(llm_client, "_in_flight", {})
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF_BASE_SECONDS", 0.0)
+    monkeypatch.setattr(llm_client, "_client", None)
+    monkeypatch.setattr(llm_client, "_limiter", None)
+
+    def get_client():
+        if llm_client._client is None:
+            llm_client._client = httpx.AsyncClient(transport=httpx.MockTransport(fake))
+            llm_client._limiter = asyncio.Semaphore(4)
+        return llm_client._client
+
+    monkeypatch.setattr(llm_client, "_get_client", get_client)
+    return fake
+
+
+class TestGetTop3Items:
+    """Test cases for caching, coalescing and retries in get_top3_items."""
+
+    def test_cache_hit(self, server):
+        """A repeated query (up to case and spacing) is answered from the cache."""
+        async def run():
+            first = await llm_client.get_top3_items("Breakfast  food")
+            second = await llm_client.get_top3_items("breakfast food")
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first == second == {"items": ["milk", "bread", "eggs"]}
+        assert len(server.requests) == 1
+
+    def test_cache_expiry(self, server):
+        """Entries older than the TTL are fetched again."""
+        async def run():
+            await llm_client.get_top3_items("breakfast food")
+            created, value = llm_client._cache["breakfast food"]
+            llm_client._cache["breakfast food"] = (created - llm_client.ITEM_CACHE_TTL_SECONDS - 1, value)
+            await llm_client.get_top3_items("breakfast food")
+
+        asyncio.run(run())
+        assert len(server.requests) == 2
+
+    def test_empty_answers_are_not_cached(self, server):
+        """A reply without items is returned but the next query asks again."""
+        server.items = []
+
+        async def run():
+            await llm_client.get_top3_items("something odd")
+            return await llm_client.get_top3_items("something odd")
+
+        assert asyncio.run(run()) == {"items": []}
+        assert len(server.requests) == 2
+
+    def test_concurrent_identical_queries_share_one_request(self, server):
+        """Identical queries in flight together coalesce into one LLM call."""
+        async def run():
+            return await asyncio.gather(
+                *(llm_client.get_top3_items(query) for query in ["Snacks", "snacks", " snacks "]),
+                llm_client.get_top3_items("drinks"),
+            )
+
+        results = asyncio.run(run())
+        assert all(result == {"items": ["milk", "bread", "eggs"]} for result in results)
+        assert len(server.requests) == 2
+        assert llm_client._in_flight == {}
+
+    def test_retries_transient_errors(self, server):
+        """Retryable status codes are retried until the server answers."""
+        server.statuses = [503, 429]
+
+        result = asyncio.run(llm_client.get_top3_items("breakfast food"))
+        assert result == {"items": ["milk", "bread", "eggs"]}
+        assert len(server.requests) == 3
+
+    def test_gives_up_after_max_retries(self, server, monkeypatch):
+        """The error surfaces once the retries run out, and nothing is cached."""
+        monkeypatch.setattr(llm_client, "LLM_MAX_RETRIES", 1)
+        server.statuses = [503, 503, 503]
+
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(llm_client.get_top3_items("breakfast food"))
+        assert len(server.requests) == 2
+        assert llm_client._cache == {}
+
+    def test_client_errors_are_not_retried(self, server):
+        """Non-retryable status codes fail on the first attempt."""
+        server.statuses = [400]
+
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(llm_client.get_top3_items("breakfast food"))
+        assert len(server.requests) == 1